@@ -0,0 +1,359 @@
+# Integrity-checked, memory-mapped loading of the packaged chatbot_model/. The package stage
+# writes manifest.json with the size and SHA-256 of every file, the intent list and the
+# evaluation metrics. load_model() checks file sizes and the safetensors header against it (so
+# a truncated or stray weights file fails loudly instead of loading; full SHA-256 checks belong
+# to deploy time: `verify`, model.py --copy-to, or check_hashes=True), then maps model.safetensors read-only and
+# builds the model on the meta device with load_state_dict(assign=True): parameters point
+# straight into the page cache instead of being copied into fresh buffers, and forked or
+# co-located workers share those pages.
+#
+#   python artifact_loader.py manifest --model-path ./chatbot_model
+#   python artifact_loader.py verify --model-path ./backend/models/chatbot_model
+#   python artifact_loader.py benchmark --model-path ./chatbot_model --runs 5
+import argparse
+import hashlib
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+MANIFEST_FILENAME = 'manifest.json'
+WEIGHTS_FILENAME = 'model.safetensors'
+REQUIRED_FILES = ('config.json', WEIGHTS_FILENAME, 'model_config.json', 'tokenizer_config.json', 'vocab.txt')
+BENCHMARK_MODES = ['from_pretrained', 'mmap', 'mmap_verified']
+# safetensors dtype codes -> (torch dtype name, bytes per element)
+SAFETENSORS_DTYPES = {
+    'F64': ('float64', 8), 'F32': ('float32', 4), 'F16': ('float16', 2), 'BF16': ('bfloat16', 2),
+    'I64': ('int64', 8), 'I32': ('int32', 4), 'I16': ('int16', 2), 'I8': ('int8', 1), 'U8': ('uint8', 1),
+    'BOOL': ('bool', 1),
+}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_files(model_dir):
+    # Relative paths with '/' separators, the manifest itself excluded
+    files = []
+    for root, _, names in os.walk(model_dir):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), model_dir).replace(os.sep, '/')
+            if relative != MANIFEST_FILENAME:
+                files.append(relative)
+    return sorted(files)
+
+
+def write_manifest(model_dir, metrics=None):
+    missing = [name for name in REQUIRED_FILES if not os.path.exists(os.path.join(model_dir, name))]
+    if missing:
+        raise FileNotFoundError(f"Cannot write a manifest for {model_dir}: missing {', '.join(missing)}")
+    with open(os.path.join(model_dir, 'model_config.json')) as f:
+        model_config = json.load(f)
+    with open(os.path.join(model_dir, 'config.json')) as f:
+        config = json.load(f)
+
+    files = {}
+    for relative in list_files(model_dir):
+        path = os.path.join(model_dir, relative)
+        files[relative] = {'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+
+    manifest = {
+        'format_version': 1,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'model_type': config.get('model_type'),
+        'base_model': model_config.get('model_name'),
+        'intents': model_config['intents'],
+        'num_classes': len(model_config['intents']),
+        'metrics': metrics or {},
+        'total_bytes': sum(entry['size'] for entry in files.values()),
+        'files': files,
+    }
+    with open(os.path.join(model_dir, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_manifest(model_dir, check_hashes=True):
+    # Raises ValueError listing every missing, resized or modified file; returns the manifest.
+    # check_hashes=False compares sizes and parses the safetensors header without reading the weights.
+    manifest_path = os.path.join(model_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"{manifest_path} not found: repackage the model with model.py")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    problems = [f"{name}: not listed in the manifest" for name in REQUIRED_FILES if name not in manifest['files']]
+    for relative, expected in manifest['files'].items():
+        path = os.path.join(model_dir, relative)
+        if not os.path.exists(path):
+            problems.append(f"{relative}: missing")
+            continue
+        size = os.path.getsize(path)
+        if size != expected['size']:
+            problems.append(f"{relative}: {size} bytes, expected {expected['size']}")
+        elif check_hashes and file_sha256(path) != expected['sha256']:
+            problems.append(f"{relative}: SHA-256 mismatch")
+    if not problems:
+        try:
+            read_safetensors_header(os.path.join(model_dir, WEIGHTS_FILENAME))
+        except (ValueError, KeyError, UnicodeDecodeError) as e:
+            problems.append(str(e))
+    if problems:
+        raise ValueError(f"{model_dir} does not match its manifest:\n  " + "\n  ".join(problems))
+
+    # Leftovers such as "~$model.safetensors" do not break loading, but are worth cleaning up
+    extra = sorted(set(list_files(model_dir)) - set(manifest['files']))
+    if extra:
+        print(f"⚠️  Files not in the manifest (ignored): {', '.join(extra)}")
+    return manifest
+
+
+def read_safetensors_header(path):
+    # 8-byte little-endian header length, JSON header, then the raw tensor bytes
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        prefix = f.read(8)
+        if len(prefix) < 8:
+            raise ValueError(f"{path}: {file_size} bytes is too short for a safetensors file")
+        (header_size,) = struct.unpack('<Q', prefix)
+        if 8 + header_size > file_size:
+            raise ValueError(f"{path}: header of {header_size} bytes runs past the end of the file")
+        header = json.loads(f.read(header_size))
+    header.pop('__metadata__', None)
+
+    data_start = 8 + header_size
+    for name, entry in header.items():
+        begin, end = entry['data_offsets']
+        if entry['dtype'] not in SAFETENSORS_DTYPES:
+            raise ValueError(f"{path}: {name} has unsupported dtype {entry['dtype']}")
+        itemsize = SAFETENSORS_DTYPES[entry['dtype']][1]
+        if end - begin != int(np.prod(entry['shape'], dtype=np.int64)) * itemsize:
+            raise ValueError(f"{path}: {name} spans {end - begin} bytes, its shape needs a different size")
+        if data_start + end > file_size:
+            raise ValueError(f"{path}: {name} ends past the end of the file (truncated?)")
+    return header, data_start
+
+
+def mmap_safetensors(path):
+    # {name: tensor} viewing a copy-on-write mapping of the file: no tensor bytes are read or copied
+    # until first touched. The file must not be rewritten in place while the tensors are alive.
+    import torch
+
+    header, data_start = read_safetensors_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode='c')
+    state_dict = {}
+    for name, entry in header.items():
+        begin, end = entry['data_offsets']
+        dtype = getattr(torch, SAFETENSORS_DTYPES[entry['dtype']][0])
+        if end == begin:
+            state_dict[name] = torch.empty(entry['shape'], dtype=dtype)
+            continue
+        state_dict[name] = torch.frombuffer(
+            mapped, dtype=dtype, count=(end - begin) // dtype.itemsize, offset=data_start + begin
+        ).view(entry['shape'])
+    return state_dict
+
+
+def load_model(model_dir, verify=True, check_hashes=False, model_class=None):
+    # Returns (model, manifest); manifest is None with verify=False. model_class defaults to
+    # AutoModelForSequenceClassification; pass JointIntentSlotModel for chatbot_model_joint/.
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+    from transformers.integrations.accelerate import init_empty_weights
+
+    manifest = verify_manifest(model_dir, check_hashes) if verify else None
+    config = AutoConfig.from_pretrained(model_dir)
+    # Parameters on the meta device, buffers (e.g. position_ids) real: nothing weight-sized is allocated
+    with init_empty_weights():
+        if model_class is None:
+            model = AutoModelForSequenceClassification.from_config(config)
+        else:
+            model = model_class(config)
+
+    state_dict = mmap_safetensors(os.path.join(model_dir, WEIGHTS_FILENAME))
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+    still_empty = [name for name, param in model.named_parameters() if param.is_meta]
+    if still_empty or unexpected:
+        raise ValueError(
+            f"{model_dir}/{WEIGHTS_FILENAME} does not match {type(model).__name__}: "
+            f"missing {still_empty or missing}, unexpected {unexpected}"
+        )
+    model.eval()
+    return model, manifest
+
+
+def load_classifier(model_path='./chatbot_model', verify=True, check_hashes=False, **kwargs):
+    # IntentClassifier over a verified, memory-mapped model; kwargs go to IntentClassifier
+    from intent_classifier import IntentClassifier
+
+    model, _ = load_model(model_path, verify, check_hashes)
+    return IntentClassifier(model_path, model=model, **kwargs)
+
+
+def rss_breakdown_mb():
+    # Anonymous (private) vs file-backed (shareable page cache) resident memory
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key = line.split(':')[0]
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                fields[key] = int(line.split()[1]) / 1024
+    return fields
+
+
+def run_worker(mode, model_path, texts):
+    from benchmark_inference import peak_rss_mb
+
+    start_time = time.perf_counter()
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    import_seconds = time.perf_counter() - start_time
+
+    before_load = rss_breakdown_mb()
+    start_time = time.perf_counter()
+    if mode == 'from_pretrained':
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        model.eval()
+    else:
+        model, _ = load_model(model_path, verify=mode == 'mmap_verified')
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    load_seconds = time.perf_counter() - start_time
+    after_load = rss_breakdown_mb()
+
+    start_time = time.perf_counter()
+    with torch.inference_mode():
+        logits = model(**tokenizer(texts, return_tensors='pt', padding=True, truncation=True)).logits
+    first_inference_ms = (time.perf_counter() - start_time) * 1000
+    after_inference = rss_breakdown_mb()
+
+    return {
+        'import_s': import_seconds,
+        'load_s': load_seconds,
+        'first_inference_ms': first_inference_ms,
+        'rss_after_load_mb': after_load.get('VmRSS', 0.0),
+        # Growth from loading plus the first forward pass, which touches every weight page
+        'anon_mb': after_inference.get('RssAnon', 0.0) - before_load.get('RssAnon', 0.0),
+        'file_mb': after_inference.get('RssFile', 0.0) - before_load.get('RssFile', 0.0),
+        'peak_rss_mb': peak_rss_mb(),
+        'logits': logits.tolist(),
+    }
+
+
+def drop_page_cache():
+    # Root only; without it every run after the first reads the weights from the page cache
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('1')
+        return True
+    except OSError:
+        return False
+
+
+def benchmark(model_path, texts, runs=3, drop_caches=False, timeout=600):
+    results = {}
+    for mode in BENCHMARK_MODES:
+        samples = []
+        for _ in range(runs):
+            if drop_caches and not drop_page_cache():
+                print("⚠️  Cannot drop the page cache (needs root); measuring warm-cache starts")
+                drop_caches = False
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                result_path = f.name
+            command = [
+                sys.executable, os.path.abspath(__file__), 'benchmark', '--worker', mode,
+                '--model-path', model_path, '--texts', json.dumps(texts), '--result-file', result_path,
+            ]
+            try:
+                completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+                if completed.returncode != 0:
+                    raise RuntimeError(f"{mode} worker failed: {completed.stderr.strip()[-500:]}")
+                with open(result_path) as f:
+                    samples.append(json.load(f))
+            finally:
+                os.unlink(result_path)
+
+        # Medians over runs; logits from the first run for the equivalence check
+        results[mode] = {
+            key: float(np.median([sample[key] for sample in samples])) for key in samples[0] if key != 'logits'
+        }
+        results[mode]['logits'] = samples[0]['logits']
+    reference = np.array(results['from_pretrained']['logits'])
+    for mode in BENCHMARK_MODES:
+        results[mode]['max_logit_diff'] = float(np.abs(np.array(results[mode].pop('logits')) - reference).max())
+    return results
+
+
+def format_benchmark(results, runs, model_path):
+    report = f"Cold-start benchmark: {model_path} (median of {runs} fresh processes)\n" + "=" * 100 + "\n"
+    report += (
+        f"{'mode':<17}{'load s':>8}{'first ms':>10}{'RSS load MB':>13}{'+anon MB':>10}{'+file MB':>10}"
+        f"{'peak MB':>9}{'max |Δlogit|':>14}\n"
+    )
+    for mode, row in results.items():
+        report += (
+            f"{mode:<17}{row['load_s']:>8.3f}{row['first_inference_ms']:>10.1f}{row['rss_after_load_mb']:>13.0f}"
+            f"{row['anon_mb']:>10.0f}{row['file_mb']:>10.0f}{row['peak_rss_mb']:>9.0f}{row['max_logit_diff']:>14.2e}\n"
+        )
+    report += (
+        "\nload s excludes importing torch/transformers. +anon / +file MB: RSS growth from loading and the\n"
+        "first forward pass. Anonymous memory is private to the process; file-backed pages are the\n"
+        "mapped model files in the page cache, shared by every process that maps them.\n"
+    )
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manifest-checked, memory-mapped chatbot model loading")
+    parser.add_argument('command', choices=['manifest', 'verify', 'benchmark'])
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--metrics', default=None, help="manifest: JSON file of metrics to record")
+    parser.add_argument('--no-hashes', action='store_true', help="verify: compare sizes only")
+    parser.add_argument('--runs', type=int, default=3, help="benchmark: fresh processes per mode")
+    parser.add_argument('--drop-caches', action='store_true', help="benchmark: drop the page cache before each run (root)")
+    parser.add_argument('--output', default='artifact_load_report.txt')
+    # Internal: one benchmark run inside a fresh interpreter
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--texts', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker_result = run_worker(args.worker, args.model_path, json.loads(args.texts))
+        with open(args.result_file, 'w') as f:
+            json.dump(worker_result, f)
+        sys.exit(0)
+
+    if args.command == 'manifest':
+        manifest_metrics = None
+        if args.metrics:
+            with open(args.metrics) as f:
+                manifest_metrics = json.load(f)
+        written = write_manifest(args.model_path, manifest_metrics)
+        print(f"✅ Manifest written: {len(written['files'])} files, {written['total_bytes'] / 1e6:.1f} MB")
+    elif args.command == 'verify':
+        try:
+            verified = verify_manifest(args.model_path, check_hashes=not args.no_hashes)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ {len(verified['files'])} files match the manifest ({verified['num_classes']} intents)")
+    else:
+        from export_onnx import SAMPLE_TEXTS
+        benchmark_results = benchmark(args.model_path, list(SAMPLE_TEXTS), args.runs, args.drop_caches)
+        benchmark_report = format_benchmark(benchmark_results, args.runs, args.model_path)
+        print("\n" + benchmark_report)
+        with open(args.output, 'w') as f:
+            f.write(benchmark_report)
+        print(f"✅ Report saved to {args.output}")
@@ -0,0 +1,300 @@
+# On-the-fly training augmentation. Instead of training on fixed copies of each phrase, every
+# epoch draws a fresh variant of each unique utterance inside the DataLoader workers: case and
+# punctuation changes, QWERTY-neighbour typos, synonym swaps for food/cart/order terms and Faker
+# refills of restaurant, dish, category, status, price and order-id values. Variants are seeded
+# from (seed, epoch, index), so a run is reproducible whatever the worker count. Base phrases
+# keep their cached tokenization, and each worker caches the tokenization of variants it has
+# seen before (case and punctuation variants repeat across epochs).
+#
+#   python augmentation.py --data ./training_work/split/train.jsonl --epochs 3
+import argparse
+import multiprocessing as mp
+import random
+import re
+
+import numpy as np
+import torch
+from faker import Faker
+
+from chatbot_data_generation import CATEGORIES, DISHES, RESTAURANTS, STATUSES, slot_value
+
+# Transform name -> Augmenter method, in the order they are applied (slot values are matched before
+# typos or case changes alter them)
+TRANSFORMS = {
+    'slot': 'refill_slots', 'synonym': 'swap_synonyms', 'typo': 'add_typos',
+    'case': 'change_case', 'punctuation': 'change_punctuation',
+}
+DEFAULT_PROBABILITIES = {'slot': 0.7, 'synonym': 0.3, 'typo': 0.3, 'case': 0.4, 'punctuation': 0.4}
+
+# Label-preserving swaps only: "place" is left out for restaurants because of "place order"
+SYNONYMS = {
+    'food': ['dish', 'meal'],
+    'foods': ['dishes', 'meals'],
+    'dish': ['food', 'meal'],
+    'dishes': ['foods', 'meals'],
+    'cart': ['basket', 'bag'],
+    'basket': ['cart'],
+    'order': ['purchase'],
+    'orders': ['purchases'],
+    'restaurant': ['eatery', 'diner'],
+    'restaurants': ['eateries', 'diners'],
+    'show': ['display', 'view'],
+    'find': ['search for', 'look for'],
+    'delete': ['remove'],
+    'remove': ['delete'],
+    'want': ['would like'],
+}
+SYNONYM_PATTERN = re.compile(r"\b(" + "|".join(sorted(SYNONYMS, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+
+KEYBOARD_ROWS = ['qwertyuiop', 'asdfghjkl', 'zxcvbnm']
+
+
+def keyboard_neighbours():
+    # Each letter -> the letters around it on a QWERTY keyboard
+    neighbours = {}
+    for row_index, keys in enumerate(KEYBOARD_ROWS):
+        for column, key in enumerate(keys):
+            neighbours[key] = ''.join(
+                KEYBOARD_ROWS[row][col]
+                for row in (row_index - 1, row_index, row_index + 1) if 0 <= row < len(KEYBOARD_ROWS)
+                for col in (column - 1, column, column + 1)
+                if 0 <= col < len(KEYBOARD_ROWS[row]) and (row, col) != (row_index, column)
+            )
+    return neighbours
+
+
+KEYBOARD_NEIGHBOURS = keyboard_neighbours()
+
+# Known slot values in base phrases, longest first so "South Indian" wins over "Indian"
+SLOT_VALUES = {value.lower(): slot for slot, values in (
+    ('restaurant', RESTAURANTS), ('dish', DISHES), ('category', CATEGORIES), ('status', STATUSES)
+) for value in values}
+SLOT_VALUE_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(value) for value in sorted(SLOT_VALUES, key=len, reverse=True)) + r")\b"
+    r"|\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{6}\b"
+    r"|\b\d{2,4}\b",
+    re.IGNORECASE
+)
+
+
+def sample_rng(seed, epoch, index):
+    # Independent stream per (seed, epoch, index): the same variant whichever worker draws it
+    return random.Random(int(np.random.SeedSequence([seed, epoch, index]).generate_state(1)[0]))
+
+
+def match_case(source, replacement):
+    if source.isupper() and len(source) > 1:
+        return replacement.upper()
+    if source[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class Augmenter:
+    def __init__(self, probabilities=None, typo_rate=0.04):
+        self.probabilities = {**DEFAULT_PROBABILITIES, **(probabilities or {})}
+        self.typo_rate = typo_rate
+        self._fake = None
+
+    @property
+    def fake(self):
+        # Created lazily so each DataLoader worker builds its own after the fork
+        if self._fake is None:
+            self._fake = Faker()
+        return self._fake
+
+    def refill_slots(self, text, rng):
+        self.fake.seed_instance(rng.getrandbits(32))
+
+        def refill(match):
+            value = match.group(0)
+            if match.group(1):
+                slot = SLOT_VALUES[value.lower()]
+            else:
+                slot = 'price' if value.isdigit() else 'order_id'
+            replacement = slot_value(slot, rng, self.fake)
+            return replacement.lower() if value.islower() and slot != 'order_id' else replacement
+
+        return SLOT_VALUE_PATTERN.sub(refill, text)
+
+    def swap_synonyms(self, text, rng):
+        # Each matched term is swapped with probability 1/2, keeping its capitalisation
+        def swap(match):
+            word = match.group(0)
+            if rng.random() < 0.5:
+                return word
+            return match_case(word, rng.choice(SYNONYMS[word.lower()]))
+
+        return SYNONYM_PATTERN.sub(swap, text)
+
+    def add_typos(self, text, rng):
+        # Neighbour-key substitution, deletion, duplication or transposition inside words of 4+ letters
+        chars = list(text)
+        positions = [i for i, char in enumerate(chars) if char.isalpha()]
+        edits = max(1, round(len(positions) * self.typo_rate))
+        for i in sorted(rng.sample(positions, min(edits, len(positions))), reverse=True):
+            word_start = i
+            while word_start > 0 and chars[word_start - 1].isalpha():
+                word_start -= 1
+            word_end = i
+            while word_end < len(chars) and chars[word_end].isalpha():
+                word_end += 1
+            if word_end - word_start < 4:
+                continue
+            kind = rng.random()
+            lower = chars[i].lower()
+            if kind < 0.4 and lower in KEYBOARD_NEIGHBOURS:
+                chars[i] = match_case(chars[i], rng.choice(KEYBOARD_NEIGHBOURS[lower]))
+            elif kind < 0.6:
+                del chars[i]
+            elif kind < 0.8:
+                chars.insert(i, chars[i])
+            elif i + 1 < word_end:
+                chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        return ''.join(chars)
+
+    def change_case(self, text, rng):
+        return rng.choice([str.lower, str.lower, str.upper, str.capitalize, str.title])(text)
+
+    def change_punctuation(self, text, rng):
+        stripped = text.rstrip('?!. ')
+        ending = rng.choice(['', '', '?', '!', '.', '??'])
+        if rng.random() < 0.5:
+            stripped = stripped.replace("'", '').replace(',', '')
+        return stripped + ending
+
+    def __call__(self, text, rng, only=None):
+        # only: apply just that transform (always), as the robustness report does
+        variant = text
+        for name, method in TRANSFORMS.items():
+            if (only == name) if only else rng.random() < self.probabilities[name]:
+                variant = getattr(self, method)(variant, rng)
+        return variant.strip() or text
+
+
+class AugmentedDataset(torch.utils.data.Dataset):
+    # Wraps the tokenized train split (text, label, weight, input_ids, attention_mask). Item i of
+    # epoch e is the base phrase with probability keep_original, otherwise a fresh variant.
+    def __init__(self, dataset, tokenizer, max_length=128, seed=42, keep_original=0.2, augmenter=None,
+                 cache_size=50_000):
+        self.texts = dataset['text']
+        self.labels = dataset['label']
+        self.weights = dataset['weight']
+        self.input_ids = dataset['input_ids']
+        # Base phrase lengths, for length-grouped batching without drawing every variant up front
+        self.lengths = [len(ids) for ids in self.input_ids]
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.seed = seed
+        self.keep_original = keep_original
+        self.augmenter = augmenter or Augmenter()
+        self.cache_size = cache_size
+        self._cache = {}
+        # Shared with forked or spawned workers: the epoch, and [items, tokenizer calls, cache hits]
+        self._epoch = mp.Value('i', 0, lock=False)
+        self._stats = mp.Array('q', 3)
+
+    def set_epoch(self, epoch):
+        self._epoch.value = epoch
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _tokenize(self, text):
+        input_ids = self._cache.get(text)
+        if input_ids is None:
+            input_ids = self.tokenizer(text, truncation=True, max_length=self.max_length)['input_ids']
+            if len(self._cache) < self.cache_size:
+                self._cache[text] = input_ids
+            return input_ids, 1, 0
+        return input_ids, 0, 1
+
+    def __getitem__(self, index):
+        rng = sample_rng(self.seed, self._epoch.value, index)
+        tokenized = cached = 0
+        if rng.random() < self.keep_original:
+            input_ids = self.input_ids[index]
+        else:
+            variant = self.augmenter(self.texts[index], rng)
+            input_ids, tokenized, cached = self._tokenize(variant)
+        with self._stats.get_lock():
+            self._stats[0] += 1
+            self._stats[1] += tokenized
+            self._stats[2] += cached
+        return {
+            'input_ids': input_ids,
+            'attention_mask': [1] * len(input_ids),
+            'label': self.labels[index],
+            'weight': self.weights[index],
+        }
+
+    def stats(self):
+        items, tokenized, cached = self._stats[:]
+        return {'items': items, 'tokenizer_calls': tokenized, 'cache_hits': cached, 'base_reused': items - tokenized - cached}
+
+
+def epoch_callback(dataset):
+    from transformers import TrainerCallback
+
+    class AugmentationEpochCallback(TrainerCallback):
+        # Runs before the epoch's DataLoader iterator (and its workers) is created
+        def on_epoch_begin(self, args, state, control, **kwargs):
+            dataset.set_epoch(int(round(state.epoch or 0)))
+
+    return AugmentationEpochCallback()
+
+
+def format_augmentation_report(dataset, epochs, duplicated_rows):
+    stats = dataset.stats()
+    report = "Augmentation Report\n" + "=" * 60 + "\n"
+    report += f"Unique base phrases: {len(dataset)}, epochs: {epochs:g}\n"
+    report += f"Training items served: {stats['items']}\n"
+    report += (
+        f"Variants tokenized: {stats['tokenizer_calls']}, per-worker cache hits: {stats['cache_hits']}, "
+        f"base tokenization reused: {stats['base_reused']}\n"
+    )
+    report += (
+        f"A materialized corpus repeating phrases by weight would hold and tokenize {duplicated_rows} rows "
+        f"up front; augmentation keeps {len(dataset)} and tokenizes variants as they are drawn\n"
+    )
+    return report
+
+
+def robustness_accuracy(classifier, texts, labels, seed=0, augmenter=None):
+    # Accuracy on the clean texts and on copies with exactly one transform applied
+    augmenter = augmenter or Augmenter()
+    labels = np.asarray(labels)
+    results = {}
+    for stream, name in enumerate(['clean', *TRANSFORMS]):
+        if name == 'clean':
+            variants = list(texts)
+        else:
+            variants = [augmenter(text, sample_rng(seed, stream, index), only=name) for index, text in enumerate(texts)]
+        predictions = classifier.predict_logits(variants).argmax(dim=-1).numpy()
+        results[name] = float((predictions == labels).mean())
+    return results
+
+
+def format_robustness_report(results):
+    report = "Robustness Report (test split, one transform at a time)\n" + "=" * 60 + "\n"
+    for name, accuracy in results.items():
+        report += f"{name:<14}{accuracy:>10.2%}{accuracy - results['clean']:>+10.2%}\n"
+    return report
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Preview on-the-fly augmentation variants")
+    parser.add_argument('--data', default='./training_work/split/train.jsonl', help="JSONL or CSV with a 'text' column")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    frame = pd.read_csv(args.data) if args.data.endswith('.csv') else pd.read_json(args.data, lines=True)
+    preview_augmenter = Augmenter()
+    for row_index, base_text in enumerate(frame['text'].head(args.samples)):
+        print(f"'{base_text}'")
+        for preview_epoch in range(args.epochs):
+            print(f"   epoch {preview_epoch}: '{preview_augmenter(base_text, sample_rng(args.seed, preview_epoch, row_index))}'")
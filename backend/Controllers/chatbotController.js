@@ -5,10 +5,12 @@ import foodModel from "../models/foodModel.js";
 import orderModel from "../models/orderModel.js";
 import userModel from "../models/userModel.js";
 import jwt from 'jsonwebtoken';
+import axios from 'axios';
 import { pipeline } from '@xenova/transformers';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import fs from 'fs';
+import crypto from 'crypto';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -16,6 +18,71 @@ const __dirname = path.dirname(__filename);
 let classifier = null;
 let modelConfig = null;
 
+// Read the safetensors header (8-byte little-endian length, then JSON) and check that every tensor
+// ends inside the file, so a truncated model.safetensors is caught without reading the weights.
+const checkSafetensorsHeader = (filePath) => {
+    const size = fs.statSync(filePath).size;
+    const fd = fs.openSync(filePath, 'r');
+    try {
+        const prefix = Buffer.alloc(8);
+        if (size < 8 || fs.readSync(fd, prefix, 0, 8, 0) < 8) {
+            return `${size} bytes is too short for a safetensors file`;
+        }
+        const headerSize = Number(prefix.readBigUInt64LE(0));
+        if (8 + headerSize > size) {
+            return `header of ${headerSize} bytes runs past the end of the file`;
+        }
+        const headerBytes = Buffer.alloc(headerSize);
+        fs.readSync(fd, headerBytes, 0, headerSize, 8);
+        const header = JSON.parse(headerBytes.toString('utf8'));
+        for (const [name, entry] of Object.entries(header)) {
+            if (name !== '__metadata__' && 8 + headerSize + entry.data_offsets[1] > size) {
+                return `${name} ends past the end of the file (truncated?)`;
+            }
+        }
+        return null;
+    } catch (error) {
+        return `unreadable header: ${error.message}`;
+    } finally {
+        fs.closeSync(fd);
+    }
+};
+
+// Check every file listed in manifest.json (written by model.py's package stage) for size, and the
+// weights header for truncation. Hashing every file is left to deploy time (artifact_loader.py verify)
+// unless CHATBOT_VERIFY_HASHES=1. Returns a list of problems; an empty list means the directory
+// matches what was packaged.
+const verifyManifest = (modelDir, checkHashes = process.env.CHATBOT_VERIFY_HASHES === '1') => {
+    const manifest = JSON.parse(fs.readFileSync(path.join(modelDir, 'manifest.json'), 'utf8'));
+    const problems = [];
+    for (const [file, expected] of Object.entries(manifest.files)) {
+        const filePath = path.join(modelDir, file);
+        if (!fs.existsSync(filePath)) {
+            problems.push(`${file}: missing`);
+            continue;
+        }
+        const size = fs.statSync(filePath).size;
+        if (size !== expected.size) {
+            problems.push(`${file}: ${size} bytes, expected ${expected.size}`);
+            continue;
+        }
+        if (file.endsWith('.safetensors')) {
+            const headerProblem = checkSafetensorsHeader(filePath);
+            if (headerProblem) {
+                problems.push(`${file}: ${headerProblem}`);
+                continue;
+            }
+        }
+        if (checkHashes) {
+            const sha256 = crypto.createHash('sha256').update(fs.readFileSync(filePath)).digest('hex');
+            if (sha256 !== expected.sha256) {
+                problems.push(`${file}: SHA-256 mismatch`);
+            }
+        }
+    }
+    return problems;
+};
+
 // Load the trained model
 const loadModel = async () => {
     try {
@@ -32,14 +99,28 @@ const loadModel = async () => {
         const hasConfig = files.includes('config.json');
         const hasTokenizerConfig = files.includes('tokenizer_config.json');
         const hasTokenizer = files.includes('tokenizer.json');
-        const hasSafetensors = files.includes('model.safetensors');
         const hasVocab = files.includes('vocab.txt');
+        // @xenova/transformers runs the ONNX export written by export_onnx.py
+        const hasQuantizedOnnx = fs.existsSync(path.join(absoluteModelPath, 'onnx', 'model_quantized.onnx'));
+        const hasOnnx = hasQuantizedOnnx || fs.existsSync(path.join(absoluteModelPath, 'onnx', 'model.onnx'));
         
-        if (!hasConfig || !hasTokenizerConfig || !hasTokenizer || !hasSafetensors || !hasVocab) {
+        if (!hasConfig || !hasTokenizerConfig || !hasTokenizer || !hasOnnx || !hasVocab) {
             console.log('❌ Required model files missing, using enhanced keyword fallback');
             return;
         }
 
+        // Filenames alone let truncated or half-copied files through
+        if (files.includes('manifest.json')) {
+            const problems = verifyManifest(absoluteModelPath);
+            if (problems.length > 0) {
+                console.log('❌ Model files do not match manifest.json, using enhanced keyword fallback:', problems.join('; '));
+                return;
+            }
+            console.log('✅ Model files match manifest.json');
+        } else {
+            console.log('⚠️ No manifest.json found, model files are not integrity-checked');
+        }
+
         const configPath = path.join(absoluteModelPath, 'model_config.json');
         if (fs.existsSync(configPath)) {
             modelConfig = JSON.parse(fs.readFileSync(configPath, 'utf8'));
@@ -58,7 +139,8 @@ const loadModel = async () => {
                 modelPath,
                 { 
                     local_files_only: true,
-                    revision: 'main'
+                    revision: 'main',
+                    quantized: hasQuantizedOnnx
                 }
             );
             console.log('✅ Chatbot model loaded successfully');
@@ -79,7 +161,18 @@ const classifyIntent = async (message, userType, previousIntents = []) => {
     let confidence = 0.7;
 
     try {
-        if (classifier && modelConfig) {
+        // Micro-batching Python service (inference_server.py); it applies the user-type filter itself
+        if (process.env.CLASSIFIER_URL) {
+            const { data } = await axios.post(
+                `${process.env.CLASSIFIER_URL}/predict`,
+                { text: message, user_type: userType },
+                { timeout: 2000 }
+            );
+            console.log(`🎯 Model service prediction: ${data.intent} (${data.confidence})`);
+            if (data.confidence > 0.6) {
+                return { intent: data.intent, confidence: data.confidence };
+            }
+        } else if (classifier && modelConfig) {
             console.log('🤖 Using AI model for classification...');
             const results = await classifier(message);
             const topResult = results[0];
@@ -0,0 +1,283 @@
+# CPU serving benchmark for chatbot_model/ across runtimes and batch sizes. Each backend
+# runs in its own subprocess so cold-load time and peak RSS are measured in isolation.
+# Batches are drawn from real utterances and padded to their longest member; timings
+# include tokenization, as a /chat request would.
+#
+#   python benchmark_inference.py --model-path ./chatbot_model --data models/enhanced_chatbot_dataset.csv
+#   python benchmark_inference.py --baseline benchmark_baseline.json
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ['torch', 'torchscript', 'torch_compile', 'onnx_fp32', 'onnx_int8']
+DEFAULT_BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+ONNX_FILES = {'onnx_fp32': 'model.onnx', 'onnx_int8': 'model_quantized.onnx'}
+
+
+def peak_rss_mb():
+    # VmHWM belongs to this process image; Linux carries ru_maxrss over from the parent across fork + exec
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_backend(backend, model_path, threads, max_length):
+    # Returns predict(texts) -> logits as a numpy array
+    if backend in ONNX_FILES:
+        # tokenizers + onnxruntime only: importing transformers would pull in torch and its RSS
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        pad_token = '[PAD]'
+        special_tokens_path = os.path.join(model_path, 'special_tokens_map.json')
+        if os.path.exists(special_tokens_path):
+            with open(special_tokens_path) as f:
+                pad_token = json.load(f).get('pad_token', pad_token)
+                pad_token = pad_token['content'] if isinstance(pad_token, dict) else pad_token
+        tokenizer = Tokenizer.from_file(os.path.join(model_path, 'tokenizer.json'))
+        tokenizer.enable_truncation(max_length)
+        tokenizer.enable_padding(pad_id=tokenizer.token_to_id(pad_token), pad_token=pad_token)
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(
+            os.path.join(model_path, 'onnx', ONNX_FILES[backend]), options, providers=['CPUExecutionProvider']
+        )
+
+        def predict(texts):
+            encodings = tokenizer.encode_batch(texts)
+            feed = {
+                'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                'attention_mask': np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            }
+            return session.run(['logits'], feed)[0]
+        return predict
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    if threads:
+        torch.set_num_threads(threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    encode = lambda texts: tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path, torchscript=backend == 'torchscript')
+    model.eval()
+
+    if backend == 'torchscript':
+        example = encode(["Show cart", "Track my order please"])
+        with torch.inference_mode():
+            traced = torch.jit.trace(model, (example['input_ids'], example['attention_mask']))
+        runner = torch.jit.freeze(traced.eval())
+        forward = lambda inputs: runner(inputs['input_ids'], inputs['attention_mask'])[0]
+    elif backend == 'torch_compile':
+        compiled = torch.compile(model, dynamic=True)
+        forward = lambda inputs: compiled(**inputs).logits
+    else:
+        forward = lambda inputs: model(**inputs).logits
+
+    def predict(texts):
+        with torch.inference_mode():
+            return forward(encode(texts)).float().numpy()
+    return predict
+
+
+def run_worker(backend, model_path, texts, batch_sizes, iterations, threads, max_length):
+    start_time = time.perf_counter()
+    predict = load_backend(backend, model_path, threads, max_length)
+    load_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    predict(texts[:1])
+    first_inference_ms = (time.perf_counter() - start_time) * 1000
+
+    rng = np.random.default_rng(0)
+    batches = {}
+    for batch_size in batch_sizes:
+        # Random real utterances per batch, so padding reflects the actual length mix
+        samples = [[texts[i] for i in rng.integers(0, len(texts), batch_size)] for _ in range(iterations)]
+        for batch in samples[:3]:
+            predict(batch)
+
+        timings = []
+        for batch in samples:
+            start_time = time.perf_counter()
+            predict(batch)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        batches[str(batch_size)] = {
+            'p50_ms': float(np.percentile(timings, 50)),
+            'p99_ms': float(np.percentile(timings, 99)),
+            'throughput': batch_size * 1000 / float(np.mean(timings)),
+        }
+
+    return {
+        'cold_load_s': load_seconds,
+        'first_inference_ms': first_inference_ms,
+        'peak_rss_mb': peak_rss_mb(),
+        'batches': batches,
+    }
+
+
+def run_backend(backend, args, texts_path):
+    # Fresh interpreter per backend: no shared allocator state, imports or compiled kernels
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_path = f.name
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker', backend,
+        '--model-path', args.model_path, '--texts-file', texts_path, '--result-file', result_path,
+        '--batch-sizes', ','.join(map(str, args.batch_sizes)),
+        '--iterations', str(args.iterations), '--max-length', str(args.max_length),
+    ]
+    if args.threads:
+        command += ['--threads', str(args.threads)]
+
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout)
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+        with open(result_path) as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timed out after {args.timeout}s'}
+    finally:
+        os.unlink(result_path)
+
+
+def environment_info(args):
+    import onnxruntime as ort
+    import torch
+    import transformers
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'threads': args.threads,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'transformers': transformers.__version__,
+        'onnxruntime': ort.__version__,
+        'model_path': args.model_path,
+        'max_length': args.max_length,
+        'iterations': args.iterations,
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # A regression is slower p50 or lower throughput by more than tolerance, per backend and batch size
+    regressions = []
+    for backend, current in results['results'].items():
+        previous = baseline['results'].get(backend)
+        if not previous or 'error' in current or 'error' in previous:
+            continue
+        for batch_size, stats in current['batches'].items():
+            before = previous['batches'].get(batch_size)
+            if not before:
+                continue
+            if stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append(f"{backend} batch {batch_size}: p50 {before['p50_ms']:.2f} -> {stats['p50_ms']:.2f} ms")
+            if stats['throughput'] < before['throughput'] * (1 - tolerance):
+                regressions.append(
+                    f"{backend} batch {batch_size}: throughput {before['throughput']:.0f} -> {stats['throughput']:.0f} utt/s"
+                )
+        if current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{backend}: peak RSS {previous['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def format_results(results):
+    report = f"Inference Benchmark ({results['meta']['platform']}, {results['meta']['cpu_count']} CPUs)\n"
+    report += "=" * 78 + "\n"
+    for backend, stats in results['results'].items():
+        if 'error' in stats:
+            report += f"\n{backend}: skipped ({stats['error']})\n"
+            continue
+        report += (
+            f"\n{backend}: cold load {stats['cold_load_s']:.2f}s, first inference {stats['first_inference_ms']:.1f} ms, "
+            f"peak RSS {stats['peak_rss_mb']:.0f} MB\n"
+        )
+        report += f"   {'batch':>6}{'p50 ms':>10}{'p99 ms':>10}{'utt/sec':>10}\n"
+        for batch_size, batch in stats['batches'].items():
+            report += f"   {batch_size:>6}{batch['p50_ms']:>10.2f}{batch['p99_ms']:>10.2f}{batch['throughput']:>10.0f}\n"
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark chatbot_model/ across CPU inference backends")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--data', default=None, help="CSV with a 'text' column of real utterances")
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--batch-sizes', default=','.join(map(str, DEFAULT_BATCH_SIZES)))
+    parser.add_argument('--iterations', type=int, default=50, help="Timed batches per batch size")
+    parser.add_argument('--threads', type=int, default=None, help="Intra-op threads for every backend")
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--timeout', type=int, default=1800, help="Seconds per backend")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="Earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed relative slowdown vs baseline")
+    # Internal: one backend inside a fresh interpreter
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--texts-file', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+
+    if args.worker:
+        with open(args.texts_file) as f:
+            worker_texts = json.load(f)
+        worker_result = run_worker(
+            args.worker, args.model_path, worker_texts, args.batch_sizes, args.iterations, args.threads, args.max_length
+        )
+        with open(args.result_file, 'w') as f:
+            json.dump(worker_result, f)
+        sys.exit(0)
+
+    if args.data:
+        import pandas as pd
+        texts = pd.read_csv(args.data)['text'].dropna().tolist()
+    else:
+        from export_onnx import SAMPLE_TEXTS as texts
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(list(texts), f)
+        texts_path = f.name
+
+    results = {'meta': environment_info(args), 'results': {}}
+    try:
+        for backend in args.backends.split(','):
+            if backend in ONNX_FILES and not os.path.exists(os.path.join(args.model_path, 'onnx', ONNX_FILES[backend])):
+                results['results'][backend] = {'error': f"onnx/{ONNX_FILES[backend]} not found"}
+                continue
+            print(f"⏱️  Benchmarking {backend}...")
+            results['results'][backend] = run_backend(backend, args, texts_path)
+    finally:
+        os.unlink(texts_path)
+
+    print("\n" + format_results(results))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,82 @@
+# Post-training temperature scaling. A single temperature T is fitted on held-out logits
+# and folded into the classifier layer, so every runtime (PyTorch, ONNX, @xenova/transformers)
+# reads calibrated softmax scores without knowing about T.
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# classifyIntent in chatbotController.js only trusts the model above this score
+SERVING_THRESHOLD = 0.6
+
+
+def fit_temperature(logits, labels, max_iter=50):
+    # Single scalar T minimising held-out NLL of softmax(logits / T)
+    logits = torch.as_tensor(logits, dtype=torch.float32)
+    labels = torch.as_tensor(labels, dtype=torch.long)
+    log_temperature = torch.zeros(1, requires_grad=True)
+    optimizer = torch.optim.LBFGS([log_temperature], lr=0.1, max_iter=max_iter)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = F.cross_entropy(logits / log_temperature.exp(), labels)
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    return float(log_temperature.exp().item())
+
+
+def expected_calibration_error(probabilities, labels, n_bins=15):
+    probabilities = np.asarray(probabilities)
+    labels = np.asarray(labels)
+    confidences = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+
+    # Equal-width confidence bins; ECE is the count-weighted |accuracy - confidence| gap
+    bin_ids = np.minimum((confidences * n_bins).astype(int), n_bins - 1)
+    ece = 0.0
+    for bin_id in range(n_bins):
+        in_bin = bin_ids == bin_id
+        if in_bin.any():
+            ece += in_bin.mean() * abs(correct[in_bin].mean() - confidences[in_bin].mean())
+    return float(ece)
+
+
+def calibration_metrics(logits, labels, temperature=1.0, serving_threshold=SERVING_THRESHOLD):
+    logits = torch.as_tensor(logits, dtype=torch.float32) / temperature
+    labels_tensor = torch.as_tensor(labels, dtype=torch.long)
+    probabilities = torch.softmax(logits, dim=-1).numpy()
+    confidences = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == np.asarray(labels)
+    served = confidences > serving_threshold
+    return {
+        'nll': float(F.cross_entropy(logits, labels_tensor)),
+        'ece': expected_calibration_error(probabilities, labels),
+        'mean_confidence': float(confidences.mean()),
+        'accuracy': float(correct.mean()),
+        # Share of messages the backend would answer from the model without the keyword fallback
+        'served_by_model': float(served.mean()),
+        'served_accuracy': float(correct[served].mean()) if served.any() else 0.0,
+    }
+
+
+def fold_temperature(model, temperature):
+    # softmax(W x / T + b / T) == softmax((W x + b) / T)
+    classifier = model.classifier
+    with torch.no_grad():
+        classifier.weight.div_(temperature)
+        classifier.bias.div_(temperature)
+
+
+def format_calibration_report(temperature, splits):
+    report = "Calibration Report (temperature scaling)\n"
+    report += "=" * 86 + "\n"
+    report += f"Fitted temperature: {temperature:.4f}\n\n"
+    report += f"{'split':<14}{'':<8}{'NLL':>8}{'ECE':>8}{'mean conf':>11}{'accuracy':>10}{f'> {SERVING_THRESHOLD}':>8}{'acc > thr':>11}\n"
+    for split, (before, after) in splits.items():
+        for label, metrics in (('before', before), ('after', after)):
+            report += (
+                f"{split:<14}{label:<8}{metrics['nll']:>8.4f}{metrics['ece']:>8.4f}{metrics['mean_confidence']:>11.4f}"
+                f"{metrics['accuracy']:>10.2%}{metrics['served_by_model']:>8.1%}{metrics['served_accuracy']:>11.2%}\n"
+            )
+    return report
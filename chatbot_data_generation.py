@@ -1,219 +1,520 @@
-import pandas as pd
-import random
-from faker import Faker
+import argparse
+import csv
+import glob
 import json
 import os
+import random
+import re
+from collections import Counter
+from multiprocessing import Pool
 
-fake = Faker()
+import pandas as pd
+from faker import Faker
 
-def generate_enhanced_dataset():
-    data = []
+# Each phrase is emitted once with a sample weight instead of being repeated,
+# which keeps the old `* 5` (admin) / `* 8` (customer) class balance without
+# duplicate rows leaking across the train/test split.
+ADMIN_WEIGHT = 5
+CUSTOMER_WEIGHT = 8
+
+# Enhanced Admin Intents with more variations
+ADMIN_INTENTS = {
+    'list_restaurants': [
+        "Show all restaurants", "List restaurants", "Display restaurants",
+        "What restaurants do we have?", "Show restaurant list",
+        "Get all restaurants", "View restaurants", "Restaurant list please",
+        "Can you show restaurants?", "I want to see all restaurants",
+        "Show me the restaurants", "Display all restaurants",
+        "List all restaurants in system", "What restaurants are available?",
+        "Show available restaurants", "Restaurants menu",
+        "Show restaurant database", "View all restaurants",
+        "Display restaurant list", "Show me restaurants",
+        "Need restaurant list", "Give me restaurant details",
+        "Restaurant information", "All restaurant data",
+        "Current restaurants", "Active restaurants"
+    ],
     
-    # Enhanced Admin Intents with more variations
-    admin_intents = {
-        'list_restaurants': [
-            "Show all restaurants", "List restaurants", "Display restaurants",
-            "What restaurants do we have?", "Show restaurant list",
-            "Get all restaurants", "View restaurants", "Restaurant list please",
-            "Can you show restaurants?", "I want to see all restaurants",
-            "Show me the restaurants", "Display all restaurants",
-            "List all restaurants in system", "What restaurants are available?",
-            "Show available restaurants", "Restaurants menu",
-            "Show restaurant database", "View all restaurants",
-            "Display restaurant list", "Show me restaurants",
-            "Need restaurant list", "Give me restaurant details",
-            "Restaurant information", "All restaurant data",
-            "Current restaurants", "Active restaurants"
-        ] * 5,
-        
-        'list_foods': [
-            "Show all food items", "List food items", "Display menu",
-            "What food items do we have?", "Show food list",
-            "Get all food items", "View food menu", "Food list please",
-            "Can you show food items?", "I want to see all foods",
-            "Show me the food menu", "Display all foods",
-            "List all food items", "What food is available?",
-            "Show available food", "Food menu",
-            "Show food database", "View all food items",
-            "Display food list", "Show me food items",
-            "Menu items list", "All dishes available",
-            "Current food menu", "Food inventory"
-        ] * 5,
-        
-        'list_orders': [
-            "Show all orders", "List orders", "Display orders",
-            "What orders do we have?", "Show order list",
-            "Get all orders", "View orders", "Order list please",
-            "Can you show orders?", "I want to see all orders",
-            "Show me the orders", "Display all orders",
-            "List all orders", "What orders are pending?",
-            "Show recent orders", "Orders database",
-            "Show order database", "View all orders",
-            "Display order list", "Show me orders",
-            "Order history", "All placed orders",
-            "Current orders status", "Pending orders list"
-        ] * 5,
-        
-        'add_restaurant': [
-            "Add new restaurant", "Create restaurant", "New restaurant",
-            "Add a restaurant", "Create new restaurant",
-            "Register restaurant", "Add restaurant to system",
-            "Create a restaurant", "Add new food place",
-            "Register new restaurant", "Add restaurant entry",
-            "Create restaurant entry", "Add dining place",
-            "Register food outlet", "Add new outlet",
-            "Create food establishment", "Add restaurant profile",
-            "Register restaurant profile", "Add new restaurant entry",
-            "Add restaurant: Pizza Palace, 123 Main St, 555-0123",
-            "Create restaurant: Burger King, 456 Oak Ave, 555-0456",
-            "New restaurant: Sushi Place, 789 Pine Rd, 555-0789"
-        ] * 5,
-        
-        'add_food': [
-            "Add new food item", "Create food item", "New food item",
-            "Add a food item", "Create new food",
-            "Register food item", "Add food to menu",
-            "Create a food item", "Add new dish",
-            "Register new food", "Add food entry",
-            "Create food entry", "Add new menu item",
-            "Register dish", "Add new food product",
-            "Create food product", "Add menu item",
-            "Register menu item", "Add new food entry",
-            "Add food: Burger, Beef burger with cheese, 180, Fast Food, Pizza Palace",
-            "Create food: Pizza, Margherita pizza, 300, Italian, Pizza Palace",
-            "Add dish: Pasta, Creamy Alfredo pasta, 250, Italian, Italian Bistro"
-        ] * 5,
-        
-        'update_order_status': [
-            "Update order status", "Change order status", "Modify order status",
-            "Update order state", "Change order state",
-            "Modify order state", "Update delivery status",
-            "Change delivery status", "Update order progress",
-            "Change order progress", "Mark order as delivered",
-            "Update order to delivered", "Change status of order",
-            "Modify order delivery", "Update order completion",
-            "Update order abc123 to Delivered",
-            "Change order xyz789 to Preparing",
-            "Mark order def456 as Completed"
-        ] * 5,
-        
-        'delete_restaurant': [
-            "Delete restaurant", "Remove restaurant", "Delete a restaurant",
-            "Remove a restaurant", "Delete restaurant entry",
-            "Remove restaurant from system", "Delete food place",
-            "Remove dining place", "Delete restaurant profile",
-            "Remove restaurant entry", "Delete outlet",
-            "Remove food outlet", "Delete establishment",
-            "Remove food establishment", "Delete restaurant record"
-        ] * 5,
-        
-        'delete_food': [
-            "Delete food item", "Remove food item", "Delete a food item",
-            "Remove a food item", "Delete food entry",
-            "Remove food from menu", "Delete dish",
-            "Remove dish", "Delete menu item",
-            "Remove menu item", "Delete food product",
-            "Remove food product", "Delete food record"
-        ] * 5,
-        
-        'view_stats': [
-            "Show statistics", "View dashboard", "Display stats",
-            "Show report", "View summary",
-            "Display analytics", "Show performance",
-            "View metrics", "Display dashboard",
-            "Show business stats", "View sales data",
-            "Display revenue report", "Show order analytics"
-        ] * 5
-    }
+    'list_foods': [
+        "Show all food items", "List food items", "Display menu",
+        "What food items do we have?", "Show food list",
+        "Get all food items", "View food menu", "Food list please",
+        "Can you show food items?", "I want to see all foods",
+        "Show me the food menu", "Display all foods",
+        "List all food items", "What food is available?",
+        "Show available food", "Food menu",
+        "Show food database", "View all food items",
+        "Display food list", "Show me food items",
+        "Menu items list", "All dishes available",
+        "Current food menu", "Food inventory"
+    ],
     
-    # Enhanced Customer Intents
-    customer_intents = {
-        'search_food_name': [
-            "Find pizza", "Search for burger", "Look for pasta",
-            "Find sushi", "Search salad", "Look for rice",
-            "Find noodles", "Search sandwich", "Look for dessert",
-            "Find beverages", "Search drinks", "Look for appetizers"
-        ] * 8,
-        
-        'search_food_category': [
-            "Find Italian food", "Search Chinese", "Look for Mexican",
-            "Find Indian cuisine", "Search Japanese", "Look for Thai",
-            "Find fast food", "Search vegetarian", "Look for vegan options"
-        ] * 8,
-        
-        'view_cart': [
-            "Show cart", "View cart", "Display cart",
-            "What's in my cart?", "Show my cart",
-            "View my cart", "Display my cart",
-            "Show shopping cart", "View basket",
-            "Show basket", "What do I have in cart?"
-        ] * 8,
-        
-        'add_to_cart': [
-            "Add to cart", "Put in cart", "Add item to cart",
-            "Add to basket", "Put in basket",
-            "Add to shopping cart", "Include in order",
-            "Add this to cart", "Put this in cart"
-        ] * 8,
-        
-        'place_order': [
-            "Checkout", "Place order", "Order now",
-            "Proceed to checkout", "Complete order",
-            "Make order", "Submit order",
-            "Finalize order", "Confirm order"
-        ] * 8,
-        
-        'order_history': [
-            "My orders", "Order history", "Past orders",
-            "View my orders", "Show my orders",
-            "Display my orders", "Order tracking",
-            "My order history", "Previous orders"
-        ] * 8,
-        
-        'track_order': [
-            "Track order", "Where is my order", "Order status",
-            "Check order progress", "Order delivery status",
-            "My order tracking", "Where's my food"
-        ] * 8
-    }
+    'list_orders': [
+        "Show all orders", "List orders", "Display orders",
+        "What orders do we have?", "Show order list",
+        "Get all orders", "View orders", "Order list please",
+        "Can you show orders?", "I want to see all orders",
+        "Show me the orders", "Display all orders",
+        "List all orders", "What orders are pending?",
+        "Show recent orders", "Orders database",
+        "Show order database", "View all orders",
+        "Display order list", "Show me orders",
+        "Order history", "All placed orders",
+        "Current orders status", "Pending orders list"
+    ],
     
-    # Generate admin data
-    for intent, samples in admin_intents.items():
-        for text in samples:
-            data.append({
-                "text": text,
-                "intent": f"admin_{intent}",
-                "user_type": "admin"
-            })
+    'add_restaurant': [
+        "Add new restaurant", "Create restaurant", "New restaurant",
+        "Add a restaurant", "Create new restaurant",
+        "Register restaurant", "Add restaurant to system",
+        "Create a restaurant", "Add new food place",
+        "Register new restaurant", "Add restaurant entry",
+        "Create restaurant entry", "Add dining place",
+        "Register food outlet", "Add new outlet",
+        "Create food establishment", "Add restaurant profile",
+        "Register restaurant profile", "Add new restaurant entry",
+        "Add restaurant: Pizza Palace, 123 Main St, 555-0123",
+        "Create restaurant: Burger King, 456 Oak Ave, 555-0456",
+        "New restaurant: Sushi Place, 789 Pine Rd, 555-0789"
+    ],
+    
+    'add_food': [
+        "Add new food item", "Create food item", "New food item",
+        "Add a food item", "Create new food",
+        "Register food item", "Add food to menu",
+        "Create a food item", "Add new dish",
+        "Register new food", "Add food entry",
+        "Create food entry", "Add new menu item",
+        "Register dish", "Add new food product",
+        "Create food product", "Add menu item",
+        "Register menu item", "Add new food entry",
+        "Add food: Burger, Beef burger with cheese, 180, Fast Food, Pizza Palace",
+        "Create food: Pizza, Margherita pizza, 300, Italian, Pizza Palace",
+        "Add dish: Pasta, Creamy Alfredo pasta, 250, Italian, Italian Bistro"
+    ],
+    
+    'update_order_status': [
+        "Update order status", "Change order status", "Modify order status",
+        "Update order state", "Change order state",
+        "Modify order state", "Update delivery status",
+        "Change delivery status", "Update order progress",
+        "Change order progress", "Mark order as delivered",
+        "Update order to delivered", "Change status of order",
+        "Modify order delivery", "Update order completion",
+        "Update order abc123 to Delivered",
+        "Change order xyz789 to Preparing",
+        "Mark order def456 as Completed"
+    ],
+    
+    'delete_restaurant': [
+        "Delete restaurant", "Remove restaurant", "Delete a restaurant",
+        "Remove a restaurant", "Delete restaurant entry",
+        "Remove restaurant from system", "Delete food place",
+        "Remove dining place", "Delete restaurant profile",
+        "Remove restaurant entry", "Delete outlet",
+        "Remove food outlet", "Delete establishment",
+        "Remove food establishment", "Delete restaurant record"
+    ],
+    
+    'delete_food': [
+        "Delete food item", "Remove food item", "Delete a food item",
+        "Remove a food item", "Delete food entry",
+        "Remove food from menu", "Delete dish",
+        "Remove dish", "Delete menu item",
+        "Remove menu item", "Delete food product",
+        "Remove food product", "Delete food record"
+    ],
+    
+    'view_stats': [
+        "Show statistics", "View dashboard", "Display stats",
+        "Show report", "View summary",
+        "Display analytics", "Show performance",
+        "View metrics", "Display dashboard",
+        "Show business stats", "View sales data",
+        "Display revenue report", "Show order analytics"
+    ],
+}
+
+# Enhanced Customer Intents
+CUSTOMER_INTENTS = {
+    'search_food_name': [
+        "Find pizza", "Search for burger", "Look for pasta",
+        "Find sushi", "Search salad", "Look for rice",
+        "Find noodles", "Search sandwich", "Look for dessert",
+        "Find beverages", "Search drinks", "Look for appetizers"
+    ],
+    
+    'search_food_category': [
+        "Find Italian food", "Search Chinese", "Look for Mexican",
+        "Find Indian cuisine", "Search Japanese", "Look for Thai",
+        "Find fast food", "Search vegetarian", "Look for vegan options"
+    ],
     
-    # Generate customer data  
-    for intent, samples in customer_intents.items():
-        for text in samples:
-            data.append({
-                "text": text,
-                "intent": f"customer_{intent}",
-                "user_type": "customer"
-            })
+    'view_cart': [
+        "Show cart", "View cart", "Display cart",
+        "What's in my cart?", "Show my cart",
+        "View my cart", "Display my cart",
+        "Show shopping cart", "View basket",
+        "Show basket", "What do I have in cart?"
+    ],
     
+    'add_to_cart': [
+        "Add to cart", "Put in cart", "Add item to cart",
+        "Add to basket", "Put in basket",
+        "Add to shopping cart", "Include in order",
+        "Add this to cart", "Put this in cart"
+    ],
+    
+    'place_order': [
+        "Checkout", "Place order", "Order now",
+        "Proceed to checkout", "Complete order",
+        "Make order", "Submit order",
+        "Finalize order", "Confirm order"
+    ],
+    
+    'order_history': [
+        "My orders", "Order history", "Past orders",
+        "View my orders", "Show my orders",
+        "Display my orders", "Order tracking",
+        "My order history", "Previous orders"
+    ],
+    
+    'track_order': [
+        "Track order", "Where is my order", "Order status",
+        "Check order progress", "Order delivery status",
+        "My order tracking", "Where's my food"
+    ],
+}
+
+
+# Slot templates for synthetic corpora; slots are filled per row from the value pools below
+SLOT_TEMPLATES = {
+    'admin_add_restaurant': [
+        "Add restaurant: {restaurant}, {address}, {phone}",
+        "Create restaurant: {restaurant}, {address}, {phone}",
+        "New restaurant: {restaurant}, {address}, {phone}",
+        "Register {restaurant} at {address}, phone {phone}"
+    ],
+    'admin_add_food': [
+        "Add food: {dish}, {description}, {price}, {category}, {restaurant}",
+        "Create food: {dish}, {description}, {price}, {category}, {restaurant}",
+        "Add dish: {dish}, {description}, {price}, {category}, {restaurant}",
+        "Add {dish} to the {restaurant} menu for {price}"
+    ],
+    'admin_update_order_status': [
+        "Update order {order_id} to {status}",
+        "Change order {order_id} to {status}",
+        "Mark order {order_id} as {status}",
+        "Set status of order {order_id} to {status}"
+    ],
+    'admin_delete_restaurant': [
+        "Delete restaurant {restaurant}",
+        "Remove restaurant {restaurant}",
+        "Remove {restaurant} from the system"
+    ],
+    'admin_delete_food': [
+        "Delete food item {dish}",
+        "Remove {dish} from menu",
+        "Delete dish {dish}"
+    ],
+    'customer_search_food_name': [
+        "Find {dish}",
+        "Search for {dish}",
+        "Look for {dish}",
+        "I want to order {dish}"
+    ],
+    'customer_search_food_category': [
+        "Find {category} food",
+        "Search {category}",
+        "Look for {category} cuisine",
+        "Show me {category} dishes"
+    ],
+    'customer_add_to_cart': [
+        "Add {dish} to cart",
+        "Put {dish} in my cart",
+        "Add {dish} to basket"
+    ],
+    'customer_track_order': [
+        "Track order {order_id}",
+        "Where is order {order_id}",
+        "Status of my order {order_id}"
+    ]
+}
+
+RESTAURANTS = [
+    "Pizza Palace", "Burger King", "Sushi Place", "Italian Bistro", "Spice Garden",
+    "Dragon Wok", "Taco Fiesta", "Curry House", "Green Bowl", "Noodle Bar"
+]
+DISHES = [
+    "Burger", "Pizza", "Pasta", "Sushi", "Salad", "Fried Rice", "Noodles", "Sandwich",
+    "Biryani", "Dosa", "Tacos", "Paneer Tikka", "Ramen", "Fries", "Chicken Wings"
+]
+DISH_STYLES = ["Creamy", "Spicy", "Classic", "Grilled", "Cheesy", "Crispy", "Smoky", "Garlic"]
+CATEGORIES = [
+    "Italian", "Chinese", "Mexican", "Indian", "Japanese", "Thai", "Fast Food",
+    "Vegetarian", "Vegan", "Continental", "South Indian", "North Indian"
+]
+STATUSES = ["Pending", "Preparing", "Out for Delivery", "Delivered", "Completed", "Cancelled"]
+
+SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+# Slot names in template order, and the BIO tag set the joint intent + slot model predicts
+SLOT_NAMES = list(dict.fromkeys(
+    slot for templates in SLOT_TEMPLATES.values() for template in templates for slot in SLOT_PATTERN.findall(template)
+))
+SLOT_TAGS = ["O"] + [f"{prefix}-{slot}" for slot in SLOT_NAMES for prefix in ("B", "I")]
+# Words and punctuation; "555-1234", "Smith's" and "a1b2c3" stay single words
+WORD_PATTERN = re.compile(r"\w+(?:[-'.]\w+)*|[^\w\s]")
+
+
+def slot_value(slot, rng, fake):
+    if slot == 'restaurant':
+        return rng.choice(RESTAURANTS) if rng.random() < 0.5 else f"{fake.last_name()}'s {rng.choice(['Kitchen', 'Diner', 'Grill', 'Cafe'])}"
+    if slot == 'dish':
+        return rng.choice(DISHES)
+    if slot == 'description':
+        return f"{rng.choice(DISH_STYLES)} {rng.choice(DISHES).lower()}"
+    if slot == 'price':
+        return str(rng.randrange(50, 1000, 10))
+    if slot == 'category':
+        return rng.choice(CATEGORIES)
+    if slot == 'address':
+        return fake.street_address()
+    if slot == 'phone':
+        return fake.numerify("555-####")
+    if slot == 'order_id':
+        return fake.hexify("^^^^^^")
+    if slot == 'status':
+        return rng.choice(STATUSES)
+    raise KeyError(f"Unknown slot: {slot}")
+
+
+def fill_template(template, rng, fake):
+    # Returns the filled text plus (slot, start, end) character spans of every value
+    parts, spans, cursor = [], [], 0
+    for match in SLOT_PATTERN.finditer(template):
+        parts.append(template[cursor:match.start()])
+        offset = sum(len(part) for part in parts)
+        value = slot_value(match.group(1), rng, fake)
+        spans.append((match.group(1), offset, offset + len(value)))
+        parts.append(value)
+        cursor = match.end()
+    parts.append(template[cursor:])
+    return "".join(parts), spans
+
+
+def word_spans(text):
+    return [(match.group(), match.start(), match.end()) for match in WORD_PATTERN.finditer(text)]
+
+
+def bio_tags(text, spans):
+    # Word-level BIO tags from fill_template's character spans
+    words = word_spans(text)
+    tags = ["O"] * len(words)
+    for slot, start, end in spans:
+        inside = [i for i, (_, word_start, word_end) in enumerate(words) if word_start < end and word_end > start]
+        for position, i in enumerate(inside):
+            tags[i] = f"{'B' if position == 0 else 'I'}-{slot}"
+    return [word for word, _, _ in words], tags
+
+
+def normalize_text(text):
+    # Grouping key for near-identical utterances: "Show cart", "show cart?" -> "show cart"
+    text = text.lower().replace("'", "")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def generate_enhanced_dataset():
+    data = []
+    seen = {}
+
+    def add_samples(intents, prefix, user_type, weight):
+        for intent, samples in intents.items():
+            for text in samples:
+                # The same phrase may mean different things to admins and customers
+                key = (user_type, normalize_text(text))
+                if key in seen:
+                    # Fold repeats into the existing row's weight; never emit the same text twice
+                    existing = seen[key]
+                    if existing["intent"] == f"{prefix}_{intent}":
+                        existing["weight"] += weight
+                    else:
+                        print(f"Skipping '{text}': already labelled {existing['intent']}")
+                    continue
+
+                row = {
+                    "text": text,
+                    "intent": f"{prefix}_{intent}",
+                    "user_type": user_type,
+                    "weight": weight
+                }
+                seen[key] = row
+                data.append(row)
+
+    # Generate admin data
+    add_samples(ADMIN_INTENTS, "admin", "admin", ADMIN_WEIGHT)
+
+    # Generate customer data
+    add_samples(CUSTOMER_INTENTS, "customer", "customer", CUSTOMER_WEIGHT)
+
     return data
 
-# Generate and save dataset
-print("Generating enhanced chatbot dataset...")
-dataset = generate_enhanced_dataset()
-df = pd.DataFrame(dataset)
 
-print(f"Generated {len(df)} samples")
-print("Intent distribution:")
-print(df['intent'].value_counts())
+def intent_sources():
+    # (intent, user_type, class weight, plain phrases, slot templates) for every intent
+    sources = []
+    for intents, prefix, weight in (
+        (ADMIN_INTENTS, "admin", ADMIN_WEIGHT),
+        (CUSTOMER_INTENTS, "customer", CUSTOMER_WEIGHT)
+    ):
+        for intent, samples in intents.items():
+            name = f"{prefix}_{intent}"
+            sources.append((name, prefix, weight * len(samples), samples, SLOT_TEMPLATES.get(name, [])))
+    return sources
+
+
+def iter_synthetic_rows(num_rows, seed, template_ratio=0.5):
+    # Deterministic for a given seed; intents are drawn with the same class balance as the base dataset
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    sources = intent_sources()
+    class_weights = [source[2] for source in sources]
+
+    for _ in range(num_rows):
+        intent, user_type, _, samples, templates = rng.choices(sources, weights=class_weights)[0]
+        if templates and rng.random() < template_ratio:
+            text, _ = fill_template(rng.choice(templates), rng, fake)
+        else:
+            text = rng.choice(samples)
+        yield {"text": text, "intent": intent, "user_type": user_type}
+
+
+def iter_slot_rows(num_rows, seed, plain_ratio=0.3):
+    # BIO-tagged rows for the joint intent + slot model: filled templates, plus plain phrases tagged all "O"
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    sources = intent_sources()
+    templated = [source for source in sources if source[4]]
+
+    for _ in range(num_rows):
+        if rng.random() < plain_ratio:
+            intent, user_type, _, samples, _ = rng.choices(sources, weights=[source[2] for source in sources])[0]
+            text, spans = rng.choice(samples), []
+        else:
+            intent, user_type, _, _, templates = rng.choice(templated)
+            text, spans = fill_template(rng.choice(templates), rng, fake)
+        words, tags = bio_tags(text, spans)
+        yield {"text": text, "intent": intent, "user_type": user_type, "words": words, "tags": tags}
+
+
+def shard_seed(seed, shard_index):
+    return seed * 1_000_003 + shard_index
+
+
+def write_shard(job):
+    shard_index, num_rows, seed, output_dir, file_format, batch_size = job
+    rows = iter_synthetic_rows(num_rows, shard_seed(seed, shard_index))
+
+    if file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(output_dir, f"shard-{shard_index:05d}.parquet")
+        schema = pa.schema([("text", pa.string()), ("intent", pa.string()), ("user_type", pa.string())])
+        with pq.ParquetWriter(path, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    else:
+        path = os.path.join(output_dir, f"shard-{shard_index:05d}.jsonl")
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    return path, num_rows
+
+
+def generate_corpus(num_rows, output_dir, num_shards=8, workers=None, seed=42, file_format="jsonl", batch_size=10_000):
+    # Each shard streams its rows straight to disk, so memory stays bounded regardless of corpus size
+    os.makedirs(output_dir, exist_ok=True)
+    rows_per_shard = [num_rows // num_shards + (1 if i < num_rows % num_shards else 0) for i in range(num_shards)]
+    jobs = [
+        (shard_index, count, seed, output_dir, file_format, batch_size)
+        for shard_index, count in enumerate(rows_per_shard)
+    ]
+    with Pool(processes=workers) as pool:
+        for path, count in pool.imap_unordered(write_shard, jobs):
+            print(f"   📄 {path}: {count} rows")
+    return sorted(glob.glob(os.path.join(output_dir, f"shard-*.{file_format}")))
+
+
+def shard_paths(path):
+    # A directory of shards, a glob pattern, or a single shard file
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.parquet")))
+    return sorted(glob.glob(path))
+
+
+def iter_shard_frames(path, chunksize=100_000):
+    # Stream JSONL/Parquet shards as DataFrame chunks without loading a whole corpus at once
+    for shard in shard_paths(path):
+        if shard.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(shard).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_json(shard, lines=True, chunksize=chunksize)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the chatbot intent dataset")
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic rows to generate; 0 writes the base dataset")
+    parser.add_argument("--output", default="models/enhanced_chatbot_dataset.csv", help="Base dataset CSV path")
+    parser.add_argument("--output-dir", default="models/synthetic_corpus", help="Shard directory for --rows")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--slot-rows", type=int, default=0, help="BIO-tagged rows for the joint intent + slot model")
+    parser.add_argument("--slot-output", default="models/slot_dataset.jsonl")
+    args = parser.parse_args()
 
-# Create models directory if it doesn't exist
-os.makedirs('models', exist_ok=True)
+    if args.slot_rows:
+        print(f"Generating {args.slot_rows} BIO-tagged slot rows...")
+        os.makedirs(os.path.dirname(args.slot_output) or ".", exist_ok=True)
+        with open(args.slot_output, "w") as f:
+            for row in iter_slot_rows(args.slot_rows, args.seed):
+                f.write(json.dumps(row) + "\n")
+        print(f"Slot dataset saved successfully to {args.slot_output}!")
+    elif args.rows:
+        print(f"Generating {args.rows} synthetic rows across {args.shards} shards...")
+        shards = generate_corpus(args.rows, args.output_dir, args.shards, args.workers, args.seed, args.format)
+        print(f"Corpus saved successfully: {len(shards)} shards in {args.output_dir}")
+    else:
+        # Generate and save dataset
+        print("Generating enhanced chatbot dataset...")
+        dataset = generate_enhanced_dataset()
 
-# Save to files
-df.to_csv('models/enhanced_chatbot_dataset.csv', index=False)
+        print(f"Generated {len(dataset)} unique samples ({sum(row['weight'] for row in dataset)} weighted)")
+        print("Intent distribution (unique / weighted):")
+        counts, weights = Counter(), Counter()
+        for row in dataset:
+            counts[row["intent"]] += 1
+            weights[row["intent"]] += row["weight"]
+        for intent in sorted(counts):
+            print(f"  {intent:<32}{counts[intent]:>5}{weights[intent]:>6}")
 
-# Also save as JSON for training
-with open('models/enhanced_chatbot_dataset.json', 'w') as f:
-    json.dump(dataset, f, indent=2)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["text", "intent", "user_type", "weight"])
+            writer.writeheader()
+            writer.writerows(dataset)
 
-print("Dataset saved successfully to models/ folder!")
\ No newline at end of file
+        print(f"Dataset saved successfully to {args.output}!")
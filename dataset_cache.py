@@ -0,0 +1,138 @@
+# On-disk cache of tokenized train/calibration/test splits, stored as Arrow files that
+# datasets memory-maps on load. Entries are keyed by a content hash of everything that
+# changes the tokenized output, and the cache directory is kept under a size budget.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from datasets import DatasetDict
+
+from chatbot_data_generation import shard_paths
+from stage_cache import hash_file
+
+# Bump when the split / tokenization code changes in a way the key can't see
+CACHE_VERSION = 1
+
+
+def tokenizer_fingerprint(tokenizer):
+    # Hash the files the tokenizer would save: vocab, tokenizer.json, configs
+    digest = hashlib.sha256()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tokenizer.save_pretrained(tmp_dir)
+        for name in sorted(os.listdir(tmp_dir)):
+            digest.update(name.encode())
+            digest.update(hash_file(os.path.join(tmp_dir, name)).encode())
+    return digest.hexdigest()
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+class DatasetCache:
+    def __init__(self, cache_dir='./dataset_cache', max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._hash_index_path = os.path.join(cache_dir, 'file_hashes.json')
+
+    def data_fingerprint(self, data_path):
+        # Content hash of the CSV or every shard; per-file hashes are memoized on (size, mtime),
+        # one index entry per file that is replaced when the file changes
+        files = [data_path] if os.path.isfile(data_path) else shard_paths(data_path)
+        if not files:
+            raise FileNotFoundError(f"No data files found at {data_path}")
+
+        hash_index = {}
+        if os.path.exists(self._hash_index_path):
+            with open(self._hash_index_path) as f:
+                # Entries for deleted files and the old "path:size:mtime" string entries are dropped
+                hash_index = {
+                    path: entry for path, entry in json.load(f).items()
+                    if isinstance(entry, dict) and os.path.exists(path)
+                }
+
+        digest = hashlib.sha256()
+        for path in files:
+            stat = os.stat(path)
+            entry = hash_index.get(os.path.abspath(path))
+            if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_file(path)}
+                hash_index[os.path.abspath(path)] = entry
+            digest.update(os.path.basename(path).encode())
+            digest.update(entry['sha256'].encode())
+
+        with open(self._hash_index_path, 'w') as f:
+            json.dump(hash_index, f)
+        return digest.hexdigest()
+
+    def make_key(self, data_path, tokenizer, max_length, split_seed):
+        parts = {
+            'version': CACHE_VERSION,
+            'data': self.data_fingerprint(data_path),
+            'tokenizer': tokenizer_fingerprint(tokenizer),
+            'max_length': max_length,
+            'split_seed': split_seed,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        entry_path = self._entry_path(key)
+        meta_path = os.path.join(entry_path, 'meta.json')
+        if not os.path.exists(meta_path):
+            print(f"🗄️  Dataset cache miss: {key[:12]}")
+            return None
+
+        start_time = time.perf_counter()
+        splits = DatasetDict.load_from_disk(os.path.join(entry_path, 'splits'))
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        # mtime doubles as last-access time for eviction
+        os.utime(entry_path)
+        print(f"🗄️  Dataset cache hit: {key[:12]} (loaded in {(time.perf_counter() - start_time) * 1000:.1f} ms)")
+        return splits, meta
+
+    def save(self, key, splits, meta):
+        entry_path = self._entry_path(key)
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            splits.save_to_disk(os.path.join(tmp_path, 'splits'))
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            os.replace(tmp_path, entry_path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        print(f"🗄️  Dataset cache stored: {key[:12]} ({directory_size(entry_path) / 1e6:.1f} MB)")
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        # Drop least recently used entries until the cache fits in max_bytes
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and name != keep:
+                entries.append((os.path.getmtime(path), directory_size(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep and os.path.isdir(self._entry_path(keep)):
+            total += directory_size(self._entry_path(keep))
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"🗑️  Evicted dataset cache entry {os.path.basename(path)[:12]} ({size / 1e6:.1f} MB)")
@@ -0,0 +1,202 @@
+# Knowledge distillation of the fine-tuned DistilBERT teacher into a tiny CPU student.
+# The student is a shallow, narrow DistilBertForSequenceClassification, so it is saved
+# in the same chatbot_model/ layout and loads anywhere the teacher does.
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import DistilBertConfig, DistilBertForSequenceClassification, Trainer, TrainingArguments
+
+from export_onnx import measure_latency
+from intent_classifier import IntentClassifier
+
+STUDENT_DEFAULTS = {
+    'n_layers': 2,
+    'dim': 256,
+    'hidden_dim': 1024,
+    'n_heads': 4,
+}
+
+
+def build_student_config(teacher_config, **overrides):
+    settings = {**STUDENT_DEFAULTS, **overrides}
+    return DistilBertConfig(
+        vocab_size=teacher_config.vocab_size,
+        max_position_embeddings=teacher_config.max_position_embeddings,
+        pad_token_id=teacher_config.pad_token_id,
+        num_labels=teacher_config.num_labels,
+        id2label=teacher_config.id2label,
+        label2id=teacher_config.label2id,
+        problem_type="single_label_classification",
+        **settings
+    )
+
+
+def compute_teacher_logits(teacher, dataset, collator, batch_size=64):
+    device = next(teacher.parameters()).device
+    teacher.eval()
+    features = [
+        {"input_ids": ids, "attention_mask": mask}
+        for ids, mask in zip(dataset["input_ids"], dataset["attention_mask"])
+    ]
+    logits = []
+    with torch.inference_mode():
+        for start in range(0, len(features), batch_size):
+            batch = collator(features[start:start + batch_size])
+            batch = {key: value.to(device) for key, value in batch.items()}
+            logits.append(teacher(**batch).logits.float().cpu())
+    return torch.cat(logits).tolist()
+
+
+class DistillationTrainer(Trainer):
+    def __init__(self, *args, temperature=2.0, alpha=0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("teacher_logits", None)
+        weights = inputs.pop("weight", None)
+        inputs.pop("length", None)
+        outputs = model(**inputs)
+        if teacher_logits is None:
+            return (outputs.loss, outputs) if return_outputs else outputs.loss
+
+        # Soft-target KL term scaled by T^2, mixed with the usual hard-label loss, per example so
+        # the corpus sample weights apply to both terms as in WeightedLossTrainer
+        soft_loss = F.kl_div(
+            F.log_softmax(outputs.logits / self.temperature, dim=-1),
+            F.softmax(teacher_logits / self.temperature, dim=-1),
+            reduction="none"
+        ).sum(dim=-1) * self.temperature ** 2
+        hard_loss = F.cross_entropy(outputs.logits, inputs["labels"], reduction="none")
+        per_example = self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+        if weights is None:
+            loss = per_example.mean()
+        else:
+            loss = (per_example * weights).sum() / weights.sum()
+        return (loss, outputs) if return_outputs else loss
+
+
+def parameter_count(model):
+    return sum(parameter.numel() for parameter in model.parameters())
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def compare_models(model_paths, texts, labels, latency_samples=50):
+    # Accuracy, CPU latency and memory for each saved model directory
+    rows = []
+    for name, model_path in model_paths.items():
+        classifier = IntentClassifier(model_path, device='cpu')
+        predictions = [result['intent'] for result in classifier.predict_batch(texts)]
+        accuracy = float(np.mean([
+            predicted == classifier.intents[label] for predicted, label in zip(predictions, labels)
+        ]))
+        parameters = parameter_count(classifier.model)
+        rows.append({
+            'model': name,
+            'accuracy': accuracy,
+            'parameters': parameters,
+            'param_memory_mb': parameters * 4 / 1e6,
+            'disk_mb': directory_size(model_path) / 1e6,
+            'latency': measure_latency(classifier.predict_logits, texts[:latency_samples]),
+        })
+    return rows
+
+
+def format_comparison(rows):
+    report = "Teacher vs Student Comparison (test split, CPU, batch size 1)\n"
+    report += "=" * 86 + "\n"
+    report += f"{'model':<12}{'accuracy':>10}{'params':>14}{'param MB':>10}{'disk MB':>10}{'p50 ms':>10}{'p99 ms':>10}{'speedup':>10}\n"
+    baseline_ms = rows[0]['latency']['p50_ms']
+    for row in rows:
+        report += (
+            f"{row['model']:<12}{row['accuracy']:>10.2%}{row['parameters']:>14,}{row['param_memory_mb']:>10.1f}"
+            f"{row['disk_mb']:>10.1f}{row['latency']['p50_ms']:>10.2f}{row['latency']['p99_ms']:>10.2f}"
+            f"{baseline_ms / row['latency']['p50_ms']:>9.2f}x\n"
+        )
+    return report
+
+
+def distill_student(teacher, tokenizer, train_dataset, eval_dataset, data_collator, teacher_model_path,
+                    student_model_path, output_dir, num_train_epochs=10, learning_rate=5e-4, batch_size=32,
+                    temperature=2.0, alpha=0.7, compute_metrics=None, **student_overrides):
+    # output_dir holds the student Trainer's scratch files and is removed afterwards
+    print("🧑‍🏫 Computing teacher soft logits...")
+    train_dataset = train_dataset.add_column(
+        "teacher_logits", compute_teacher_logits(teacher, train_dataset, data_collator)
+    )
+    train_dataset = train_dataset.remove_columns(
+        [column for column in train_dataset.column_names
+         if column not in ("input_ids", "attention_mask", "label", "weight", "length", "teacher_logits")]
+    )
+
+    student = DistilBertForSequenceClassification(build_student_config(teacher.config, **student_overrides))
+    print(f"🎓 Student: {parameter_count(student):,} parameters (teacher: {parameter_count(teacher):,})")
+
+    student_args = TrainingArguments(
+        output_dir=output_dir,
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=batch_size,
+        group_by_length=True,
+        length_column_name="length",
+        learning_rate=learning_rate,
+        warmup_ratio=0.1,
+        weight_decay=0.01,
+        logging_steps=20,
+        eval_strategy="epoch",
+        save_strategy="no",
+        report_to="none",
+        remove_unused_columns=False,
+        dataloader_pin_memory=False,
+    )
+
+    student_trainer = DistillationTrainer(
+        model=student,
+        args=student_args,
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset.remove_columns(
+            [column for column in eval_dataset.column_names
+             if column not in ("input_ids", "attention_mask", "label")]
+        ),
+        data_collator=data_collator,
+        compute_metrics=compute_metrics,
+        temperature=temperature,
+        alpha=alpha,
+    )
+    student_trainer.train()
+
+    # Same layout as the teacher: weights, config, tokenizer files and model_config.json
+    os.makedirs(student_model_path, exist_ok=True)
+    student_trainer.save_model(student_model_path)
+    tokenizer.save_pretrained(student_model_path)
+
+    with open(os.path.join(teacher_model_path, 'model_config.json')) as f:
+        model_config = json.load(f)
+    model_config.pop('onnx_export', None)
+    # The teacher's fitted temperature does not describe the student's logits; the caller recalibrates
+    model_config.pop('temperature', None)
+    model_config.pop('temperature_folded', None)
+    model_config['distillation'] = {
+        'teacher': os.path.abspath(teacher_model_path),
+        'temperature': temperature,
+        'alpha': alpha,
+        'student_config': {**STUDENT_DEFAULTS, **student_overrides},
+    }
+    with open(os.path.join(student_model_path, 'model_config.json'), 'w') as f:
+        json.dump(model_config, f, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    print(f"✅ Student saved to {student_model_path}")
+    return student_trainer
@@ -0,0 +1,258 @@
+# Early-exit inference: a light classifier head after every transformer layer of the
+# fine-tuned DistilBERT. Inference stops at the first layer whose temperature-calibrated
+# confidence clears the threshold; the last layer uses the model's own classifier.
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from safetensors.torch import load_file, save_file
+
+from calibration import fit_temperature
+from intent_classifier import IntentClassifier
+
+HEADS_FILENAME = 'early_exit_heads.safetensors'
+DEFAULT_THRESHOLDS = [0.5, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+class EarlyExit(Exception):
+    def __init__(self, layer, logits):
+        super().__init__(layer)
+        self.layer = layer
+        self.logits = logits
+
+
+def build_exit_heads(config, hidden_size=128):
+    # One head per layer except the last, which already has the fine-tuned classifier
+    return nn.ModuleList([
+        nn.Sequential(
+            nn.Linear(config.dim, hidden_size),
+            nn.ReLU(),
+            nn.Dropout(config.seq_classif_dropout),
+            nn.Linear(hidden_size, config.num_labels)
+        )
+        for _ in range(config.n_layers - 1)
+    ])
+
+
+class EarlyExitClassifier:
+    def __init__(self, model_path='./chatbot_model', device='cpu', max_length=128, head_hidden_size=128):
+        self.model_path = model_path
+        self.base = IntentClassifier(model_path, device=device, max_length=max_length)
+        self.model = self.base.model
+        self.tokenizer = self.base.tokenizer
+        self.intents = self.base.intents
+        self.device = self.base.device
+        self.max_length = max_length
+
+        config = self.model.config
+        self.num_layers = config.n_layers
+        if self.num_layers < 2:
+            # No layer before the last one to exit from
+            raise ValueError(f"Early exit needs at least 2 transformer layers; {model_path} has {self.num_layers}")
+        self.heads = build_exit_heads(config, head_hidden_size).to(self.device)
+        self.temperatures = [1.0] * self.num_layers
+        self.threshold = 0.9
+
+        early_exit_config = self.base.model_config.get('early_exit')
+        heads_path = os.path.join(model_path, HEADS_FILENAME)
+        if early_exit_config and os.path.exists(heads_path):
+            self.heads.load_state_dict(load_file(heads_path))
+            self.temperatures = early_exit_config['temperatures']
+            self.threshold = early_exit_config['threshold']
+        self.heads.eval()
+
+        # Hooks stay installed; they only act while a threshold is active
+        self._active_threshold = None
+        for layer_index, layer in enumerate(self.model.distilbert.transformer.layer[:-1]):
+            layer.register_forward_hook(self._make_exit_hook(layer_index))
+
+    def _make_exit_hook(self, layer_index):
+        def hook(module, inputs, output):
+            if self._active_threshold is None:
+                return None
+            hidden = output[0] if isinstance(output, tuple) else output
+            logits = self.heads[layer_index](hidden[:, 0])
+            confidence = torch.softmax(logits / self.temperatures[layer_index], dim=-1).max(dim=-1).values
+            if bool((confidence >= self._active_threshold).all()):
+                raise EarlyExit(layer_index + 1, logits)
+            return None
+        return hook
+
+    def layer_logits(self, texts, batch_size=64):
+        # Logits of every exit point on the full forward pass: [num_layers, N, num_labels]
+        texts = list(texts)
+        all_logits = []
+        self.heads.eval()
+        with torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                inputs = self.tokenizer(
+                    texts[start:start + batch_size],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length
+                )
+                inputs = {key: value.to(self.device) for key, value in inputs.items()}
+                outputs = self.model(**inputs, output_hidden_states=True)
+                per_layer = [
+                    head(hidden[:, 0]) for head, hidden in zip(self.heads, outputs.hidden_states[1:-1])
+                ]
+                per_layer.append(outputs.logits)
+                all_logits.append(torch.stack(per_layer).float().cpu())
+        return torch.cat(all_logits, dim=1)
+
+    def layer_features(self, texts, batch_size=64):
+        # [CLS] vector after every layer but the last: [num_layers - 1, N, dim]
+        texts = list(texts)
+        features = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                inputs = self.tokenizer(
+                    texts[start:start + batch_size],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length
+                )
+                inputs = {key: value.to(self.device) for key, value in inputs.items()}
+                hidden_states = self.model.distilbert(**inputs, output_hidden_states=True).hidden_states
+                features.append(torch.stack([hidden[:, 0] for hidden in hidden_states[1:-1]]).float().cpu())
+        return torch.cat(features, dim=1)
+
+    def train_heads(self, texts, labels, epochs=30, learning_rate=1e-3, batch_size=64, seed=42):
+        # Backbone stays frozen: cache the [CLS] features once and fit each head on them
+        generator = torch.Generator().manual_seed(seed)
+        features = self.layer_features(texts)
+        labels = torch.as_tensor(labels, dtype=torch.long)
+        self.heads.train()
+        for head, layer_features in zip(self.heads, features):
+            optimizer = torch.optim.AdamW(head.parameters(), lr=learning_rate, weight_decay=0.01)
+            for _ in range(epochs):
+                for batch in torch.randperm(len(labels), generator=generator).split(batch_size):
+                    optimizer.zero_grad()
+                    loss = F.cross_entropy(head(layer_features[batch].to(self.device)), labels[batch].to(self.device))
+                    loss.backward()
+                    optimizer.step()
+        self.heads.eval()
+
+    def calibrate(self, texts, labels):
+        layer_logits = self.layer_logits(texts)
+        self.temperatures = [fit_temperature(logits, labels) for logits in layer_logits]
+        return self.temperatures
+
+    def simulate(self, layer_logits, threshold):
+        # Exit decisions from precomputed per-layer logits; identical to what the hooks decide
+        probabilities = torch.stack([
+            torch.softmax(logits / temperature, dim=-1)
+            for logits, temperature in zip(layer_logits, self.temperatures)
+        ])
+        confidences, predictions = probabilities.max(dim=-1)
+        passed = confidences >= threshold
+        passed[-1] = True
+        exit_layers = passed.float().argmax(dim=0)
+        rows = torch.arange(layer_logits.shape[1])
+        return predictions[exit_layers, rows], confidences[exit_layers, rows], exit_layers + 1
+
+    def predict(self, texts, threshold=None):
+        # Early exit is per utterance, so texts run one at a time as they would per /chat request
+        threshold = self.threshold if threshold is None else threshold
+        results = []
+        self._active_threshold = threshold
+        try:
+            with torch.inference_mode():
+                for text in texts:
+                    inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=self.max_length)
+                    inputs = {key: value.to(self.device) for key, value in inputs.items()}
+                    try:
+                        logits, layer = self.model(**inputs).logits, self.num_layers
+                    except EarlyExit as exit_point:
+                        logits, layer = exit_point.logits, exit_point.layer
+                    probabilities = torch.softmax(logits[0] / self.temperatures[layer - 1], dim=-1)
+                    confidence, index = probabilities.max(dim=-1)
+                    results.append({
+                        'text': text,
+                        'intent': self.intents[int(index)],
+                        'confidence': float(confidence),
+                        'exit_layer': layer
+                    })
+        finally:
+            self._active_threshold = None
+        return results
+
+    def save(self, threshold=None, output_dir=None):
+        # With output_dir the heads are written there and model_path is left untouched;
+        # the caller merges the returned config into the packaged model_config.json
+        if threshold is not None:
+            self.threshold = threshold
+        early_exit_config = {
+            'heads_file': HEADS_FILENAME,
+            'temperatures': self.temperatures,
+            'threshold': self.threshold,
+        }
+        save_file(self.heads.state_dict(), os.path.join(output_dir or self.model_path, HEADS_FILENAME))
+        if output_dir:
+            return early_exit_config
+
+        config_path = os.path.join(self.model_path, 'model_config.json')
+        with open(config_path) as f:
+            model_config = json.load(f)
+        model_config['early_exit'] = early_exit_config
+        with open(config_path, 'w') as f:
+            json.dump(model_config, f, indent=2)
+        return early_exit_config
+
+
+def early_exit_sweep(classifier, texts, labels, thresholds=None, latency_samples=100):
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    labels = torch.as_tensor(labels, dtype=torch.long)
+    layer_logits = classifier.layer_logits(texts)
+    latency_texts = list(texts)[:latency_samples]
+
+    def latency_ms(threshold):
+        classifier.predict(latency_texts[:1], threshold)
+        start_time = time.perf_counter()
+        classifier.predict(latency_texts, threshold)
+        return (time.perf_counter() - start_time) * 1000 / len(latency_texts)
+
+    # threshold > 1 never exits early: the full-depth baseline
+    rows = []
+    for threshold in [1.01] + list(thresholds):
+        predictions, _, exit_layers = classifier.simulate(layer_logits, threshold)
+        rows.append({
+            'threshold': threshold,
+            'accuracy': float((predictions == labels).float().mean()),
+            'avg_layers': float(exit_layers.float().mean()),
+            'exit_histogram': np.bincount(exit_layers.numpy(), minlength=classifier.num_layers + 1)[1:].tolist(),
+            'latency_ms': latency_ms(threshold),
+        })
+    return rows
+
+
+def choose_threshold(rows, max_accuracy_drop=0.005):
+    # Lowest threshold (fewest layers) whose accuracy stays within max_accuracy_drop of full depth
+    full_depth_accuracy = rows[0]['accuracy']
+    candidates = [
+        row for row in rows[1:] if row['accuracy'] >= full_depth_accuracy - max_accuracy_drop
+    ]
+    if not candidates:
+        return max(row['threshold'] for row in rows[1:])
+    return min(candidates, key=lambda row: (row['avg_layers'], row['threshold']))['threshold']
+
+
+def format_sweep(rows, num_layers, split='test', selected=None):
+    report = f"Early-Exit Report ({split} split, CPU, batch size 1)\n"
+    report += "=" * 78 + "\n"
+    report += f"{'threshold':<12}{'accuracy':>10}{'avg layers':>12}{'ms/utt':>10}{'speedup':>10}   exits per layer\n"
+    baseline_ms = rows[0]['latency_ms']
+    for row in rows:
+        label = "full depth" if row['threshold'] > 1 else f"{row['threshold']:.2f}"
+        label += " *" if row['threshold'] == selected else ""
+        report += (
+            f"{label:<12}{row['accuracy']:>10.2%}{row['avg_layers']:>8.2f}/{num_layers:<3}"
+            f"{row['latency_ms']:>10.2f}{baseline_ms / row['latency_ms']:>9.2f}x   {row['exit_histogram']}\n"
+        )
+    return report
@@ -0,0 +1,290 @@
+# Nearest-neighbour intent classifier over sentence embeddings. Every training utterance
+# is encoded once (mean-pooled, L2-normalized) with the fine-tuned or base encoder and
+# stored as a contiguous float32 matrix in a memory-mapped .npy file. Intents and phrases
+# are added or removed without retraining, and a batch of queries is classified with one
+# matrix multiply followed by a similarity-weighted top-k vote.
+#
+#   python embedding_index.py build --model-path ./chatbot_model --data models/enhanced_chatbot_dataset.csv
+#   python embedding_index.py add --intent customer_gift_card --phrases gift_card_phrases.txt
+#   python embedding_index.py evaluate --split-dir ./training_work/split
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from numpy.lib.format import open_memmap
+from transformers import AutoTokenizer, AutoModel
+
+from chatbot_data_generation import normalize_text
+from intent_classifier import IntentClassifier, read_texts
+
+VECTORS_FILE = 'vectors.npy'
+LABELS_FILE = 'labels.npy'
+INDEX_FILE = 'index.json'
+MIN_CAPACITY = 1024
+
+
+class SentenceEncoder:
+    def __init__(self, model_path='./chatbot_model', device=None, max_length=128, batch_size=64):
+        self.model_path = model_path
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        # AutoModel keeps only the transformer body of a fine-tuned classifier checkpoint
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = AutoModel.from_pretrained(model_path)
+        self.model.to(self.device)
+        self.model.eval()
+        self.dim = self.model.config.hidden_size
+
+    def encode(self, texts, out=None):
+        # Unit-length float32 rows, written into out (e.g. a memmap slice) when given
+        texts = list(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = out if out is not None else np.empty((len(texts), self.dim), dtype=np.float32)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                inputs = self.tokenizer(
+                    [texts[i] for i in chunk],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length
+                )
+                inputs = {key: value.to(self.device) for key, value in inputs.items()}
+                hidden = self.model(**inputs).last_hidden_state
+                mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                pooled = torch.nn.functional.normalize(pooled.float(), dim=-1)
+                vectors[chunk] = pooled.cpu().numpy()
+
+        return vectors
+
+
+class EmbeddingIndex:
+    def __init__(self, index_dir, encoder=None, mode='r+'):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, INDEX_FILE)) as f:
+            meta = json.load(f)
+        self.encoder_path = meta['encoder']
+        self.dim = meta['dim']
+        self.count = meta['count']
+        self.intents = meta['intents']
+        self.texts = meta['texts']
+        self._intent_ids = {intent: idx for idx, intent in enumerate(self.intents)}
+
+        # Rows past count are spare capacity for hot adds
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode=mode)
+        self.labels = np.load(os.path.join(index_dir, LABELS_FILE), mmap_mode=mode)
+        self.encoder = encoder or SentenceEncoder(self.encoder_path, device='cpu')
+
+    @classmethod
+    def create(cls, index_dir, encoder, capacity=MIN_CAPACITY):
+        os.makedirs(index_dir, exist_ok=True)
+        open_memmap(os.path.join(index_dir, VECTORS_FILE), mode='w+', dtype=np.float32, shape=(capacity, encoder.dim)).flush()
+        open_memmap(os.path.join(index_dir, LABELS_FILE), mode='w+', dtype=np.int32, shape=(capacity,)).flush()
+        with open(os.path.join(index_dir, INDEX_FILE), 'w') as f:
+            json.dump({'encoder': encoder.model_path, 'dim': encoder.dim, 'count': 0, 'intents': [], 'texts': []}, f)
+        return cls(index_dir, encoder)
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra):
+        # Grow the memmapped files geometrically, so a run of single-phrase adds stays amortized O(1)
+        capacity = len(self.vectors)
+        if self.count + extra <= capacity:
+            return
+        capacity = max(capacity * 2, self.count + extra, MIN_CAPACITY)
+        for name, array, shape in (
+            (VECTORS_FILE, self.vectors, (capacity, self.dim)),
+            (LABELS_FILE, self.labels, (capacity,)),
+        ):
+            path = os.path.join(self.index_dir, name)
+            grown = open_memmap(path + '.tmp', mode='w+', dtype=array.dtype, shape=shape)
+            grown[:self.count] = array[:self.count]
+            grown.flush()
+            del grown
+            os.replace(path + '.tmp', path)
+        self.vectors = np.load(os.path.join(self.index_dir, VECTORS_FILE), mmap_mode='r+')
+        self.labels = np.load(os.path.join(self.index_dir, LABELS_FILE), mmap_mode='r+')
+
+    def _intent_id(self, intent):
+        if intent not in self._intent_ids:
+            self._intent_ids[intent] = len(self.intents)
+            self.intents.append(intent)
+        return self._intent_ids[intent]
+
+    def add(self, texts, intents):
+        texts = list(texts)
+        intents = [intents] * len(texts) if isinstance(intents, str) else list(intents)
+        if not texts:
+            return 0
+        self._reserve(len(texts))
+        start, end = self.count, self.count + len(texts)
+        self.encoder.encode(texts, out=self.vectors[start:end])
+        self.labels[start:end] = [self._intent_id(intent) for intent in intents]
+        self.texts.extend(texts)
+        self.count = end
+        return len(texts)
+
+    def remove(self, intent=None, texts=None):
+        # Drop every row of an intent, or only the given phrases (normalized match); rows stay contiguous
+        if intent is None and texts is None:
+            raise ValueError("remove() needs an intent, texts or both")
+        drop = np.ones(self.count, dtype=bool)
+        if intent is not None:
+            if intent not in self._intent_ids:
+                return 0
+            drop &= self.labels[:self.count] == self._intent_ids[intent]
+        if texts is not None:
+            keys = {normalize_text(text) for text in texts}
+            drop &= np.array([normalize_text(text) in keys for text in self.texts], dtype=bool)
+
+        keep = np.flatnonzero(~drop)
+        removed = self.count - len(keep)
+        if removed:
+            self.vectors[:len(keep)] = self.vectors[keep]
+            self.labels[:len(keep)] = self.labels[keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.count = len(keep)
+
+        # An intent with no phrases left stops being predictable, but keeps its id for stable labels
+        return removed
+
+    def save(self):
+        self.vectors.flush()
+        self.labels.flush()
+        path = os.path.join(self.index_dir, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'encoder': self.encoder_path, 'dim': self.dim, 'count': self.count,
+                'intents': self.intents, 'texts': self.texts,
+            }, f)
+        os.replace(path + '.tmp', path)
+
+    def vote(self, query_vectors, k=5):
+        # (queries, dim) @ (dim, rows) in one GEMM, then a similarity-weighted vote over the k nearest rows
+        similarities = query_vectors @ self.vectors[:self.count].T
+        k = min(k, self.count)
+        nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        weights = np.clip(np.take_along_axis(similarities, nearest, axis=1), 0, None)
+
+        votes = np.zeros((len(query_vectors), len(self.intents)), dtype=np.float32)
+        rows = np.repeat(np.arange(len(query_vectors)), k)
+        np.add.at(votes, (rows, self.labels[:self.count][nearest].ravel()), weights.ravel())
+        totals = votes.sum(axis=1, keepdims=True)
+        return np.divide(votes, totals, out=np.full_like(votes, 1 / len(self.intents)), where=totals > 0)
+
+
+class EmbeddingClassifier:
+    # Same predict/predict_batch/predict_logits surface as IntentClassifier
+    def __init__(self, index, k=5):
+        self.index = index
+        self.k = k
+        self.model_path = index.encoder_path
+        self.device = index.encoder.device
+        self.temperature = 1.0
+        self._masks = {}
+
+    @property
+    def intents(self):
+        return self.index.intents
+
+    def add(self, texts, intent):
+        self._masks = {}
+        return self.index.add(texts, intent)
+
+    def remove(self, intent=None, texts=None):
+        return self.index.remove(intent, texts)
+
+    def predict_logits(self, texts):
+        # Log vote shares, so softmax in results_from_logits gives back the shares
+        votes = self.index.vote(self.index.encoder.encode(texts), self.k)
+        return torch.from_numpy(np.log(votes + 1e-9))
+
+    _mask_for = IntentClassifier._mask_for
+    results_from_logits = IntentClassifier.results_from_logits
+    predict_batch = IntentClassifier.predict_batch
+    predict = IntentClassifier.predict
+
+
+def read_labelled(path):
+    # CSV with text/intent columns, or a split/*.jsonl file from model.py (labels mapped via intents.json)
+    if path.endswith('.csv'):
+        frame = pd.read_csv(path).dropna(subset=['text', 'intent'])
+        return frame['text'].tolist(), frame['intent'].tolist()
+    with open(os.path.join(os.path.dirname(path), 'intents.json')) as f:
+        intents = json.load(f)
+    with open(path) as f:
+        rows = [json.loads(line) for line in f]
+    return [row['text'] for row in rows], [intents[row['label']] for row in rows]
+
+
+def build_index(index_dir, encoder, texts, intents):
+    index = EmbeddingIndex.create(index_dir, encoder, capacity=max(MIN_CAPACITY, 2 * len(texts)))
+    index.add(texts, intents)
+    index.save()
+    return index
+
+
+def evaluate_index(classifier, texts, intents):
+    start_time = time.perf_counter()
+    predictions = classifier.predict_batch(texts)
+    elapsed = time.perf_counter() - start_time
+    accuracy = np.mean([prediction['intent'] == intent for prediction, intent in zip(predictions, intents)])
+    return float(accuracy), len(texts) / max(elapsed, 1e-9)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Nearest-neighbour intent index over sentence embeddings")
+    parser.add_argument('command', choices=['build', 'add', 'remove', 'evaluate'])
+    parser.add_argument('--index-dir', default='./embedding_index')
+    parser.add_argument('--model-path', default='./chatbot_model', help="Fine-tuned or base encoder (build only)")
+    parser.add_argument('--data', default='models/enhanced_chatbot_dataset.csv',
+                        help="build: CSV with text/intent columns or training_work/split/train.jsonl")
+    parser.add_argument('--intent', default=None, help="add/remove: intent name")
+    parser.add_argument('--phrases', default=None, help="add/remove: text file (one phrase per line) or JSONL")
+    parser.add_argument('--split-dir', default='./training_work/split', help="evaluate: split/ directory from model.py")
+    parser.add_argument('--k', type=int, default=5, help="Neighbours per vote")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        encoder = SentenceEncoder(args.model_path, device='cpu')
+        data_texts, data_intents = read_labelled(args.data)
+        print(f"🔤 Encoding {len(data_texts)} utterances with {args.model_path}...")
+        start_time = time.perf_counter()
+        embedding_index = build_index(args.index_dir, encoder, data_texts, data_intents)
+        print(f"✅ Indexed {len(embedding_index)} utterances / {len(embedding_index.intents)} intents "
+              f"in {time.perf_counter() - start_time:.1f}s → {args.index_dir}")
+
+    elif args.command in ('add', 'remove'):
+        embedding_index = EmbeddingIndex(args.index_dir)
+        phrases = list(read_texts(args.phrases)) if args.phrases else None
+        start_time = time.perf_counter()
+        if args.command == 'add':
+            if not args.intent or not phrases:
+                parser.error("add needs --intent and --phrases")
+            changed = embedding_index.add(phrases, args.intent)
+        else:
+            changed = embedding_index.remove(args.intent, phrases)
+        embedding_index.save()
+        print(f"✅ {'Added' if args.command == 'add' else 'Removed'} {changed} phrase(s) in {(time.perf_counter() - start_time) * 1000:.1f} ms "
+              f"({len(embedding_index)} utterances indexed)")
+
+    else:
+        embedding_classifier = EmbeddingClassifier(EmbeddingIndex(args.index_dir, mode='r'), k=args.k)
+        test_texts, test_intents = read_labelled(os.path.join(args.split_dir, 'test.jsonl'))
+        index_accuracy, index_rate = evaluate_index(embedding_classifier, test_texts, test_intents)
+        print(f"📊 Embedding index (k={args.k}): accuracy {index_accuracy:.2%}, {index_rate:.0f} utterances/sec")
+
+        if os.path.exists(os.path.join(embedding_classifier.model_path, 'model_config.json')):
+            model_classifier = IntentClassifier(embedding_classifier.model_path, device='cpu')
+            model_accuracy, model_rate = evaluate_index(model_classifier, test_texts, test_intents)
+            print(f"📊 Fine-tuned classifier:  accuracy {model_accuracy:.2%}, {model_rate:.0f} utterances/sec")
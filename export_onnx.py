@@ -0,0 +1,198 @@
+# ONNX export stage: writes onnx/model.onnx and onnx/model_quantized.onnx (dynamic INT8)
+# next to the tokenizer files, in the layout @xenova/transformers loads from.
+import argparse
+import inspect
+import json
+import os
+import time
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from intent_classifier import IntentClassifier
+
+ONNX_INPUTS = ['input_ids', 'attention_mask']
+
+# Gates against PyTorch on the verification texts (the test split in model.py), in the terms the
+# backend acts on: the share of texts whose top intent is unchanged, and the largest change in
+# any softmax probability (classifyIntent compares the top one against a 0.6 threshold).
+# fp32 must match to rounding; INT8 may flip a few near-tie predictions.
+DEFAULT_TOLERANCES = {
+    'model.onnx': {'min_top1_agreement': 0.99, 'max_prob_diff': 1e-3},
+    'model_quantized.onnx': {'min_top1_agreement': 0.97, 'max_prob_diff': 0.05},
+}
+
+SAMPLE_TEXTS = [
+    "Show me all restaurants",
+    "I want to order pizza",
+    "What's in my cart?",
+    "Add burger to cart",
+    "Update order status",
+    "Find Italian food",
+    "Show my past orders",
+    "Where is my order?",
+    "Go to home page",
+    "Delete restaurant Pizza Palace"
+]
+
+
+def export_onnx(model, tokenizer, onnx_path, opset_version=14):
+    model = model.to('cpu').eval()
+    dummy = tokenizer(["Show cart", "Track my order please"], return_tensors="pt", padding=True)
+    dynamic_axes = {name: {0: 'batch_size', 1: 'sequence_length'} for name in ONNX_INPUTS}
+    dynamic_axes['logits'] = {0: 'batch_size'}
+
+    # Use the TorchScript exporter where the dynamo exporter is the default
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy['input_ids'], dummy['attention_mask']),
+            onnx_path,
+            input_names=ONNX_INPUTS,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=True,
+            **export_kwargs
+        )
+
+
+def onnx_logits(session, tokenizer, texts, batch_size=64, max_length=128):
+    outputs = []
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(
+            texts[start:start + batch_size],
+            return_tensors="np",
+            padding=True,
+            truncation=True,
+            max_length=max_length
+        )
+        feed = {name: inputs[name].astype(np.int64) for name in ONNX_INPUTS}
+        outputs.append(session.run(['logits'], feed)[0])
+    return np.concatenate(outputs, axis=0)
+
+
+def measure_latency(predict, texts, repeats=3):
+    # Single-utterance CPU latency, the shape of a /chat request
+    predict(texts[:1])
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            start_time = time.perf_counter()
+            predict([text])
+            timings.append((time.perf_counter() - start_time) * 1000)
+    return {
+        'mean_ms': float(np.mean(timings)),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99))
+    }
+
+
+def softmax(logits):
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def weights_size(model_path):
+    for filename in ('model.safetensors', 'pytorch_model.bin'):
+        path = os.path.join(model_path, filename)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+    return None
+
+
+def export_and_verify(model_path, texts, tolerances=None, latency_samples=50, onnx_dir=None):
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    onnx_dir = onnx_dir or os.path.join(model_path, 'onnx')
+    os.makedirs(onnx_dir, exist_ok=True)
+
+    classifier = IntentClassifier(model_path, device='cpu')
+    tokenizer = classifier.tokenizer
+    texts = list(texts)
+    latency_texts = texts[:latency_samples]
+
+    fp32_path = os.path.join(onnx_dir, 'model.onnx')
+    int8_path = os.path.join(onnx_dir, 'model_quantized.onnx')
+
+    print("📤 Exporting ONNX model...")
+    export_onnx(classifier.model, tokenizer, fp32_path)
+    print("🗜️  Quantizing ONNX model (dynamic INT8)...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    reference = classifier.predict_logits(texts).numpy()
+    reference_probabilities = softmax(reference)
+    report = {
+        'pytorch': {
+            'size_bytes': weights_size(model_path),
+            'latency': measure_latency(classifier.predict_logits, latency_texts)
+        }
+    }
+
+    for path in (fp32_path, int8_path):
+        name = os.path.basename(path)
+        session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        logits = onnx_logits(session, tokenizer, texts, max_length=classifier.max_length)
+
+        top1_agreement = float((logits.argmax(axis=1) == reference.argmax(axis=1)).mean())
+        max_prob_diff = float(np.abs(softmax(logits) - reference_probabilities).max())
+        report[name] = {
+            'size_bytes': os.path.getsize(path),
+            'top1_agreement': top1_agreement,
+            'max_prob_diff': max_prob_diff,
+            'max_abs_logit_diff': float(np.abs(logits - reference).max()),
+            'tolerance': tolerances[name],
+            'latency': measure_latency(
+                lambda batch: onnx_logits(session, tokenizer, batch, max_length=classifier.max_length),
+                latency_texts
+            )
+        }
+
+        failures = []
+        if top1_agreement < tolerances[name]['min_top1_agreement']:
+            failures.append(f"top-1 agreement {top1_agreement:.2%} < {tolerances[name]['min_top1_agreement']:.2%}")
+        if max_prob_diff > tolerances[name]['max_prob_diff']:
+            failures.append(f"max probability difference {max_prob_diff:.4f} > {tolerances[name]['max_prob_diff']}")
+        if failures:
+            print_report(report, len(texts))
+            raise ValueError(f"{name} does not match PyTorch on {len(texts)} texts: {'; '.join(failures)}")
+
+    with open(os.path.join(onnx_dir, 'export_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report, len(texts))
+    return report
+
+
+def print_report(report, num_texts):
+    print(f"\n📊 ONNX export report ({num_texts} verification texts):")
+    print(f"   {'variant':<24}{'size MB':>10}{'top-1':>8}{'max Δp':>10}{'max |Δ|':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, stats in report.items():
+        size = f"{stats['size_bytes'] / 1e6:.1f}" if stats['size_bytes'] else "-"
+        agreement = f"{stats['top1_agreement']:.1%}" if 'top1_agreement' in stats else "-"
+        prob_diff = f"{stats['max_prob_diff']:.4f}" if 'max_prob_diff' in stats else "-"
+        logit_diff = f"{stats['max_abs_logit_diff']:.4f}" if 'max_abs_logit_diff' in stats else "-"
+        print(
+            f"   {name:<24}{size:>10}{agreement:>8}{prob_diff:>10}{logit_diff:>10}"
+            f"{stats['latency']['p50_ms']:>9.2f}{stats['latency']['p99_ms']:>9.2f}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export chatbot_model/ to ONNX and verify it against PyTorch")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--data', default=None, help="CSV with a 'text' column to verify on")
+    args = parser.parse_args()
+
+    if args.data:
+        import pandas as pd
+        verify_texts = pd.read_csv(args.data)['text'].dropna().tolist()
+    else:
+        verify_texts = SAMPLE_TEXTS
+
+    export_and_verify(args.model_path, verify_texts)
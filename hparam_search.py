@@ -0,0 +1,248 @@
+# Parallel CPU hyperparameter search for the intent fine-tune. Random trials over learning
+# rate, warmup ratio, epochs, batch size and max_length run in a process pool, each with a
+# fixed torch thread budget. Trials are scored after every epoch on model.py's selection split
+# (the calibration phrases plus generated rows in neither train nor test) and stopped early by
+# asynchronous successive halving: a trial continues past an epoch only while it is in the top
+# 1/eta of all trials that reached that epoch.
+#
+#   python hparam_search.py --split-dir ./training_work/split --trials 24 --threads-per-trial 2
+#   python model.py --hparams ./hparam_search/best_hparams.json
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+SEARCH_SPACE = {
+    'learning_rate': (1e-5, 1e-4),
+    'warmup_ratio': [0.0, 0.06, 0.1, 0.2],
+    'epochs': [2, 3, 4, 6],
+    'batch_size': [8, 16, 32],
+    'max_length': [32, 64, 128],
+}
+# best_hparams.json keys, named as model.py's argparse destinations
+HPARAM_KEYS = ('learning_rate', 'warmup_ratio', 'epochs', 'batch_size', 'max_length')
+
+
+def sample_trials(num_trials, seed=42):
+    rng = np.random.default_rng(seed)
+    low, high = SEARCH_SPACE['learning_rate']
+    trials = []
+    for trial_id in range(num_trials):
+        trials.append({
+            'trial': trial_id,
+            # Log-uniform: 1e-5..3e-5 gets as many trials as 3e-5..1e-4
+            'learning_rate': float(np.exp(rng.uniform(np.log(low), np.log(high)))),
+            **{key: SEARCH_SPACE[key][rng.integers(len(SEARCH_SPACE[key]))] for key in HPARAM_KEYS[1:]},
+        })
+    # numpy scalars -> plain Python for JSON
+    return [{key: value.item() if hasattr(value, 'item') else value for key, value in trial.items()} for trial in trials]
+
+
+def should_continue(rung_scores, score, eta):
+    # Top 1/eta of the scores seen at this rung continue; the first eta arrivals always do
+    if len(rung_scores) < eta:
+        return True
+    cutoff = sorted(rung_scores, reverse=True)[max(1, math.ceil(len(rung_scores) / eta)) - 1]
+    return score >= cutoff
+
+
+def _trial_callback(rungs, lock, eta):
+    from transformers import TrainerCallback
+
+    class SuccessiveHalvingCallback(TrainerCallback):
+        def __init__(self):
+            self.history = []
+            self.stopped_at = None
+
+        def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+            epoch = int(round(state.epoch))
+            score = metrics['eval_f1']
+            self.history.append({'epoch': epoch, 'f1': score, 'accuracy': metrics['eval_accuracy']})
+            # Managed dict values are copies: read, append, write back under the lock
+            with lock:
+                scores = rungs.get(epoch, []) + [score]
+                rungs[epoch] = scores
+            if epoch < args.num_train_epochs and not should_continue(scores, score, eta):
+                self.stopped_at = epoch
+                control.should_training_stop = True
+
+    return SuccessiveHalvingCallback()
+
+
+def run_trial(job):
+    trial, split_dir, base_model, output_dir, threads, eta, rungs, lock = job
+    import torch
+    torch.set_num_threads(threads)
+    from datasets import Dataset
+    from transformers import (
+        AutoTokenizer, AutoModelForSequenceClassification, DataCollatorWithPadding, PrinterCallback, TrainingArguments
+    )
+
+    from model import WeightedLossTrainer, compute_metrics
+
+    start_time = time.perf_counter()
+    with open(os.path.join(split_dir, 'intents.json')) as f:
+        intents = json.load(f)
+    tokenizer = AutoTokenizer.from_pretrained(base_model)
+
+    def load(name):
+        frame = pd.read_json(os.path.join(split_dir, f'{name}.jsonl'), lines=True)
+        dataset = Dataset.from_dict({'text': frame['text'].tolist(), 'label': frame['label'].tolist(),
+                                     'weight': frame['weight'].astype(float).tolist()})
+        return dataset.map(
+            lambda examples: tokenizer(examples['text'], truncation=True, max_length=trial['max_length']), batched=True
+        ).remove_columns(['text'])
+
+    model = AutoModelForSequenceClassification.from_pretrained(
+        base_model, num_labels=len(intents),
+        id2label=dict(enumerate(intents)), label2id={intent: idx for idx, intent in enumerate(intents)}
+    )
+    trial_dir = os.path.join(output_dir, f"trial-{trial['trial']:03d}")
+    training_args = TrainingArguments(
+        output_dir=os.path.join(trial_dir, 'trainer'),
+        num_train_epochs=trial['epochs'],
+        per_device_train_batch_size=trial['batch_size'],
+        per_device_eval_batch_size=64,
+        learning_rate=trial['learning_rate'],
+        warmup_ratio=trial['warmup_ratio'],
+        weight_decay=0.01,
+        eval_strategy="epoch",
+        save_strategy="no",
+        logging_strategy="no",
+        report_to="none",
+        remove_unused_columns=False,
+        dataloader_pin_memory=False,
+        disable_tqdm=True,
+        seed=42,
+    )
+    callback = _trial_callback(rungs, lock, eta)
+    trainer = WeightedLossTrainer(
+        model=model, args=training_args, train_dataset=load('train'), eval_dataset=load('selection'),
+        compute_metrics=compute_metrics, data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+        callbacks=[callback],
+    )
+    # Trial progress is reported by the parent, one line per trial
+    trainer.remove_callback(PrinterCallback)
+    trainer.train()
+    shutil.rmtree(os.path.join(trial_dir, 'trainer'), ignore_errors=True)
+
+    # Only trials that ran their full schedule can win, so only they keep weights
+    if callback.stopped_at is None:
+        trainer.save_model(trial_dir)
+        tokenizer.save_pretrained(trial_dir)
+
+    final = callback.history[-1]
+    return {
+        **trial,
+        'status': 'completed' if callback.stopped_at is None else f'stopped@{callback.stopped_at}',
+        'epochs_run': final['epoch'],
+        'f1': final['f1'],
+        'accuracy': final['accuracy'],
+        'seconds': time.perf_counter() - start_time,
+        'path': trial_dir if callback.stopped_at is None else None,
+    }
+
+
+def search(trials, split_dir, base_model, output_dir, threads_per_trial=2, workers=None, eta=2):
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_trial)
+    os.makedirs(output_dir, exist_ok=True)
+    # torch is only imported inside trials, so forking never copies a live OpenMP pool
+    context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    with context.Manager() as manager:
+        rungs, lock = manager.dict(), manager.Lock()
+        jobs = [(trial, split_dir, base_model, output_dir, threads_per_trial, eta, rungs, lock) for trial in trials]
+        results = []
+        # maxtasksperchild=1: every trial starts from a fresh process and frees its memory on exit
+        with context.Pool(processes=workers, maxtasksperchild=1) as pool:
+            for result in pool.imap_unordered(run_trial, jobs):
+                print(f"   🧪 trial {result['trial']:>3}: {result['status']:<12} F1 {result['f1']:.4f} "
+                      f"({result['seconds']:.0f}s)")
+                results.append(result)
+    return sorted(results, key=lambda row: (row['status'] != 'completed', -row['f1']))
+
+
+def export_winner(results, output_dir, split_dir, base_model):
+    from model import write_model_config
+
+    completed = [row for row in results if row['status'] == 'completed']
+    if not completed:
+        raise RuntimeError(
+            f"None of the {len(results)} trials ran its full schedule, so there is no model to export; "
+            "run more trials or lower --eta"
+        )
+    winner = completed[0]
+    best_dir = os.path.join(output_dir, 'best_model')
+    shutil.rmtree(best_dir, ignore_errors=True)
+    shutil.copytree(winner['path'], best_dir)
+    with open(os.path.join(split_dir, 'intents.json')) as f:
+        intents = json.load(f)
+    write_model_config(best_dir, intents, base_model, hparam_search={key: winner[key] for key in HPARAM_KEYS},
+                       selection_f1=winner['f1'])
+
+    # The losers' weights are only needed while the search runs
+    for row in results:
+        if row['path'] and row['path'] != winner['path']:
+            shutil.rmtree(row['path'], ignore_errors=True)
+    shutil.rmtree(winner['path'], ignore_errors=True)
+
+    best_hparams = {key: winner[key] for key in HPARAM_KEYS}
+    with open(os.path.join(output_dir, 'best_hparams.json'), 'w') as f:
+        json.dump(best_hparams, f, indent=2)
+    return winner, best_hparams
+
+
+def format_search(results, elapsed, workers, threads_per_trial):
+    report = f"Hyperparameter Search ({len(results)} trials, {workers} workers x {threads_per_trial} threads, {elapsed:.0f}s)\n"
+    report += "=" * 96 + "\n"
+    report += (
+        f"{'trial':>5}{'lr':>10}{'warmup':>8}{'epochs':>8}{'batch':>7}{'max_len':>9}"
+        f"{'status':>14}{'F1':>8}{'accuracy':>10}{'seconds':>9}\n"
+    )
+    for row in results:
+        report += (
+            f"{row['trial']:>5}{row['learning_rate']:>10.2e}{row['warmup_ratio']:>8.2f}{row['epochs']:>8}"
+            f"{row['batch_size']:>7}{row['max_length']:>9}{row['status']:>14}{row['f1']:>8.4f}"
+            f"{row['accuracy']:>10.2%}{row['seconds']:>9.0f}\n"
+        )
+    full_epochs = sum(row['epochs'] for row in results)
+    run_epochs = sum(row['epochs_run'] for row in results)
+    report += f"\nEpochs trained: {run_epochs} of {full_epochs} without early stopping ({run_epochs / full_epochs:.0%})\n"
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parallel successive-halving hyperparameter search on CPU")
+    parser.add_argument('--split-dir', default='./training_work/split', help="split/ directory written by model.py")
+    parser.add_argument('--base-model', default='distilbert-base-uncased')
+    parser.add_argument('--output-dir', default='./hparam_search')
+    parser.add_argument('--trials', type=int, default=24)
+    parser.add_argument('--threads-per-trial', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=None, help="Concurrent trials (default: cores / threads per trial)")
+    parser.add_argument('--eta', type=int, default=2, help="Keep the top 1/eta of trials at every epoch")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    search_workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads_per_trial)
+    print(f"🔍 Running {args.trials} trials on {search_workers} workers x {args.threads_per_trial} threads...")
+    start_time = time.perf_counter()
+    search_results = search(
+        sample_trials(args.trials, args.seed), args.split_dir, args.base_model, args.output_dir,
+        args.threads_per_trial, search_workers, args.eta
+    )
+    search_report = format_search(search_results, time.perf_counter() - start_time, search_workers, args.threads_per_trial)
+
+    winner_row, winner_hparams = export_winner(search_results, args.output_dir, args.split_dir, args.base_model)
+    search_report += f"\nWinner: trial {winner_row['trial']} {winner_hparams}\n"
+    print("\n" + search_report)
+    with open(os.path.join(args.output_dir, 'search_report.txt'), 'w') as f:
+        f.write(search_report)
+    pd.DataFrame(search_results).drop(columns='path').to_csv(os.path.join(args.output_dir, 'trials.csv'), index=False)
+
+    print(f"✅ Best model saved to {os.path.join(args.output_dir, 'best_model')}")
+    print(f"✅ Retrain with: python model.py --hparams {os.path.join(args.output_dir, 'best_hparams.json')}")
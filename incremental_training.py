@@ -0,0 +1,321 @@
+# Incremental warm-start fine-tuning from chat logs. User messages exported from
+# chatMessageModel are deduplicated against the training corpus; only new phrases and
+# corrected labels are trained on, starting from the current chatbot_model/ weights,
+# mixed with a replay sample of the old corpus so existing intents are not forgotten.
+#
+#   mongoexport --collection chatmessages --out chat_logs.jsonl
+#   python incremental_training.py --logs chat_logs.jsonl --model-path ./chatbot_model --data models/enhanced_chatbot_dataset.csv
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from datasets import Dataset
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, DataCollatorWithPadding
+
+from artifact_loader import write_manifest
+from calibration import fit_temperature, fold_temperature
+from chatbot_data_generation import normalize_text, CUSTOMER_WEIGHT
+from export_onnx import export_and_verify
+from intent_classifier import IntentClassifier
+from model import WeightedLossTrainer, load_dataframe
+
+
+def intent_side(intent):
+    # admin_* and customer_* intents never compete: the backend filters by user type
+    return intent.split('_', 1)[0]
+
+
+def parse_timestamp(value):
+    # mongoexport writes {"$date": ...}; plain exports write an ISO string or epoch millis
+    if isinstance(value, dict):
+        value = value.get('$date')
+        if isinstance(value, dict):
+            value = int(value.get('$numberLong'))
+    if value is None:
+        return None
+    return pd.to_datetime(value, unit='ms' if isinstance(value, (int, float)) else None, utc=True)
+
+
+def read_chat_logs(path, known_intents, min_confidence=0.9, since=None):
+    # User messages only; a 'corrected_intent' field (manual review) overrides the logged prediction
+    since = pd.to_datetime(since, utc=True) if since else None
+    rows, skipped = [], {'bot': 0, 'low_confidence': 0, 'unknown_intent': 0, 'before_since': 0}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('sender', 'user') != 'user':
+                skipped['bot'] += 1
+                continue
+            if since is not None:
+                timestamp = parse_timestamp(record.get('timestamp'))
+                if timestamp is not None and timestamp < since:
+                    skipped['before_since'] += 1
+                    continue
+
+            corrected = record.get('corrected_intent')
+            intent = corrected or record.get('intent')
+            if not corrected and (record.get('confidence') or 0) < min_confidence:
+                skipped['low_confidence'] += 1
+                continue
+            if intent not in known_intents:
+                skipped['unknown_intent'] += 1
+                continue
+            rows.append({'text': record['message'], 'intent': intent, 'corrected': bool(corrected)})
+    return rows, skipped
+
+
+def dedupe_against_corpus(log_rows, corpus, max_weight=CUSTOMER_WEIGHT):
+    # Collapse repeats to one row per (normalized text, side); weight grows with frequency up to max_weight.
+    # Rows the corpus already has are dropped; a corrected label replaces the conflicting corpus row,
+    # while an uncorrected prediction that disagrees with the corpus is treated as a model error.
+    corpus_intents = {}
+    for text, intent in zip(corpus['text'], corpus['intent']):
+        corpus_intents[(normalize_text(text), intent_side(intent))] = intent
+
+    grouped = {}
+    for row in log_rows:
+        key = (normalize_text(row['text']), intent_side(row['intent']))
+        entry = grouped.setdefault(key, {'text': row['text'], 'votes': {}, 'corrections': {}, 'occurrences': 0})
+        votes = entry['corrections'] if row['corrected'] else entry['votes']
+        votes[row['intent']] = votes.get(row['intent'], 0) + 1
+        entry['occurrences'] += 1
+
+    new_rows, overridden, counts = [], set(), {'duplicate': 0, 'conflict': 0, 'new': 0, 'corrected': 0}
+    for key, entry in grouped.items():
+        # Reviewed labels outvote any number of logged predictions
+        votes = entry['corrections'] or entry['votes']
+        intent = max(votes, key=votes.get)
+        corrected = bool(entry['corrections'])
+        existing = corpus_intents.get(key)
+        if existing == intent:
+            counts['duplicate'] += 1
+            continue
+        if existing is not None and not corrected:
+            counts['conflict'] += 1
+            continue
+        if existing is not None:
+            overridden.add(key)
+            counts['corrected'] += 1
+        else:
+            counts['new'] += 1
+        new_rows.append({'text': entry['text'], 'intent': intent, 'weight': float(min(entry['occurrences'], max_weight))})
+
+    # Corpus rows whose label a correction replaced are excluded from replay
+    keep = [
+        (normalize_text(text), intent_side(intent)) not in overridden
+        for text, intent in zip(corpus['text'], corpus['intent'])
+    ]
+    return pd.DataFrame(new_rows, columns=['text', 'intent', 'weight']), corpus[keep].reset_index(drop=True), counts
+
+
+def replay_sample(corpus, num_rows, min_per_intent=2, seed=42):
+    # Every intent appears at least min_per_intent times; the rest follows the corpus class weights
+    rng = np.random.default_rng(seed)
+    intent_weights = corpus.groupby('intent')['weight'].sum()
+    picked = []
+    for intent, rows in corpus.groupby('intent'):
+        share = int(round(num_rows * intent_weights[intent] / intent_weights.sum()))
+        count = min(len(rows), max(min_per_intent, share))
+        picked.extend(rng.choice(rows.index.to_numpy(), size=count, replace=False).tolist())
+    return corpus.loc[sorted(picked)]
+
+
+def accuracy_on(classifier, frame):
+    if frame.empty:
+        return None
+    predictions = classifier.predict_logits(frame['text'].tolist()).argmax(dim=-1).tolist()
+    return float(np.mean([classifier.intents[index] == intent for index, intent in zip(predictions, frame['intent'])]))
+
+
+def warm_start(model_path, output_dir, train_frame, num_train_epochs=2, learning_rate=2e-5, batch_size=16,
+               max_length=128):
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    intent_to_id = {intent: int(idx) for intent, idx in model.config.label2id.items()}
+
+    dataset = Dataset.from_dict({
+        'text': train_frame['text'].tolist(),
+        'label': train_frame['intent'].map(intent_to_id).tolist(),
+        'weight': train_frame['weight'].astype(float).tolist(),
+    })
+    dataset = dataset.map(
+        lambda examples: tokenizer(examples['text'], truncation=True, max_length=max_length), batched=True
+    ).remove_columns(['text'])
+
+    training_args = TrainingArguments(
+        output_dir=os.path.join(output_dir, 'trainer'),
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=batch_size,
+        learning_rate=learning_rate,
+        warmup_ratio=0.1,
+        weight_decay=0.01,
+        logging_steps=20,
+        eval_strategy="no",
+        save_strategy="no",
+        report_to="none",
+        remove_unused_columns=False,
+        dataloader_pin_memory=False,
+    )
+    WeightedLossTrainer(
+        model=model, args=training_args, train_dataset=dataset, data_collator=DataCollatorWithPadding(tokenizer=tokenizer)
+    ).train()
+    shutil.rmtree(os.path.join(output_dir, 'trainer'), ignore_errors=True)
+
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+
+def incremental_update(model_path, output_dir, logs_path, corpus, min_confidence=0.9, since=None, replay_ratio=1.0,
+                       min_replay_per_intent=2, num_train_epochs=2, learning_rate=2e-5, batch_size=16, seed=42,
+                       export_onnx=True):
+    start_time = time.perf_counter()
+    before = IntentClassifier(model_path, device='cpu')
+    log_rows, skipped = read_chat_logs(logs_path, set(before.intents), min_confidence, since)
+    new_rows, corpus, counts = dedupe_against_corpus(log_rows, corpus)
+    report = {'log_messages': len(log_rows), 'skipped': skipped, **counts}
+    if new_rows.empty:
+        return report, new_rows
+
+    replay = replay_sample(corpus, int(len(new_rows) * replay_ratio), min_replay_per_intent, seed)
+    # Corpus rows outside the replay sample are never trained on: half measure forgetting,
+    # the other half refit the temperature after the warm start
+    unseen = corpus.drop(replay.index).sample(frac=1.0, random_state=seed)
+    half = min(500, len(unseen) // 2)
+    held_out, calibration = unseen.iloc[:half], unseen.iloc[half:2 * half]
+    report.update({
+        'replay_rows': len(replay),
+        'held_out_rows': len(held_out),
+        'calibration_rows': len(calibration),
+        'new_accuracy_before': accuracy_on(before, new_rows),
+        'held_out_accuracy_before': accuracy_on(before, held_out),
+    })
+    del before
+
+    train_frame = pd.concat([new_rows, replay[['text', 'intent', 'weight']]], ignore_index=True)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    warm_start(model_path, output_dir, train_frame, num_train_epochs, learning_rate, batch_size)
+
+    shutil.copy(os.path.join(model_path, 'model_config.json'), os.path.join(output_dir, 'model_config.json'))
+    after = IntentClassifier(output_dir, device='cpu')
+    model_config = after.model_config
+
+    # The weights moved, so the temperature folded into the starting model no longer fits: refit and fold it again
+    temperature = 1.0
+    if not calibration.empty:
+        intent_to_id = {intent: idx for idx, intent in enumerate(after.intents)}
+        temperature = fit_temperature(
+            after.predict_logits(calibration['text'].tolist()), calibration['intent'].map(intent_to_id).tolist()
+        )
+        fold_temperature(after.model, temperature)
+        after.model.save_pretrained(output_dir)
+    else:
+        print("⚠️  No unseen corpus rows left to refit the temperature on; saving with T = 1.0")
+    model_config.update(temperature=temperature, temperature_folded=True)
+
+    report.update({
+        'temperature': temperature,
+        'new_accuracy_after': accuracy_on(after, new_rows),
+        'held_out_accuracy_after': accuracy_on(after, held_out),
+        'train_seconds': time.perf_counter() - start_time,
+    })
+    model_config.setdefault('incremental_updates', []).append({
+        'logs': os.path.basename(logs_path),
+        'warm_start_from': model_path,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **{key: value for key, value in report.items() if key != 'skipped'},
+    })
+    with open(os.path.join(output_dir, 'model_config.json'), 'w') as f:
+        json.dump(model_config, f, indent=2)
+    del after
+
+    # Same serving layout as model.py's package stage: onnx/ for chatbotController.js, then the manifest
+    if export_onnx:
+        model_config['onnx_export'] = export_and_verify(output_dir, held_out['text'].tolist() or new_rows['text'].tolist())
+        with open(os.path.join(output_dir, 'model_config.json'), 'w') as f:
+            json.dump(model_config, f, indent=2)
+    manifest = write_manifest(output_dir, {
+        'held_out_accuracy': report['held_out_accuracy_after'], 'temperature': temperature
+    })
+    print(f"✅ Manifest written: {len(manifest['files'])} files, {manifest['total_bytes'] / 1e6:.1f} MB")
+    return report, new_rows
+
+
+def format_incremental_report(report):
+    lines = ["Incremental Training Report", "=" * 60]
+    lines.append(f"Logged user messages kept: {report['log_messages']} (skipped: {report['skipped']})")
+    lines.append(
+        f"Unique phrases: {report['new']} new, {report['corrected']} corrected, "
+        f"{report['duplicate']} already in corpus, {report['conflict']} disagreeing with corpus (dropped)"
+    )
+    if 'replay_rows' not in report:
+        lines.append("Nothing new to train on")
+        return "\n".join(lines) + "\n"
+    lines.append(f"Replay rows from corpus: {report['replay_rows']}")
+    lines.append(f"{'':<28}{'before':>10}{'after':>10}")
+    for label, key in (('new / corrected phrases', 'new_accuracy'), (f"held-out corpus ({report['held_out_rows']})", 'held_out_accuracy')):
+        # Tiny corpora can leave no unseen rows to hold out; accuracy_on returns None for an empty frame
+        if report[f'{key}_before'] is None:
+            lines.append(f"{label:<28}{'n/a':>10}{'n/a':>10}")
+            continue
+        lines.append(f"{label:<28}{report[f'{key}_before']:>10.2%}{report[f'{key}_after']:>10.2%}")
+    if report['calibration_rows']:
+        lines.append(f"Temperature refitted on {report['calibration_rows']} unseen corpus rows: {report['temperature']:.4f}")
+    else:
+        lines.append("Temperature not refitted (no unseen corpus rows): 1.0000")
+    lines.append(f"Wall time: {report['train_seconds']:.1f}s")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Warm-start fine-tune chatbot_model/ on new phrases from chat logs")
+    parser.add_argument('--logs', required=True, help="chatMessageModel JSONL export")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--data', default='models/enhanced_chatbot_dataset.csv',
+                        help="Existing corpus: a CSV file, or a directory / glob of JSONL or Parquet shards")
+    parser.add_argument('--output-dir', default='./chatbot_model_incremental')
+    parser.add_argument('--min-confidence', type=float, default=0.9,
+                        help="Logged predictions below this are not used as labels (corrections always are)")
+    parser.add_argument('--since', default=None, help="Only messages at or after this date, e.g. 2024-06-01")
+    parser.add_argument('--replay-ratio', type=float, default=1.0, help="Replayed corpus rows per new row")
+    parser.add_argument('--min-replay-per-intent', type=int, default=2)
+    parser.add_argument('--epochs', type=float, default=2)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--learning-rate', type=float, default=2e-5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--append-corpus', default=None,
+                        help="Write the corpus plus the new rows to this CSV for the next full retrain")
+    parser.add_argument('--no-onnx', dest='export_onnx', action='store_false',
+                        help="Skip onnx/model.onnx and onnx/model_quantized.onnx")
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    corpus_frame = load_dataframe(args.data)
+    if 'weight' not in corpus_frame:
+        corpus_frame['weight'] = 1.0
+
+    incremental_report, added_rows = incremental_update(
+        args.model_path, args.output_dir, args.logs, corpus_frame, args.min_confidence, args.since,
+        args.replay_ratio, args.min_replay_per_intent, args.epochs, args.learning_rate, args.batch_size, args.seed,
+        args.export_onnx
+    )
+    print("\n" + format_incremental_report(incremental_report))
+
+    if args.append_corpus and not added_rows.empty:
+        added_rows = added_rows.assign(user_type=added_rows['intent'].map(intent_side))
+        merged = pd.concat([corpus_frame, added_rows], ignore_index=True)
+        # A corrected phrase keeps only its new label
+        merged['key'] = merged['text'].map(normalize_text) + '|' + merged['intent'].map(intent_side)
+        merged = merged.drop_duplicates('key', keep='last').drop(columns='key')
+        merged.to_csv(args.append_corpus, index=False)
+        print(f"✅ Corpus with {len(added_rows)} new rows written to {args.append_corpus}")
+    if 'replay_rows' in incremental_report:
+        print(f"✅ Updated model saved to {args.output_dir}")
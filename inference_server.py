@@ -0,0 +1,365 @@
+# Micro-batching inference server for the chatbot endpoint. Concurrent /predict requests
+# are queued and run through the model together: a batch closes when it reaches
+# --max-batch-size or when its first request has waited --max-wait-ms.
+#
+#   python inference_server.py --model-path ./chatbot_model --port 8765
+#   curl -d '{"text": "show my cart", "user_type": "customer", "top_k": 3}' localhost:8765/predict
+#   curl localhost:8765/metrics
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from intent_classifier import IntentClassifier
+from artifact_loader import load_classifier
+from prediction_cache import PredictionCache
+from keyword_cascade import KeywordCascade, KEYWORD_CONFIDENCE
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ServerStats:
+    def __init__(self, latency_window=10000):
+        self.started = time.time()
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        # Latency percentiles over the most recent requests only
+        self.latencies_ms = deque(maxlen=latency_window)
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batch_sizes[size] += 1
+
+    def record_request(self, latency_ms):
+        self.requests += 1
+        self.latencies_ms.append(latency_ms)
+
+    def snapshot(self, queue_depth):
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            'uptime_s': time.time() - self.started,
+            'queue_depth': queue_depth,
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            'latency_ms': {
+                'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max()),
+            },
+        }
+
+
+class MicroBatcher:
+    def __init__(self, classifier, max_batch_size=32, max_wait_ms=5.0, cache=None, cascade=None):
+        self.classifier = classifier
+        self.cache = cache
+        self.cascade = cascade
+        self.keyword_hits = 0
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = ServerStats()
+        self._queue = None
+        self._task = None
+        # One thread runs the model so the event loop keeps accepting requests during a forward pass
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, text, user_type=None, top_k=1):
+        # Exact keyword phrases never reach the model
+        if self.cascade is not None:
+            intent = self.cascade.match(text, user_type)
+            if intent is not None:
+                self.keyword_hits += 1
+                return {'text': text, 'intent': intent, 'confidence': KEYWORD_CONFIDENCE, 'source': 'keyword'}
+
+        # Repeated utterances are answered from the cache without queueing
+        if self.cache is not None:
+            cached = self.cache.get(text, user_type, top_k)
+            if cached is not None:
+                return cached
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, user_type, top_k, future, time.perf_counter()))
+        result = await future
+        if self.cache is not None:
+            self.cache.put(text, result, user_type, top_k)
+        return result
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [item[0] for item in batch]
+            try:
+                logits = await loop.run_in_executor(self._executor, self.classifier.predict_logits, texts)
+            except Exception as e:
+                for _, _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats.record_batch(len(batch))
+            now = time.perf_counter()
+            for row, (text, user_type, top_k, future, enqueued) in enumerate(batch):
+                # Masking and top-k are per request; the forward pass was shared. A bad request fails
+                # only its own future, never the batcher loop.
+                try:
+                    result = self.classifier.results_from_logits(
+                        [text], logits[row:row + 1], user_type=user_type, top_k=top_k
+                    )[0]
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                self.stats.record_request((now - enqueued) * 1000)
+                if not future.done():
+                    future.set_result(result)
+
+
+# ---------------------------------------------------------------- HTTP
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+    )
+
+
+async def route(batcher, method, path, body):
+    if path == '/health':
+        return 200, {'status': 'ok', 'intents': len(batcher.classifier.intents)}
+    if path == '/metrics':
+        metrics = batcher.stats.snapshot(batcher.queue_depth)
+        if batcher.cache is not None:
+            metrics['cache'] = batcher.cache.stats()
+        if batcher.cascade is not None:
+            metrics['keyword_hits'] = batcher.keyword_hits
+        return 200, metrics
+    if path != '/predict':
+        return 404, {'error': f'Unknown path {path}'}
+    if method != 'POST':
+        return 405, {'error': 'Use POST'}
+
+    try:
+        request = json.loads(body or b'{}')
+        text = request['text']
+        if not isinstance(text, str):
+            raise ValueError("'text' must be a string")
+        user_type = request.get('user_type')
+        top_k = int(request.get('top_k', 1))
+        if not 1 <= top_k <= len(batcher.classifier.intents):
+            raise ValueError(f"'top_k' must be between 1 and {len(batcher.classifier.intents)}")
+    except (KeyError, ValueError, TypeError) as e:
+        return 400, {'error': f'Invalid request: {e}'}
+
+    return 200, await batcher.predict(text, user_type=user_type, top_k=top_k)
+
+
+async def handle_connection(batcher, reader, writer):
+    # HTTP/1.1 keep-alive: serve requests on the connection until the client closes it
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                write_response(writer, 400, {'error': 'Malformed request'}, keep_alive=False)
+                break
+            if request is None:
+                break
+
+            method, path, headers, body = request
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            try:
+                status, payload = await route(batcher, method, path, body)
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(classifier, host='127.0.0.1', port=8765, unix_socket=None, max_batch_size=32, max_wait_ms=5.0,
+                cache=None, cascade=None):
+    batcher = MicroBatcher(classifier, max_batch_size, max_wait_ms, cache, cascade)
+    batcher.start()
+    handler = lambda reader, writer: handle_connection(batcher, reader, writer)
+
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = await asyncio.start_unix_server(handler, path=unix_socket)
+        print(f"🚀 Serving on unix socket {unix_socket}")
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print(f"🚀 Serving on http://{host}:{port}")
+    print(f"📦 Micro-batching: max batch {max_batch_size}, max wait {max_wait_ms} ms")
+    if cache is not None:
+        print(f"🗄️  Prediction cache: {cache.max_entries} entries, model {cache.model_hash[:12]}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+# ---------------------------------------------------------------- benchmark
+
+async def batched_throughput(classifier, texts, concurrency, max_batch_size, max_wait_ms):
+    batcher = MicroBatcher(classifier, max_batch_size, max_wait_ms)
+    batcher.start()
+    pending = iter(texts)
+
+    # Each client sends its next message as soon as the previous answer arrives
+    async def client():
+        for text in pending:
+            await batcher.predict(text)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    stats = batcher.stats.snapshot(batcher.queue_depth)
+    await batcher.stop()
+    return len(texts) / elapsed, stats
+
+
+def run_benchmark(classifier, texts, concurrency, max_batch_size, max_wait_ms):
+    print(f"\n⏱️  Per-message forward passes ({len(texts)} messages)...")
+    classifier.predict(texts[0])
+    start_time = time.perf_counter()
+    for text in texts:
+        classifier.predict(text)
+    sequential = len(texts) / (time.perf_counter() - start_time)
+
+    print(f"⏱️  Micro-batched ({concurrency} concurrent clients)...")
+    batched, stats = asyncio.run(batched_throughput(classifier, texts, concurrency, max_batch_size, max_wait_ms))
+
+    print("\n📊 Throughput Report")
+    print(f"   {'per-message':<14}{sequential:>10.0f} msg/s")
+    print(f"   {'micro-batched':<14}{batched:>10.0f} msg/s   ({batched / sequential:.2f}x)")
+    print(f"   mean batch size {stats['mean_batch_size']:.1f}, "
+          f"p50 {stats['latency_ms']['p50']:.1f} ms, p99 {stats['latency_ms']['p99']:.1f} ms")
+    print(f"   batch-size histogram: {stats['batch_size_histogram']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve chatbot_model/ with dynamic micro-batching")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None, help="Listen on a Unix socket instead of TCP")
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--cache-size', type=int, default=10000, help="Prediction cache entries (0 disables)")
+    parser.add_argument('--cache-ttl', type=float, default=None, help="Seconds before a cached prediction expires")
+    parser.add_argument('--keyword-cascade', action='store_true',
+                        help="Answer exact training phrases from the keyword fast path without the model")
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N',
+                        help="Compare per-message and micro-batched throughput on N messages, then exit")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--data', default=None, help="CSV with a 'text' column for --benchmark")
+    parser.add_argument('--verify-manifest', action='store_true',
+                        help="Check model file sizes and the weights header against manifest.json and memory-map the weights")
+    parser.add_argument('--verify-hashes', action='store_true',
+                        help="With --verify-manifest, also check every file's SHA-256 (reads every file once)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.verify_manifest:
+        classifier = load_classifier(
+            args.model_path, check_hashes=args.verify_hashes, max_length=128, batch_size=args.max_batch_size
+        )
+    else:
+        classifier = IntentClassifier(args.model_path, max_length=128, batch_size=args.max_batch_size)
+    print(f"✅ Model loaded from {args.model_path} (device: {classifier.device})")
+
+    if args.benchmark:
+        if args.data:
+            import pandas as pd
+            sample = pd.read_csv(args.data)['text'].dropna().tolist()
+        else:
+            from export_onnx import SAMPLE_TEXTS as sample
+        benchmark_texts = [sample[i % len(sample)] for i in range(args.benchmark)]
+        run_benchmark(classifier, benchmark_texts, args.concurrency, args.max_batch_size, args.max_wait_ms)
+    else:
+        cache = PredictionCache(classifier, args.cache_size, args.cache_ttl) if args.cache_size else None
+        cascade = KeywordCascade(intents=classifier.intents) if args.keyword_cascade else None
+        if cascade and cascade.skipped_intents:
+            print(f"⚠️ Keyword fast path skips intents the model doesn't have: {', '.join(cascade.skipped_intents)}")
+        try:
+            asyncio.run(serve(
+                classifier, args.host, args.port, args.unix_socket, args.max_batch_size, args.max_wait_ms,
+                cache, cascade
+            ))
+        except KeyboardInterrupt:
+            print("\n👋 Server stopped")
@@ -0,0 +1,145 @@
+# Batched intent classification on top of the fine-tuned chatbot_model/ artifacts
+import argparse
+import json
+import os
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+
+# Mirrors the userSpecificIntents filter in backend/Controllers/chatbotController.js
+def allowed_for_user(intent, user_type):
+    if user_type is None:
+        return True
+    if user_type == 'admin':
+        return intent.startswith('admin_') or not intent.startswith('customer_')
+    return intent.startswith('customer_') or not intent.startswith('admin_')
+
+
+class IntentClassifier:
+    def __init__(self, model_path='./chatbot_model', device=None, max_length=128, batch_size=64, model=None):
+        self.model_path = model_path
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        # model: an already loaded model for model_path, e.g. from artifact_loader.load_model
+        self.model = model if model is not None else AutoModelForSequenceClassification.from_pretrained(model_path)
+        self.model.to(self.device)
+        self.model.eval()
+
+        with open(os.path.join(model_path, 'model_config.json')) as f:
+            self.model_config = json.load(f)
+        id_to_intent = {int(idx): intent for idx, intent in self.model_config['id_to_intent'].items()}
+        self.intents = [id_to_intent[idx] for idx in range(len(id_to_intent))]
+
+        # Temperature from the calibration stage; usually already folded into the classifier weights
+        self.temperature = 1.0
+        if not self.model_config.get('temperature_folded', True):
+            self.temperature = self.model_config.get('temperature', 1.0)
+
+        # Additive logit masks per user type, built once
+        self._masks = {}
+
+    def _mask_for(self, user_type):
+        if user_type not in self._masks:
+            mask = torch.tensor(
+                [0.0 if allowed_for_user(intent, user_type) else float('-inf') for intent in self.intents]
+            )
+            self._masks[user_type] = mask
+        return self._masks[user_type]
+
+    def predict_logits(self, texts):
+        texts = list(texts)
+        # Sort by length so each chunk pads to a similar size, then restore the input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        logits = torch.empty((len(texts), len(self.intents)), dtype=torch.float32)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                inputs = self.tokenizer(
+                    [texts[i] for i in chunk],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length
+                )
+                inputs = {key: value.to(self.device) for key, value in inputs.items()}
+                logits[chunk] = self.model(**inputs).logits.float().cpu()
+
+        return logits
+
+    def predict_batch(self, texts, user_type=None, top_k=1):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.results_from_logits(texts, self.predict_logits(texts), user_type=user_type, top_k=top_k)
+
+    def results_from_logits(self, texts, logits, user_type=None, top_k=1):
+        # Shared by predict_batch and callers that batch forward passes themselves
+        logits = logits / self.temperature
+        if user_type is not None:
+            logits = logits + self._mask_for(user_type)
+        probabilities = torch.softmax(logits, dim=-1)
+        scores, indices = probabilities.topk(min(top_k, len(self.intents)), dim=-1)
+
+        results = []
+        for text, row_scores, row_indices in zip(texts, scores.tolist(), indices.tolist()):
+            result = {
+                'text': text,
+                'intent': self.intents[row_indices[0]],
+                'confidence': row_scores[0]
+            }
+            if top_k > 1:
+                result['top_k'] = [
+                    {'intent': self.intents[idx], 'confidence': score}
+                    for idx, score in zip(row_indices, row_scores)
+                ]
+            results.append(result)
+        return results
+
+    def predict(self, text, user_type=None, top_k=1):
+        return self.predict_batch([text], user_type=user_type, top_k=top_k)[0]
+
+
+def read_texts(path, text_field='message'):
+    # Plain text (one utterance per line) or JSONL exported from chatMessageModel
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                record = json.loads(line)
+                yield record.get(text_field) or record.get('text', '')
+            else:
+                yield line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classify logged chat traffic offline")
+    parser.add_argument('input', help="Text file (one utterance per line) or JSONL export")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--output', default='predictions.jsonl')
+    parser.add_argument('--user-type', choices=['admin', 'customer'], default=None)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--text-field', default='message')
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(args.model_path, batch_size=args.batch_size)
+    texts = list(read_texts(args.input, args.text_field))
+    print(f"🔤 Classifying {len(texts)} utterances...")
+
+    start_time = time.perf_counter()
+    results = classifier.predict_batch(texts, user_type=args.user_type)
+    elapsed = time.perf_counter() - start_time
+
+    with open(args.output, 'w') as f:
+        for result in results:
+            f.write(json.dumps(result) + '\n')
+
+    print(f"✅ Wrote {len(results)} predictions to {args.output}")
+    print(f"⚡ {len(results) / max(elapsed, 1e-9):.0f} utterances/sec ({elapsed:.2f}s)")
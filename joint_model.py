@@ -0,0 +1,291 @@
+# Joint intent + slot model: the fine-tuned DistilBERT sequence classifier plus a token
+# classification head over the same encoder output, so one forward pass returns both the
+# intent and the entities (dish, price, category, restaurant, order id, status, ...) that
+# chatbotController.js otherwise re-parses with regexes and string splits.
+# The checkpoint keeps the DistilBertForSequenceClassification weight names, so
+# AutoModelForSequenceClassification (and IntentClassifier) still load it as a plain classifier.
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from transformers import AutoTokenizer, DistilBertForSequenceClassification, Trainer, TrainingArguments
+
+from chatbot_data_generation import SLOT_TAGS, iter_slot_rows, normalize_text, word_spans
+from intent_classifier import IntentClassifier
+
+
+class JointIntentSlotModel(DistilBertForSequenceClassification):
+    def __init__(self, config):
+        super().__init__(config)
+        config.slot_tags = getattr(config, 'slot_tags', None) or list(SLOT_TAGS)
+        self.slot_dropout = nn.Dropout(config.dropout)
+        self.slot_classifier = nn.Linear(config.dim, len(config.slot_tags))
+        self.post_init()
+
+    def forward(self, input_ids=None, attention_mask=None, labels=None, slot_labels=None, slot_loss_weight=1.0, **kwargs):
+        hidden = self.distilbert(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+        # Intent head exactly as DistilBertForSequenceClassification computes it
+        pooled = self.dropout(nn.ReLU()(self.pre_classifier(hidden[:, 0])))
+        logits = self.classifier(pooled)
+        slot_logits = self.slot_classifier(self.slot_dropout(hidden))
+
+        loss = None
+        if labels is not None and slot_labels is not None:
+            loss = F.cross_entropy(logits, labels) + slot_loss_weight * F.cross_entropy(
+                slot_logits.view(-1, slot_logits.size(-1)), slot_labels.view(-1), ignore_index=-100
+            )
+        return {'loss': loss, 'logits': logits, 'slot_logits': slot_logits}
+
+
+def tokenize_words(tokenizer, words_batch, max_length=128, **kwargs):
+    return tokenizer(words_batch, is_split_into_words=True, truncation=True, max_length=max_length, **kwargs)
+
+
+def encode_slot_rows(tokenizer, rows, intent_to_id, max_length=128):
+    # Tag ids on the first sub-token of each word; later sub-tokens and specials are ignored (-100)
+    tag_to_id = {tag: idx for idx, tag in enumerate(SLOT_TAGS)}
+    encodings = tokenize_words(tokenizer, [row['words'] for row in rows], max_length)
+    features = []
+    for index, row in enumerate(rows):
+        slot_labels, previous = [], None
+        for word_id in encodings.word_ids(index):
+            slot_labels.append(tag_to_id[row['tags'][word_id]] if word_id is not None and word_id != previous else -100)
+            previous = word_id
+        features.append({
+            'input_ids': encodings['input_ids'][index],
+            'attention_mask': encodings['attention_mask'][index],
+            'labels': intent_to_id[row['intent']],
+            'slot_labels': slot_labels,
+        })
+    return features
+
+
+def plain_rows(texts, intents):
+    # Training-split phrases carry no slots: every word tagged "O"
+    rows = []
+    for text, intent in zip(texts, intents):
+        words = [word for word, _, _ in word_spans(text)]
+        rows.append({'text': text, 'intent': intent, 'words': words, 'tags': ['O'] * len(words)})
+    return rows
+
+
+def slot_rows(num_rows, seed, intents, exclude=()):
+    # Synthetic templated rows, restricted to intents the classifier knows. Plain rows are drawn
+    # from every base phrase, so rows whose normalize_text is in exclude (held-out phrases) are dropped.
+    known = set(intents)
+    excluded = set(exclude)
+    return [
+        row for row in iter_slot_rows(num_rows, seed)
+        if row['intent'] in known and normalize_text(row['text']) not in excluded
+    ]
+
+
+class JointCollator:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, features):
+        batch = self.tokenizer.pad(
+            [{'input_ids': f['input_ids'], 'attention_mask': f['attention_mask']} for f in features],
+            return_tensors='pt'
+        )
+        width = batch['input_ids'].shape[1]
+        batch['labels'] = torch.tensor([f['labels'] for f in features], dtype=torch.long)
+        batch['slot_labels'] = torch.tensor(
+            [f['slot_labels'] + [-100] * (width - len(f['slot_labels'])) for f in features], dtype=torch.long
+        )
+        return batch
+
+
+def train_joint_model(model_path, output_dir, rows, num_train_epochs=3, learning_rate=5e-5, batch_size=16,
+                      max_length=128):
+    # Starts from the fine-tuned intent model: encoder and intent head are loaded, the slot head is new
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = JointIntentSlotModel.from_pretrained(model_path)
+    intent_to_id = {intent: int(idx) for intent, idx in model.config.label2id.items()}
+    features = encode_slot_rows(tokenizer, rows, intent_to_id, max_length)
+
+    training_args = TrainingArguments(
+        output_dir=os.path.join(output_dir, 'trainer'),
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=batch_size,
+        learning_rate=learning_rate,
+        warmup_ratio=0.1,
+        weight_decay=0.01,
+        logging_steps=50,
+        eval_strategy="no",
+        save_strategy="no",
+        report_to="none",
+        remove_unused_columns=False,
+        dataloader_pin_memory=False,
+    )
+    Trainer(model=model, args=training_args, train_dataset=features, data_collator=JointCollator(tokenizer)).train()
+    shutil.rmtree(os.path.join(output_dir, 'trainer'), ignore_errors=True)
+
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    with open(os.path.join(model_path, 'model_config.json')) as f:
+        model_config = json.load(f)
+    # Fine-tuning moves the intent logits, so a temperature folded into the starting model no longer
+    # applies; the caller refits it (stage_joint does, on the calibration split)
+    model_config.pop('temperature', None)
+    model_config.pop('temperature_folded', None)
+    model_config['joint'] = {'slot_tags': model.config.slot_tags, 'training_rows': len(rows), 'epochs': num_train_epochs}
+    with open(os.path.join(output_dir, 'model_config.json'), 'w') as f:
+        json.dump(model_config, f, indent=2)
+    return model
+
+
+def tags_to_entities(text, spans, tags):
+    # Contiguous B-/I- runs -> {slot: original text}; the first occurrence of a slot wins
+    entities, current = {}, None
+    for (_, start, end), tag in zip(spans, tags + ['O']):
+        if tag.startswith('I-') and current and current[0] == tag[2:]:
+            current[2] = end
+            continue
+        if current and current[0] not in entities:
+            entities[current[0]] = text[current[1]:current[2]]
+        current = [tag[2:], start, end] if tag != 'O' else None
+    if current and current[0] not in entities:
+        entities[current[0]] = text[current[1]:current[2]]
+    return entities
+
+
+class JointClassifier:
+    # IntentClassifier's predict/predict_batch surface; every result also carries 'entities'
+    def __init__(self, model_path='./chatbot_model_joint', device=None, max_length=128, batch_size=64):
+        self.model_path = model_path
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = JointIntentSlotModel.from_pretrained(model_path)
+        self.model.to(self.device)
+        self.model.eval()
+        self.slot_tags = self.model.config.slot_tags
+
+        with open(os.path.join(model_path, 'model_config.json')) as f:
+            self.model_config = json.load(f)
+        id_to_intent = {int(idx): intent for idx, intent in self.model_config['id_to_intent'].items()}
+        self.intents = [id_to_intent[idx] for idx in range(len(id_to_intent))]
+        self.temperature = 1.0
+        if not self.model_config.get('temperature_folded', True):
+            self.temperature = self.model_config.get('temperature', 1.0)
+        self._masks = {}
+
+    def predict_joint(self, texts):
+        # Intent logits [N, intents] plus word-level BIO tags per text, from one encoder pass per chunk
+        texts = list(texts)
+        spans = [word_spans(text) for text in texts]
+        logits = torch.empty((len(texts), len(self.intents)), dtype=torch.float32)
+        tags = [None] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                chunk = list(range(start, min(start + self.batch_size, len(texts))))
+                inputs = tokenize_words(
+                    self.tokenizer, [[word for word, _, _ in spans[i]] for i in chunk], self.max_length,
+                    padding=True, return_tensors='pt'
+                )
+                outputs = self.model(
+                    input_ids=inputs['input_ids'].to(self.device), attention_mask=inputs['attention_mask'].to(self.device)
+                )
+                logits[chunk] = outputs['logits'].float().cpu()
+                slot_ids = outputs['slot_logits'].argmax(dim=-1).cpu().tolist()
+                for row, index in enumerate(chunk):
+                    # Truncated words past max_length stay "O"
+                    word_tags, previous = ['O'] * len(spans[index]), None
+                    for position, word_id in enumerate(inputs.word_ids(row)):
+                        if word_id is not None and word_id != previous:
+                            word_tags[word_id] = self.slot_tags[slot_ids[row][position]]
+                        previous = word_id
+                    tags[index] = word_tags
+        return logits, spans, tags
+
+    def predict_batch(self, texts, user_type=None, top_k=1):
+        texts = list(texts)
+        if not texts:
+            return []
+        logits, spans, tags = self.predict_joint(texts)
+        results = self.results_from_logits(texts, logits, user_type=user_type, top_k=top_k)
+        for result, text, text_spans, text_tags in zip(results, texts, spans, tags):
+            result['entities'] = tags_to_entities(text, text_spans, text_tags)
+        return results
+
+    def predict_logits(self, texts):
+        return self.predict_joint(texts)[0]
+
+    _mask_for = IntentClassifier._mask_for
+    results_from_logits = IntentClassifier.results_from_logits
+    predict = IntentClassifier.predict
+
+
+def slot_f1(gold_tags, predicted_tags):
+    # Exact-match span F1 over (slot, start word, end word)
+    def spans_of(tags):
+        found, current = set(), None
+        for index, tag in enumerate(tags + ['O']):
+            if tag.startswith('I-') and current and current[0] == tag[2:]:
+                current[2] = index
+                continue
+            if current:
+                found.add(tuple(current))
+            current = [tag[2:], index, index] if tag != 'O' else None
+        return found
+
+    true_positives = predicted_total = gold_total = 0
+    for gold, predicted in zip(gold_tags, predicted_tags):
+        gold_spans, predicted_spans = spans_of(gold), spans_of(predicted)
+        true_positives += len(gold_spans & predicted_spans)
+        predicted_total += len(predicted_spans)
+        gold_total += len(gold_spans)
+    precision = true_positives / predicted_total if predicted_total else 0.0
+    recall = true_positives / gold_total if gold_total else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'gold_spans': gold_total,
+        'predicted_spans': predicted_total,
+    }
+
+
+def evaluate_joint(classifier, rows):
+    texts = [row['text'] for row in rows]
+    start_time = time.perf_counter()
+    logits, _, predicted_tags = classifier.predict_joint(texts)
+    elapsed = time.perf_counter() - start_time
+    predictions = [classifier.intents[index] for index in logits.argmax(dim=-1).tolist()]
+    return {
+        'rows': len(rows),
+        'intent_accuracy': float(np.mean([prediction == row['intent'] for prediction, row in zip(predictions, rows)])),
+        'slots': slot_f1([row['tags'] for row in rows], predicted_tags),
+        'utterances_per_sec': len(rows) / max(elapsed, 1e-9),
+    }
+
+
+def format_joint_report(metrics, examples):
+    report = "Joint Intent + Slot Report\n" + "=" * 60 + "\n"
+    for name, row in metrics.items():
+        slots = row['slots']
+        if slots['gold_spans']:
+            slot_summary = f"slot F1 {slots['f1']:.3f} (P {slots['precision']:.3f} / R {slots['recall']:.3f})"
+        else:
+            # Plain phrases have no entities; anything predicted is spurious
+            slot_summary = f"{slots['predicted_spans']} spurious slot spans"
+        report += (
+            f"{name}: {row['rows']} utterances, intent accuracy {row['intent_accuracy']:.2%}, "
+            f"{slot_summary}, {row['utterances_per_sec']:.0f} utt/s\n"
+        )
+    report += "\nExamples:\n"
+    for example in examples:
+        report += f"   '{example['text']}' -> {example['intent']} {example['entities']}\n"
+    return report
@@ -0,0 +1,223 @@
+# Keyword fast path in front of the transformer. The phrase lists and slot templates in
+# chatbot_data_generation.py are compiled into an exact-phrase table plus one combined regex
+# per user type; a message matching exactly one intent is answered without the model, and
+# everything else falls through to IntentClassifier in a single batch.
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from chatbot_data_generation import (
+    intent_sources, normalize_text, SLOT_PATTERN, DISHES, CATEGORIES, STATUSES
+)
+from intent_classifier import read_texts
+
+USER_TYPES = ('admin', 'customer')
+KEYWORD_CONFIDENCE = 1.0
+
+# Slot regexes over normalized text; closed pools keep e.g. "find {dish}" from matching "find italian food"
+WORDS = r"\w+(?: \w+)*?"
+SLOT_REGEXES = {
+    'dish': "|".join(re.escape(normalize_text(value)) for value in DISHES),
+    'category': "|".join(re.escape(normalize_text(value)) for value in CATEGORIES),
+    'status': "|".join(re.escape(normalize_text(value)) for value in STATUSES),
+    'order_id': r"[0-9a-f]{6,24}",
+    'price': r"\d+",
+    'phone': r"\d+(?: \d+)*",
+    'restaurant': WORDS,
+    'address': WORDS,
+    'description': WORDS,
+}
+
+
+def template_regex(template):
+    # "Add {dish} to the {restaurant} menu" -> "add (?:burger|...) to the \w+... menu" on normalized text
+    pieces = []
+    cursor = 0
+    for match in SLOT_PATTERN.finditer(template):
+        pieces.append(re.escape(normalize_text(template[cursor:match.start()])))
+        pieces.append(f"(?:{SLOT_REGEXES[match.group(1)]})")
+        cursor = match.end()
+    pieces.append(re.escape(normalize_text(template[cursor:])))
+    return " ".join(piece for piece in pieces if piece)
+
+
+class KeywordCascade:
+    # exclude: normalize_text keys kept out of the exact-phrase table, e.g. the calibration and test
+    # phrases when the fast path is measured on the split model.py trained on.
+    # intents: the loaded model's labels; phrases and templates of any other intent are left out,
+    # so the fast path never answers with an intent the model doesn't have.
+    def __init__(self, sources=None, exclude=(), intents=None):
+        sources = sources or intent_sources()
+        excluded = set(exclude)
+        if intents is not None:
+            known = set(intents)
+            self.skipped_intents = sorted({source[0] for source in sources} - known)
+            sources = [source for source in sources if source[0] in known]
+        else:
+            self.skipped_intents = []
+        self.phrases = {user_type: {} for user_type in USER_TYPES}
+        self.patterns = {}
+        templates = {user_type: [] for user_type in USER_TYPES}
+
+        for intent, user_type, _, samples, slot_templates in sources:
+            table = self.phrases[user_type]
+            for text in samples:
+                key = normalize_text(text)
+                if key in excluded:
+                    continue
+                # A phrase listed under two intents is ambiguous and left to the model
+                table[key] = intent if table.get(key, intent) == intent else None
+            templates[user_type].extend((intent, template) for template in slot_templates)
+
+        for user_type, entries in templates.items():
+            # Most literal text first, so specific templates win over general ones
+            entries.sort(key=lambda entry: -len(SLOT_PATTERN.sub("", entry[1])))
+            self.patterns[user_type] = (
+                re.compile("(?:" + "|".join(
+                    f"(?P<t{i}>{template_regex(template)})" for i, (_, template) in enumerate(entries)
+                ) + r")\Z"),
+                [intent for intent, _ in entries]
+            )
+
+        # Without a user type, a phrase only counts if both sides agree
+        merged = {}
+        for user_type in USER_TYPES:
+            for key, intent in self.phrases[user_type].items():
+                merged[key] = intent if merged.get(key, intent) == intent else None
+        self.phrases[None] = merged
+
+    def match(self, text, user_type=None):
+        # User types the table doesn't know (e.g. 'guest') always go to the model
+        if user_type not in self.phrases:
+            return None
+        key = normalize_text(text)
+        if key in self.phrases[user_type]:
+            return self.phrases[user_type][key]
+
+        matches = set()
+        for side in ((user_type,) if user_type else USER_TYPES):
+            pattern, intents = self.patterns[side]
+            found = pattern.match(key)
+            if found:
+                matches.add(intents[int(found.lastgroup[1:])])
+        return matches.pop() if len(matches) == 1 else None
+
+
+class CascadeClassifier:
+    def __init__(self, classifier, cascade=None):
+        self.classifier = classifier
+        self.cascade = cascade or KeywordCascade(intents=classifier.intents)
+
+    def predict_batch(self, texts, user_type=None, top_k=1):
+        texts = list(texts)
+        results = []
+        pending = []
+        for index, text in enumerate(texts):
+            intent = self.cascade.match(text, user_type)
+            if intent is None:
+                pending.append(index)
+                results.append(None)
+            else:
+                results.append({'text': text, 'intent': intent, 'confidence': KEYWORD_CONFIDENCE, 'source': 'keyword'})
+
+        # Only the messages the fast path couldn't settle reach the transformer
+        if pending:
+            predictions = self.classifier.predict_batch([texts[i] for i in pending], user_type=user_type, top_k=top_k)
+            for index, prediction in zip(pending, predictions):
+                results[index] = {**prediction, 'source': 'model'}
+        return results
+
+    def predict(self, text, user_type=None, top_k=1):
+        return self.predict_batch([text], user_type=user_type, top_k=top_k)[0]
+
+
+def held_out_phrases(split_dir):
+    # Normalized calibration and test phrases from model.py's split/ directory
+    keys = set()
+    for name in ('calibration', 'test'):
+        path = os.path.join(split_dir, f'{name}.jsonl')
+        if os.path.exists(path):
+            with open(path) as f:
+                keys.update(normalize_text(json.loads(line)['text']) for line in f if line.strip())
+    return keys
+
+
+def user_type_of(intent):
+    return intent.split('_', 1)[0] if intent.split('_', 1)[0] in USER_TYPES else None
+
+
+def measure(predict, texts, user_types):
+    # One message at a time, the shape of a /chat request
+    timings = []
+    for text, user_type in zip(texts, user_types):
+        start_time = time.perf_counter()
+        predict(text, user_type)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return float(np.mean(timings)), float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def cascade_report(cascade_classifier, name, texts, user_types, labels=None):
+    cascade = cascade_classifier.cascade
+    hits = [cascade.match(text, user_type) for text, user_type in zip(texts, user_types)]
+    resolved = [intent is not None for intent in hits]
+
+    model_predict = lambda text, user_type: cascade_classifier.classifier.predict(text, user_type=user_type)
+    model_predict(texts[0], user_types[0])
+    model_ms = measure(model_predict, texts, user_types)
+    cascade_ms = measure(cascade_classifier.predict, texts, user_types)
+
+    report = f"{name}: {len(texts)} messages\n"
+    report += f"   resolved by keyword fast path: {np.mean(resolved):.1%}\n"
+    if labels is not None and any(resolved):
+        correct = [intent == label for intent, label in zip(hits, labels) if intent is not None]
+        report += f"   fast-path precision:           {np.mean(correct):.2%}\n"
+    report += f"   {'':<10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}\n"
+    report += f"   {'model':<10}" + "".join(f"{value:>10.3f}" for value in model_ms) + "\n"
+    report += f"   {'cascade':<10}" + "".join(f"{value:>10.3f}" for value in cascade_ms) + "\n"
+    report += f"   mean latency saved: {1 - cascade_ms[0] / model_ms[0]:.1%}\n"
+    return report
+
+
+if __name__ == '__main__':
+    from intent_classifier import IntentClassifier
+
+    parser = argparse.ArgumentParser(description="Measure the keyword fast path on the test split and logged traffic")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--split-dir', default='./training_work/split', help="split/ directory written by model.py")
+    parser.add_argument('--logs', default=None, help="Logged traffic: text file or chatMessageModel JSONL export")
+    parser.add_argument('--output', default='keyword_cascade_report.txt')
+    args = parser.parse_args()
+
+    # Held-out phrases are left out of the exact-phrase table, so test-split hits come from phrases
+    # the table was not built from (the server's default cascade keeps every phrase)
+    held_out = held_out_phrases(args.split_dir)
+    classifier = IntentClassifier(args.model_path, device='cpu')
+    cascade_classifier = CascadeClassifier(classifier, KeywordCascade(exclude=held_out, intents=classifier.intents))
+    report = "Keyword Cascade Report (CPU, batch size 1)\n" + "=" * 60 + "\n"
+    report += f"Exact-phrase table built without {len(held_out)} calibration/test phrases\n"
+    if cascade_classifier.cascade.skipped_intents:
+        report += f"Intents the model doesn't have, left out of the fast path: {', '.join(cascade_classifier.cascade.skipped_intents)}\n"
+
+    test_path = os.path.join(args.split_dir, 'test.jsonl')
+    if os.path.exists(test_path):
+        with open(os.path.join(args.split_dir, 'intents.json')) as f:
+            intents = json.load(f)
+        with open(test_path) as f:
+            rows = [json.loads(line) for line in f]
+        labels = [intents[row['label']] for row in rows]
+        report += cascade_report(
+            cascade_classifier, "Test split", [row['text'] for row in rows], [user_type_of(label) for label in labels], labels
+        )
+
+    if args.logs:
+        log_texts = list(read_texts(args.logs))
+        report += "\n" + cascade_report(cascade_classifier, "Logged traffic", log_texts, [None] * len(log_texts))
+
+    print(report)
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(f"✅ Report saved to {args.output}")
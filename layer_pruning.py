@@ -0,0 +1,146 @@
+# Structured pruning by dropping whole transformer layers from the fine-tuned model.
+# Each truncated configuration (top-k, bottom-k or alternating layers removed) is briefly
+# re-fine-tuned, then compared on accuracy, F1, parameter count and CPU latency; the
+# smallest one above an accuracy floor is kept in the chatbot_model/ layout.
+import copy
+import json
+import os
+import shutil
+
+import numpy as np
+import torch.nn as nn
+from sklearn.metrics import accuracy_score, f1_score
+from transformers import AutoModelForSequenceClassification, Trainer, TrainingArguments
+
+from distillation import parameter_count
+from export_onnx import measure_latency
+from intent_classifier import IntentClassifier
+
+LAYER_STRATEGIES = ('top', 'bottom', 'alternating')
+
+
+def kept_layers(n_layers, num_keep, strategy):
+    # Indices of the layers that survive; "top" drops the last layers, "bottom" the first
+    if strategy == 'top':
+        return list(range(num_keep))
+    if strategy == 'bottom':
+        return list(range(n_layers - num_keep, n_layers))
+    if strategy == 'alternating':
+        return sorted({int(round(index)) for index in np.linspace(0, n_layers - 1, num_keep)})
+    raise ValueError(f"Unknown layer strategy: {strategy}")
+
+
+def layer_configurations(n_layers, keep_counts=None, strategies=LAYER_STRATEGIES, min_layers=1):
+    # min_layers=2 keeps an exit point before the last layer for early_exit.py
+    keep_counts = keep_counts or range(n_layers - 1, min_layers - 1, -1)
+    configurations, seen = [], set()
+    for num_keep in keep_counts:
+        for strategy in strategies:
+            layers = kept_layers(n_layers, num_keep, strategy)
+            # e.g. keeping 1 of 2 layers alternating == top
+            if tuple(layers) not in seen:
+                seen.add(tuple(layers))
+                # Named by the layers kept: "top" and "bottom" with the same count are different models
+                configurations.append({'name': 'layers-' + '-'.join(map(str, layers)), 'strategy': strategy, 'layers': layers})
+    return configurations
+
+
+def truncate_layers(model, layers):
+    truncated = copy.deepcopy(model)
+    transformer = truncated.distilbert.transformer
+    transformer.layer = nn.ModuleList([transformer.layer[index] for index in layers])
+    transformer.n_layers = len(layers)
+    truncated.config.n_layers = len(layers)
+    return truncated
+
+
+def evaluate_model(model_path, texts, labels, latency_samples=50):
+    classifier = IntentClassifier(model_path, device='cpu')
+    predictions = classifier.predict_logits(texts).argmax(dim=-1).numpy()
+    return {
+        'accuracy': float(accuracy_score(labels, predictions)),
+        'f1': float(f1_score(labels, predictions, average='weighted', zero_division=0)),
+        'parameters': parameter_count(classifier.model),
+        'latency': measure_latency(classifier.predict_logits, list(texts)[:latency_samples]),
+    }
+
+
+def save_truncated(model, tokenizer, model_path, output_dir, configuration, num_train_epochs):
+    os.makedirs(output_dir, exist_ok=True)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(model_path, 'model_config.json')) as f:
+        model_config = json.load(f)
+    model_config['layer_pruning'] = {
+        'strategy': configuration['strategy'],
+        'kept_layers': configuration['layers'],
+        'refine_epochs': num_train_epochs,
+    }
+    with open(os.path.join(output_dir, 'model_config.json'), 'w') as f:
+        json.dump(model_config, f, indent=2)
+
+
+def layer_drop_sweep(model_path, tokenizer, train_dataset, data_collator, eval_texts, eval_labels, output_dir,
+                     configurations=None, num_train_epochs=1, learning_rate=5e-5, batch_size=16,
+                     trainer_class=Trainer, min_layers=1):
+    # train_dataset must carry exactly the columns trainer_class knows how to consume
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    configurations = configurations or layer_configurations(model.config.n_layers, min_layers=min_layers)
+
+    rows = [{
+        'name': 'full', 'strategy': None, 'layers': list(range(model.config.n_layers)), 'path': model_path,
+        **evaluate_model(model_path, eval_texts, eval_labels),
+    }]
+
+    for configuration in configurations:
+        print(f"\n✂️  {configuration['name']} ({configuration['strategy']} layers dropped)")
+        truncated = truncate_layers(model, configuration['layers'])
+        candidate_path = os.path.join(output_dir, configuration['name'])
+
+        if num_train_epochs > 0:
+            refine_args = TrainingArguments(
+                output_dir=os.path.join(output_dir, 'trainer'),
+                num_train_epochs=num_train_epochs,
+                per_device_train_batch_size=batch_size,
+                group_by_length='length' in train_dataset.column_names,
+                length_column_name="length",
+                learning_rate=learning_rate,
+                warmup_ratio=0.1,
+                weight_decay=0.01,
+                logging_steps=20,
+                eval_strategy="no",
+                save_strategy="no",
+                report_to="none",
+                remove_unused_columns=False,
+                dataloader_pin_memory=False,
+            )
+            trainer_class(
+                model=truncated, args=refine_args, train_dataset=train_dataset, data_collator=data_collator
+            ).train()
+            shutil.rmtree(os.path.join(output_dir, 'trainer'), ignore_errors=True)
+
+        save_truncated(truncated, tokenizer, model_path, candidate_path, configuration, num_train_epochs)
+        rows.append({**configuration, 'path': candidate_path, **evaluate_model(candidate_path, eval_texts, eval_labels)})
+    return rows
+
+
+def choose_configuration(rows, accuracy_floor):
+    # Fewest layers (then fastest) among configurations at or above the floor; the full model otherwise
+    candidates = [row for row in rows[1:] if row['accuracy'] >= accuracy_floor]
+    if not candidates:
+        return rows[0]
+    return min(candidates, key=lambda row: (len(row['layers']), row['latency']['p50_ms'], -row['accuracy']))
+
+
+def format_layer_sweep(rows, chosen, accuracy_floor):
+    report = "Layer-Dropping Report (CPU, batch size 1)\n"
+    report += "=" * 86 + "\n"
+    report += f"{'config':<20}{'strategy':<14}{'accuracy':>10}{'F1':>8}{'params':>14}{'p50 ms':>9}{'p99 ms':>9}\n"
+    for row in rows:
+        marker = " *" if row is chosen else ""
+        report += (
+            f"{row['name']:<20}{row['strategy'] or '-':<14}{row['accuracy']:>10.2%}{row['f1']:>8.3f}"
+            f"{row['parameters']:>14,}{row['latency']['p50_ms']:>9.2f}{row['latency']['p99_ms']:>9.2f}{marker}\n"
+        )
+    report += f"\nAccuracy floor: {accuracy_floor:.2%} -> selected '{chosen['name']}'\n"
+    return report
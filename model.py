@@ -1,149 +1,428 @@
-# Install required packages
-!pip install transformers datasets torch accelerate pandas scikit-learn matplotlib seaborn -q
+# Chatbot intent classification - training pipeline
+#
+#   python model.py --data models/enhanced_chatbot_dataset.csv --base-model ./distilbert-base-uncased
+#
+# Stages: load -> split -> tokenize -> train -> calibrate -> evaluate -> export -> package
+# (plus the optional layer_drop, prune_vocab, early_exit, distill and joint stages). Each
+# stage records a content hash of its inputs and outputs under <work-dir>/.stages, so a
+# rerun skips unchanged stages.
+# Runs headless on CPU; with a local --base-model directory no network access is needed.
+#
+# Requirements: pip install transformers datasets torch accelerate pandas scikit-learn matplotlib seaborn onnx onnxruntime faker
 
 # Import libraries
+import argparse
+import json
+import os
+import shutil
+import time
+import zipfile
+from pathlib import Path
+from types import SimpleNamespace
+
 import pandas as pd
 import torch
-import os
-import json
+import torch.nn.functional as F
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from transformers import (
-    AutoTokenizer, 
-    AutoModelForSequenceClassification, 
-    Trainer, 
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    Trainer,
     TrainingArguments,
-    DistilBertConfig
+    DistilBertConfig,
+    DataCollatorWithPadding
 )
-from datasets import Dataset
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support, classification_report, confusion_matrix
-from google.colab import drive
-import zipfile
-import shutil
+from transformers.trainer_pt_utils import LengthGroupedSampler
+from datasets import Dataset, DatasetDict
+from sklearn.model_selection import StratifiedGroupKFold
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 
-print("🚀 Starting Chatbot Intent Classification Model Training")
-
-# Mount Google Drive to save model
-drive.mount('/content/drive')
-
-# Set up paths
-drive_model_path = '/content/drive/MyDrive/chatbot_model'
-local_model_path = './chatbot_model'
-os.makedirs(drive_model_path, exist_ok=True)
-os.makedirs(local_model_path, exist_ok=True)
-
-print("✅ Google Drive mounted and paths created")
-
-# Load and validate dataset
-try:
-    df = pd.read_csv('/content/full_chatbot_data.csv')
-    print(f"✅ Dataset loaded with {len(df)} examples")
-    
-    # Check for required columns
-    if 'text' not in df.columns or 'intent' not in df.columns:
-        raise ValueError("Dataset must contain 'text' and 'intent' columns")
-    
-    # Check for empty values
-    if df['text'].isnull().any() or df['intent'].isnull().any():
-        print("⚠️  Warning: Dataset contains empty values. Cleaning...")
-        df = df.dropna(subset=['text', 'intent'])
-    
-    print(f"✅ Cleaned dataset has {len(df)} examples")
-    print(f"📊 Intents distribution:\n{df['intent'].value_counts()}")
-    
-except Exception as e:
-    print(f"❌ Error loading dataset: {e}")
-    raise
-
-# Preprocess data - map intents to labels
-intents = sorted(df['intent'].unique())
-intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
-id_to_intent = {idx: intent for intent, idx in intent_to_id.items()}
-df['label'] = df['intent'].map(intent_to_id)
-
-print(f"📊 Number of classes: {len(intents)}")
-print("🔤 Class mapping:", intent_to_id)
-
-# Split data (80% train, 20% test)
-train_texts, test_texts, train_labels, test_labels = train_test_split(
-    df['text'].tolist(), 
-    df['label'].tolist(), 
-    test_size=0.2, 
-    random_state=42, 
-    stratify=df['label']
+from chatbot_data_generation import normalize_text, iter_shard_frames, iter_synthetic_rows
+from intent_classifier import IntentClassifier
+from dataset_cache import DatasetCache
+from stage_cache import StageRunner
+import profiling
+from calibration import fit_temperature, fold_temperature, calibration_metrics, format_calibration_report
+from export_onnx import export_and_verify
+from distillation import distill_student, compare_models, format_comparison
+from early_exit import EarlyExitClassifier, early_exit_sweep, choose_threshold, format_sweep, HEADS_FILENAME
+from vocab_pruning import prune_and_verify, format_pruning_report, DEFAULT_RESERVE
+from layer_pruning import layer_drop_sweep, choose_configuration, format_layer_sweep
+from joint_model import JointClassifier, train_joint_model, plain_rows, slot_rows, evaluate_joint, format_joint_report
+from artifact_loader import write_manifest, verify_manifest, load_classifier
+from streaming_eval import StreamingMetrics, save_confusion_matrix, stream_evaluate, write_reports
+from augmentation import (
+    AugmentedDataset, epoch_callback, format_augmentation_report, robustness_accuracy, format_robustness_report
 )
-print(f"📚 Training samples: {len(train_texts)}, Test samples: {len(test_texts)}")
-
-# Load DistilBERT tokenizer and model
-model_name = "distilbert-base-uncased"
-print(f"🔧 Loading model: {model_name}")
-
-try:
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    
-    # Create model configuration
-    config = DistilBertConfig.from_pretrained(
-        model_name,
-        num_labels=len(intents),
-        id2label=id_to_intent,
-        label2id=intent_to_id,
-        problem_type="single_label_classification"
+
+STAGES = ['load', 'split', 'tokenize', 'train', 'layer_drop', 'calibrate', 'prune_vocab', 'evaluate', 'export', 'early_exit', 'distill', 'joint', 'package']
+
+# Enhanced testing with examples
+TEST_EXAMPLES = [
+    "Show me all restaurants",
+    "I want to order pizza",
+    "What's in my cart?",
+    "Add burger to cart",
+    "Update order status",
+    "Find Italian food",
+    "Show my past orders",
+    "Where is my order?",
+    "Go to home page",
+    "Delete restaurant Pizza Palace"
+]
+
+# Messages the backend currently parses with regexes after classifying
+JOINT_EXAMPLES = [
+    "Add food: Burger, Beef burger with cheese, 180, Fast Food, Pizza Palace",
+    "Update order abc123 to Delivered",
+    "Add restaurant: Spice Garden, 12 Park Street, 555-0101",
+    "Find Italian food",
+    "Add Pizza to cart",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train, evaluate, calibrate, export and package the chatbot intent model")
+
+    # Paths
+    parser.add_argument('--data', default='models/enhanced_chatbot_dataset.csv',
+                        help="Training data: a CSV file, or a directory / glob of JSONL or Parquet shards")
+    parser.add_argument('--base-model', default='distilbert-base-uncased',
+                        help="Hub id or local directory of the pretrained model")
+    parser.add_argument('--work-dir', default='./training_work', help="Intermediate artifacts and stage records")
+    parser.add_argument('--output-dir', default='./chatbot_model', help="Packaged model directory")
+    parser.add_argument('--zip-path', default='./chatbot_model_complete.zip')
+    parser.add_argument('--copy-to', default=None, help="Optional directory to copy the packaged model and zip into")
+    parser.add_argument('--cache-dir', default='./dataset_cache', help="Tokenized dataset cache")
+    parser.add_argument('--cache-max-bytes', type=int, default=2 * 1024 ** 3)
+
+    # Stage selection
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help="Comma-separated stages to run (default: all)")
+    parser.add_argument('--force', action='store_true', help="Rerun stages even when their inputs are unchanged")
+
+    # Data / tokenization
+    parser.add_argument('--split-seed', type=int, default=42)
+    parser.add_argument('--max-length', type=int, default=128,
+                        help="Truncation limit only; batches are padded to their longest member")
+    parser.add_argument('--augment', action='store_true',
+                        help="Train on a fresh augmented variant of each phrase every epoch (typos, case, synonyms, slot refills)")
+    parser.add_argument('--augment-keep', type=float, default=0.2,
+                        help="Share of items per epoch served as the unchanged base phrase")
+    parser.add_argument('--augment-workers', type=int, default=2, help="DataLoader workers generating variants")
+    parser.add_argument('--no-group-by-length', dest='group_by_length', action='store_false',
+                        help="Disable bucketing of similar-length utterances into the same batch")
+    parser.add_argument('--no-dataset-cache', dest='use_dataset_cache', action='store_false')
+
+    # Training
+    parser.add_argument('--epochs', type=float, default=4)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--learning-rate', type=float, default=2e-5)
+    # 500 fixed steps exceeded a whole 4-epoch run on the base dataset (~283 steps), so the
+    # default warmup is a fraction of the schedule; --warmup-steps overrides it
+    parser.add_argument('--warmup-ratio', type=float, default=0.1)
+    parser.add_argument('--warmup-steps', type=int, default=None)
+    parser.add_argument('--weight-decay', type=float, default=0.01)
+    parser.add_argument('--no-padding-report', dest='padding_report', action='store_false',
+                        help="Skip timing one epoch with fixed vs dynamic padding")
+
+    # Profiling
+    parser.add_argument('--profile', action='store_true',
+                        help="Record wall/CPU time and peak RSS per stage and per training-step window")
+    parser.add_argument('--profile-every', type=int, default=50, help="Training steps per profiled window")
+    parser.add_argument('--profile-torch-steps', default=None, metavar='START:END',
+                        help="Also capture torch.profiler over these training steps (implies --profile)")
+
+    # Optional stages
+    parser.add_argument('--eval-data', default=None,
+                        help="Labelled JSONL/Parquet shards (dir or glob) to also score in the evaluate stage, streamed in chunks")
+    parser.add_argument('--eval-label-column', default='intent', help="Label column in --eval-data")
+    parser.add_argument('--eval-chunk-size', type=int, default=10_000, help="Rows of --eval-data held in memory at once")
+    parser.add_argument('--selection-rows', type=int, default=2000,
+                        help="Fresh generated rows (in neither train nor test) added to the calibration phrases "
+                             "for layer-drop and hyperparameter selection")
+    parser.add_argument('--layer-drop', action='store_true',
+                        help="Sweep top/bottom/alternating layer removal and keep the smallest model above --accuracy-floor")
+    parser.add_argument('--accuracy-floor', type=float, default=None,
+                        help="Minimum selection-split accuracy for a truncated model (default: full model - 1 point)")
+    parser.add_argument('--layer-drop-epochs', type=float, default=1,
+                        help="Re-fine-tuning epochs for each truncated model")
+    parser.add_argument('--no-calibrate', dest='calibrate', action='store_false',
+                        help="Skip temperature scaling (temperature stays 1.0)")
+    parser.add_argument('--no-onnx', dest='export_onnx', action='store_false',
+                        help="Skip onnx/model.onnx and onnx/model_quantized.onnx")
+    parser.add_argument('--prune-vocab', action='store_true',
+                        help="Shrink the vocabulary and embedding matrix to the tokens the corpus uses")
+    parser.add_argument('--reserve-file', default=None,
+                        help="Extra words or phrases to keep when pruning the vocabulary, one per line")
+    parser.add_argument('--early-exit', action='store_true',
+                        help="Train per-layer exit heads and sweep confidence thresholds")
+    parser.add_argument('--distill', action='store_true',
+                        help="Distill a 2-layer student into <output-dir>_student")
+    parser.add_argument('--joint', action='store_true',
+                        help="Train a joint intent + slot model into <output-dir>_joint")
+    parser.add_argument('--joint-rows', type=int, default=5000,
+                        help="Synthetic BIO-tagged template rows added to the training split for --joint")
+    parser.add_argument('--joint-epochs', type=float, default=3)
+
+    parser.add_argument('--hparams', default=None,
+                        help="best_hparams.json from hparam_search.py; explicit flags still take precedence")
+
+    # Searched values become defaults, so the command line can still override any of them
+    known, _ = parser.parse_known_args(argv)
+    if known.hparams:
+        with open(known.hparams) as f:
+            parser.set_defaults(**json.load(f))
+    args = parser.parse_args(argv)
+    args.stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    if args.profile_torch_steps:
+        args.profile = True
+        args.profile_torch_steps = tuple(int(step) for step in args.profile_torch_steps.split(':'))
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    return args
+
+
+def pipeline_paths(args):
+    work = Path(args.work_dir)
+    reports = work / 'reports'
+    return SimpleNamespace(
+        dataset=work / 'dataset.csv',
+        split=work / 'split',
+        intents=work / 'split' / 'intents.json',
+        training_results=work / 'training_results',
+        logs=work / 'logs',
+        trained_model=work / 'trained_model',
+        layer_drop=work / 'layer_drop',
+        # What calibration starts from: the selected truncated model when layer dropping is on
+        fine_tuned_model=work / ('layer_drop/selected' if args.layer_drop else 'trained_model'),
+        model=work / 'model',
+        pruned_model=work / 'pruned_model',
+        # What export, early exit and package ship: the pruned model when pruning is on
+        serving_model=work / ('pruned_model' if args.prune_vocab else 'model'),
+        onnx=work / 'onnx',
+        early_exit=work / 'early_exit',
+        student=work / 'student',
+        distill=work / 'distill',
+        joint=work / 'joint',
+        reports=reports,
+        padding_report=reports / 'padding_report.txt',
+        classification_report=reports / 'classification_report.txt',
+        confusion_matrix=reports / 'confusion_matrix.png',
+        eval_metrics=reports / 'eval_metrics.json',
+        robustness_report=reports / 'robustness_report.txt',
+        augmentation_report=reports / 'augmentation_report.txt',
+        calibration_report=reports / 'calibration_report.txt',
+        layer_drop_report=reports / 'layer_drop_report.txt',
+        vocab_pruning_report=reports / 'vocab_pruning_report.txt',
+        early_exit_report=reports / 'early_exit_report.txt',
+        distillation_report=reports / 'distillation_report.txt',
+        joint_report=reports / 'joint_report.txt',
+        test_results=work / 'test_results.txt',
+        # Outside reports/ so profiling never invalidates the package stage
+        profile=work / 'profile',
+        output=Path(args.output_dir),
+        student_output=Path(f"{args.output_dir.rstrip('/')}_student"),
+        joint_output=Path(f"{args.output_dir.rstrip('/')}_joint"),
+        zip=Path(args.zip_path),
     )
-    
-    model = AutoModelForSequenceClassification.from_pretrained(
-        model_name,
-        config=config,
-        ignore_mismatched_sizes=False
+
+
+def base_model_input(base_model):
+    # A local base model is hashed by content; a hub id by name
+    return Path(base_model) if os.path.isdir(base_model) else base_model
+
+
+# ---------------------------------------------------------------- load
+
+def load_dataframe(path):
+    try:
+        if path.endswith('.csv'):
+            df = pd.read_csv(path)
+        else:
+            # Collapse each shard chunk to unique (text, intent) weights as it streams in
+            df = pd.concat([
+                chunk.assign(weight=chunk['weight'] if 'weight' in chunk else 1.0)
+                     .groupby(['text', 'intent'], as_index=False, sort=False)['weight'].sum()
+                for chunk in iter_shard_frames(path)
+            ], ignore_index=True)
+        print(f"✅ Dataset loaded with {len(df)} examples")
+
+        # Check for required columns
+        if 'text' not in df.columns or 'intent' not in df.columns:
+            raise ValueError("Dataset must contain 'text' and 'intent' columns")
+
+        # Check for empty values
+        if df['text'].isnull().any() or df['intent'].isnull().any():
+            print("⚠️  Warning: Dataset contains empty values. Cleaning...")
+            df = df.dropna(subset=['text', 'intent'])
+
+        # Collapse duplicate rows into per-sample weights so each utterance is tokenized and trained once
+        if 'weight' not in df.columns:
+            df['weight'] = 1.0
+        df = df.groupby(['text', 'intent'], as_index=False, sort=False)['weight'].sum()
+
+        print(f"✅ Cleaned dataset has {len(df)} unique examples ({df['weight'].sum():.0f} weighted)")
+        print(f"📊 Intents distribution (unique / weighted):\n{df.groupby('intent')['weight'].agg(['count', 'sum'])}")
+        return df
+
+    except Exception as e:
+        print(f"❌ Error loading dataset: {e}")
+        raise
+
+
+def data_input(data_path):
+    if os.path.exists(data_path):
+        return Path(data_path)
+    # Glob of shards: hash every matching file
+    from chatbot_data_generation import shard_paths
+    return [Path(path) for path in shard_paths(data_path)]
+
+
+def stage_load(args, paths):
+    df = load_dataframe(args.data)
+    os.makedirs(paths.dataset.parent, exist_ok=True)
+    df.to_csv(paths.dataset, index=False)
+
+
+# ---------------------------------------------------------------- split
+
+def selection_rows(texts, labels, weights, exclude, intent_to_id, num_rows, seed):
+    # The calibration phrases plus generated rows whose normalized text is new: ~20 calibration
+    # phrases are too few to rank layer-drop configurations or hyperparameter trials on
+    seen = set(exclude) | {normalize_text(text) for text in texts}
+    texts, labels, weights = list(texts), list(labels), list(weights)
+    for row in iter_synthetic_rows(num_rows, seed):
+        key = normalize_text(row['text'])
+        if row['intent'] in intent_to_id and key not in seen:
+            seen.add(key)
+            texts.append(row['text'])
+            labels.append(intent_to_id[row['intent']])
+            weights.append(1.0)
+    return texts, labels, weights
+
+
+# Split data, grouped by normalized text so no utterance lands on both sides
+def grouped_split(texts, labels, weights, test_size, seed=42):
+    groups = [normalize_text(text) for text in texts]
+    splitter = StratifiedGroupKFold(n_splits=round(1 / test_size), shuffle=True, random_state=seed)
+    train_idx, test_idx = next(splitter.split(texts, labels, groups))
+    pick = lambda values, idx: [values[i] for i in idx]
+    return (
+        pick(texts, train_idx), pick(texts, test_idx),
+        pick(labels, train_idx), pick(labels, test_idx),
+        pick(weights, train_idx), pick(weights, test_idx)
     )
-    
-    print("✅ Model and tokenizer loaded successfully")
-    
-except Exception as e:
-    print(f"❌ Error loading model: {e}")
-    raise
-
-# Tokenize datasets
-def tokenize_function(examples):
-    return tokenizer(
-        examples["text"], 
-        padding="max_length", 
-        truncation=True, 
-        max_length=128,
-        return_tensors=None
+
+
+def stage_split(args, paths):
+    df = pd.read_csv(paths.dataset)
+
+    # Preprocess data - map intents to labels
+    intents = sorted(df['intent'].unique())
+    intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
+
+    # 80% train / 20% test, then 10% of train held out for post-training calibration
+    train_texts, test_texts, train_labels, test_labels, train_weights, test_weights = grouped_split(
+        df['text'].tolist(),
+        df['intent'].map(intent_to_id).tolist(),
+        df['weight'].tolist(),
+        test_size=0.2,
+        seed=args.split_seed
+    )
+    train_texts, calibration_texts, train_labels, calibration_labels, train_weights, calibration_weights = grouped_split(
+        train_texts,
+        train_labels,
+        train_weights,
+        test_size=0.1,
+        seed=args.split_seed
+    )
+
+    selection_texts, selection_labels, selection_weights = selection_rows(
+        calibration_texts, calibration_labels, calibration_weights,
+        {normalize_text(text) for text in train_texts + test_texts}, intent_to_id, args.selection_rows, args.split_seed + 1
     )
 
-print("🔤 Tokenizing datasets...")
+    os.makedirs(paths.split, exist_ok=True)
+    for name, texts, labels, weights in (
+        ('train', train_texts, train_labels, train_weights),
+        ('calibration', calibration_texts, calibration_labels, calibration_weights),
+        ('test', test_texts, test_labels, test_weights),
+        ('selection', selection_texts, selection_labels, selection_weights),
+    ):
+        pd.DataFrame({'text': texts, 'label': labels, 'weight': weights}).to_json(
+            paths.split / f'{name}.jsonl', orient='records', lines=True
+        )
+    with open(paths.intents, 'w') as f:
+        json.dump(intents, f, indent=2)
+
+    print(f"📚 Training samples: {len(train_texts)}, Calibration samples: {len(calibration_texts)}, Test samples: {len(test_texts)}")
+    print(f"📚 Selection samples: {len(selection_texts)} (calibration + {len(selection_texts) - len(calibration_texts)} generated)")
+
+
+def load_split(paths):
+    with open(paths.intents) as f:
+        intents = json.load(f)
+    frames = {
+        name: pd.read_json(paths.split / f'{name}.jsonl', lines=True)
+        for name in ('train', 'calibration', 'test', 'selection')
+    }
+    return frames, intents
+
+
+# ---------------------------------------------------------------- tokenize
+
+def tokenize_splits(args, paths, tokenizer):
+    # Tokenized splits live in the content-hashed dataset cache rather than the work dir
+    dataset_cache = DatasetCache(args.cache_dir, max_bytes=args.cache_max_bytes)
+    cache_key = dataset_cache.make_key(str(paths.split), tokenizer, args.max_length, args.split_seed)
+    cached = dataset_cache.load(cache_key) if args.use_dataset_cache else None
+    if cached is not None:
+        return cached[0], cache_key
 
-train_dataset = Dataset.from_dict({
-    "text": train_texts, 
-    "label": train_labels
-})
-test_dataset = Dataset.from_dict({
-    "text": test_texts, 
-    "label": test_labels
-})
+    # Tokenize datasets (no padding here - the collator pads each batch to its longest member)
+    def tokenize_function(examples):
+        encodings = tokenizer(
+            examples["text"],
+            truncation=True,
+            max_length=args.max_length,
+            return_tensors=None
+        )
+        encodings["length"] = [len(ids) for ids in encodings["input_ids"]]
+        return encodings
+
+    print("🔤 Tokenizing datasets...")
+    frames, intents = load_split(paths)
+    splits = DatasetDict({
+        name: Dataset.from_dict({
+            "text": frame['text'].tolist(),
+            "label": frame['label'].tolist(),
+            "weight": frame['weight'].tolist()
+        })
+        for name, frame in frames.items()
+    })
+    with profiling.span('Dataset.map tokenization'):
+        splits = splits.map(tokenize_function, batched=True)
 
-train_dataset = train_dataset.map(tokenize_function, batched=True)
-test_dataset = test_dataset.map(tokenize_function, batched=True)
+    if args.use_dataset_cache:
+        dataset_cache.save(cache_key, splits, {'intents': intents, 'data_path': args.data})
+    print("✅ Datasets tokenized")
+    return splits, cache_key
 
-# Set format for PyTorch
-train_dataset.set_format(type='torch', columns=['input_ids', 'attention_mask', 'label'])
-test_dataset.set_format(type='torch', columns=['input_ids', 'attention_mask', 'label'])
 
-print("✅ Datasets tokenized and formatted")
+# ---------------------------------------------------------------- train
 
 # Evaluation metrics
 def compute_metrics(p):
     predictions, labels = p
     predictions = np.argmax(predictions, axis=1)
-    
+
     precision, recall, f1, _ = precision_recall_fscore_support(
         labels, predictions, average='weighted', zero_division=0
     )
     acc = accuracy_score(labels, predictions)
-    
+
     return {
         'accuracy': acc,
         'f1': f1,
@@ -151,264 +430,823 @@ def compute_metrics(p):
         'recall': recall
     }
 
-# Training configuration
-training_args = TrainingArguments(
-    output_dir='./training_results',
-    num_train_epochs=4,
-    per_device_train_batch_size=16,
-    per_device_eval_batch_size=16,
-    learning_rate=2e-5,
-    warmup_steps=500,
-    weight_decay=0.01,
-    logging_dir='./logs',
-    logging_steps=20,
-    eval_strategy="epoch",
-    save_strategy="epoch",
-    load_best_model_at_end=True,
-    metric_for_best_model="f1",
-    greater_is_better=True,
-    save_total_limit=2,
-    report_to="none",
-    dataloader_pin_memory=False,
-)
 
-# Initialize trainer
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=test_dataset,
-    compute_metrics=compute_metrics,
-    tokenizer=tokenizer,
-)
+# Weighted loss - each unique utterance stands in for the copies the old dataset repeated
+class WeightedLossTrainer(Trainer):
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        weights = inputs.pop("weight", None)
+        inputs.pop("length", None)
+        outputs = model(**inputs)
+        if weights is None:
+            loss = outputs.loss
+        else:
+            per_example = F.cross_entropy(outputs.logits, inputs["labels"], reduction="none")
+            loss = (per_example * weights).sum() / weights.sum()
+        return (loss, outputs) if return_outputs else loss
+
+    def _get_train_sampler(self, train_dataset=None):
+        # Augmented datasets group by base phrase length; otherwise the sampler would draw every variant to measure it
+        dataset = train_dataset if train_dataset is not None else self.train_dataset
+        if self.args.group_by_length and isinstance(dataset, AugmentedDataset):
+            return LengthGroupedSampler(
+                self.args.train_batch_size * self.args.gradient_accumulation_steps, lengths=dataset.lengths
+            )
+        return super()._get_train_sampler(train_dataset)
+
+
+# Padding report - padded token counts and measured wall-clock per epoch
+def batch_order(lengths, batch_size, grouped, seed=42):
+    generator = torch.Generator().manual_seed(seed)
+    if grouped:
+        return list(LengthGroupedSampler(batch_size, lengths=lengths, generator=generator))
+    return torch.randperm(len(lengths), generator=generator).tolist()
+
+
+def count_padded_tokens(lengths, order, batch_size, fixed_length=None):
+    total = 0
+    for start in range(0, len(order), batch_size):
+        batch = [lengths[i] for i in order[start:start + batch_size]]
+        total += (fixed_length or max(batch)) * len(batch)
+    return total
+
 
-print("✅ Training configuration set up")
-
-# Train model
-print("🎯 Starting training...")
-try:
-    training_results = trainer.train()
-    print("✅ Training completed successfully")
-    
-    # Get final metrics
-    final_metrics = trainer.evaluate()
-    print("\n📊 Final Evaluation Results:")
-    for key, value in final_metrics.items():
-        print(f"   {key}: {value:.4f}")
-        
-except Exception as e:
-    print(f"❌ Training failed: {e}")
-    raise
-
-# Generate predictions for detailed analysis
-print("📈 Generating evaluation visualizations...")
-
-predictions = trainer.predict(test_dataset)
-y_pred = np.argmax(predictions.predictions, axis=1)
-y_true = predictions.label_ids
-
-# Classification Report
-print("\n📋 Classification Report:")
-class_report = classification_report(y_true, y_pred, target_names=intents)
-print(class_report)
-
-# Save classification report
-with open('classification_report.txt', 'w') as f:
-    f.write(class_report)
-
-# Confusion Matrix
-plt.figure(figsize=(12, 10))
-cm = confusion_matrix(y_true, y_pred)
-sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
-            xticklabels=intents, 
-            yticklabels=intents)
-plt.title('Confusion Matrix')
-plt.xlabel('Predicted')
-plt.ylabel('Actual')
-plt.xticks(rotation=45)
-plt.yticks(rotation=0)
-plt.tight_layout()
-plt.savefig('confusion_matrix.png', dpi=300, bbox_inches='tight')
-plt.show()
-
-print("✅ Evaluation visualizations generated")
-
-# Save model with proper configuration
-print("\n💾 Saving model and artifacts...")
-try:
-    # Save to Google Drive
-    trainer.save_model(drive_model_path)
-    tokenizer.save_pretrained(drive_model_path)
-    
-    # Also save locally
-    trainer.save_model(local_model_path)
-    tokenizer.save_pretrained(local_model_path)
-    
+def time_epoch(model, features, order, collator, batch_size, device):
+    # Forward + backward over one epoch without an optimizer step, so weights are untouched
+    model.train()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start_time = time.perf_counter()
+    for start in range(0, len(order), batch_size):
+        batch = collator([features[i] for i in order[start:start + batch_size]])
+        batch = {key: value.to(device) for key, value in batch.items()}
+        model(**batch).loss.backward()
+        model.zero_grad(set_to_none=True)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    model.eval()
+    return time.perf_counter() - start_time
+
+
+def padding_report(args, trainer, train_dataset, tokenizer, data_collator, training_results):
+    print("\n📏 Measuring padding overhead...")
+    training_args = trainer.args
+    batch_size = training_args.per_device_train_batch_size
+    train_lengths = train_dataset["length"]
+    train_features = [
+        {"input_ids": ids, "attention_mask": mask, "label": label}
+        for ids, mask, label in zip(
+            train_dataset["input_ids"], train_dataset["attention_mask"], train_dataset["label"]
+        )
+    ]
+    fixed_collator = DataCollatorWithPadding(tokenizer=tokenizer, padding="max_length", max_length=args.max_length)
+    random_order = batch_order(train_lengths, batch_size, grouped=False)
+    grouped_order = batch_order(train_lengths, batch_size, grouped=True)
+
+    padding_rows = [
+        ("fixed max_length", count_padded_tokens(train_lengths, random_order, batch_size, args.max_length),
+         time_epoch(trainer.model, train_features, random_order, fixed_collator, batch_size, training_args.device)),
+        ("dynamic", count_padded_tokens(train_lengths, random_order, batch_size),
+         time_epoch(trainer.model, train_features, random_order, data_collator, batch_size, training_args.device)),
+        ("dynamic + length buckets", count_padded_tokens(train_lengths, grouped_order, batch_size),
+         time_epoch(trainer.model, train_features, grouped_order, data_collator, batch_size, training_args.device)),
+    ]
+    real_tokens = sum(train_lengths)
+    baseline_tokens, baseline_seconds = padding_rows[0][1], padding_rows[0][2]
+
+    report = "Padding Report (train split, forward + backward per epoch)\n"
+    report += "=" * 78 + "\n"
+    report += f"Examples: {len(train_lengths)}, batch size: {batch_size}, real tokens: {real_tokens}\n\n"
+    report += f"{'strategy':<26}{'tokens':>10}{'padding':>10}{'vs fixed':>10}{'sec/epoch':>11}{'speedup':>10}\n"
+    for name, tokens, seconds in padding_rows:
+        report += (
+            f"{name:<26}{tokens:>10}{1 - real_tokens / tokens:>10.1%}{tokens / baseline_tokens:>10.1%}"
+            f"{seconds:>11.2f}{baseline_seconds / seconds:>9.2f}x\n"
+        )
+    epochs_run = training_results.metrics.get("epoch", training_args.num_train_epochs)
+    report += (
+        f"\nMeasured training wall-clock: {training_results.metrics['train_runtime'] / epochs_run:.2f} sec/epoch "
+        f"(group_by_length={args.group_by_length})\n"
+    )
+    print(report)
+    return report
+
+
+def write_model_config(model_dir, intents, base_model, **extra):
     # Save label mappings and configuration
     model_config = {
-        'intent_to_id': intent_to_id,
-        'id_to_intent': id_to_intent,
+        'intent_to_id': {intent: idx for idx, intent in enumerate(intents)},
+        'id_to_intent': {idx: intent for idx, intent in enumerate(intents)},
         'intents': intents,
-        'model_name': model_name,
-        'num_classes': len(intents)
+        'model_name': base_model,
+        'num_classes': len(intents),
+        **extra
     }
-    
-    with open(f'{drive_model_path}/model_config.json', 'w') as f:
+    with open(os.path.join(model_dir, 'model_config.json'), 'w') as f:
         json.dump(model_config, f, indent=2)
-        
-    with open(f'{local_model_path}/model_config.json', 'w') as f:
+    return model_config
+
+
+def stage_train(args, paths, tokenizer, splits, intents):
+    intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
+    id_to_intent = {idx: intent for intent, idx in intent_to_id.items()}
+    train_dataset = splits["train"].remove_columns(["text"])
+    test_dataset = splits["test"].remove_columns(["text"])
+    data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
+    augmented_dataset = None
+    if args.augment:
+        # Variants are drawn and tokenized in the DataLoader workers, one per unique phrase per epoch
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        augmented_dataset = AugmentedDataset(
+            splits["train"], tokenizer, max_length=args.max_length, seed=args.split_seed, keep_original=args.augment_keep
+        )
+
+    # Load DistilBERT model
+    print(f"🔧 Loading model: {args.base_model}")
+    try:
+        # Create model configuration
+        config = DistilBertConfig.from_pretrained(
+            args.base_model,
+            num_labels=len(intents),
+            id2label=id_to_intent,
+            label2id=intent_to_id,
+            problem_type="single_label_classification"
+        )
+
+        model = AutoModelForSequenceClassification.from_pretrained(
+            args.base_model,
+            config=config,
+            ignore_mismatched_sizes=False
+        )
+
+        print("✅ Model loaded successfully")
+
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        raise
+
+    # Training configuration
+    training_args = TrainingArguments(
+        output_dir=str(paths.training_results),
+        num_train_epochs=args.epochs,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        group_by_length=args.group_by_length,
+        length_column_name="length",
+        learning_rate=args.learning_rate,
+        warmup_steps=args.warmup_steps or 0,
+        warmup_ratio=args.warmup_ratio if args.warmup_steps is None else 0.0,
+        weight_decay=args.weight_decay,
+        logging_dir=str(paths.logs),
+        logging_steps=20,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        metric_for_best_model="f1",
+        greater_is_better=True,
+        save_total_limit=2,
+        report_to="none",
+        remove_unused_columns=False,
+        dataloader_pin_memory=False,
+        dataloader_num_workers=args.augment_workers if args.augment else 0,
+        # Workers (and their variant tokenization caches) live for the whole run; the epoch is shared memory
+        dataloader_persistent_workers=args.augment and args.augment_workers > 0,
+    )
+
+    callbacks = []
+    if augmented_dataset is not None:
+        callbacks.append(epoch_callback(augmented_dataset))
+    if profiling.active():
+        callbacks.append(profiling.StepProfilerCallback(
+            profiling.active(), args.profile_every, args.profile_torch_steps, str(paths.profile / 'torch_trace.json')
+        ))
+
+    # Initialize trainer
+    trainer = WeightedLossTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=augmented_dataset if augmented_dataset is not None else train_dataset,
+        eval_dataset=test_dataset,
+        compute_metrics=compute_metrics,
+        tokenizer=tokenizer,
+        data_collator=data_collator,
+        callbacks=callbacks,
+    )
+
+    # Train model
+    print("🎯 Starting training...")
+    try:
+        with profiling.span('trainer.train'):
+            training_results = trainer.train()
+        print("✅ Training completed successfully")
+
+        # Get final metrics
+        with profiling.span('trainer.evaluate'):
+            final_metrics = trainer.evaluate()
+        print("\n📊 Final Evaluation Results:")
+        for key, value in final_metrics.items():
+            print(f"   {key}: {value:.4f}")
+
+    except Exception as e:
+        print(f"❌ Training failed: {e}")
+        raise
+
+    os.makedirs(paths.reports, exist_ok=True)
+    if augmented_dataset is not None:
+        augmentation_report = format_augmentation_report(
+            augmented_dataset, args.epochs, int(sum(splits["train"]["weight"]))
+        )
+        print("\n" + augmentation_report)
+        with open(paths.augmentation_report, 'w') as f:
+            f.write(augmentation_report)
+    elif paths.augmentation_report.exists():
+        paths.augmentation_report.unlink()
+    if args.padding_report:
+        with profiling.span('padding report'), open(paths.padding_report, 'w') as f:
+            f.write(padding_report(args, trainer, train_dataset, tokenizer, data_collator, training_results))
+
+    trainer.save_model(str(paths.trained_model))
+    tokenizer.save_pretrained(str(paths.trained_model))
+    write_model_config(
+        paths.trained_model, intents, args.base_model,
+        training_samples=len(train_dataset),
+        test_results=final_metrics
+    )
+    shutil.rmtree(paths.training_results, ignore_errors=True)
+
+
+# ---------------------------------------------------------------- evaluate
+
+def stage_evaluate(args, paths, splits, intents):
+    # Scores the model that ships: after layer dropping, calibration and vocabulary pruning
+    print("📈 Generating evaluation visualizations...")
+    classifier = IntentClassifier(str(paths.serving_model), max_length=args.max_length)
+    with profiling.span('predict test split'):
+        logits = classifier.predict_logits(splits["test"]["text"]).numpy()
+    metrics = StreamingMetrics(intents)
+    metrics.update(logits, splits["test"]["label"])
+
+    # Classification Report
+    print("\n📋 Classification Report:")
+    class_report = metrics.classification_report()
+    print(class_report)
+
+    os.makedirs(paths.reports, exist_ok=True)
+    with open(paths.classification_report, 'w') as f:
+        f.write(class_report)
+    with open(paths.eval_metrics, 'w') as f:
+        json.dump(metrics.metrics(), f, indent=2)
+
+    # Confusion Matrix
+    with profiling.span('confusion matrix render'):
+        save_confusion_matrix(metrics.confusion, intents, paths.confusion_matrix)
+
+    print("✅ Evaluation visualizations generated")
+
+    # Accuracy under one augmentation transform at a time: typos, case, punctuation, synonyms, slot values
+    with profiling.span('robustness'):
+        robustness = robustness_accuracy(classifier, splits["test"]["text"], splits["test"]["label"])
+    robustness_report = format_robustness_report(robustness)
+    print("\n" + robustness_report)
+    with open(paths.robustness_report, 'w') as f:
+        f.write(robustness_report)
+
+    if args.eval_data:
+        # Large labelled corpora stream through in chunks; reports go next to the test-split ones
+        print(f"\n🔍 Streaming evaluation over {args.eval_data}...")
+        with profiling.span('stream evaluation'):
+            stream_metrics, stream_info = stream_evaluate(
+                classifier, args.eval_data, label_column=args.eval_label_column, chunksize=args.eval_chunk_size
+            )
+        print(write_reports(stream_metrics, stream_info, paths.reports, prefix='stream_'))
+
+
+# ---------------------------------------------------------------- layer_drop
+
+def stage_layer_drop(args, paths, tokenizer, splits):
+    # Candidates are compared on the selection split so the test split stays untouched
+    print("\n✂️  Sweeping transformer layer removal...")
+    try:
+        shutil.rmtree(paths.layer_drop, ignore_errors=True)
+        candidates_dir = paths.layer_drop / 'candidates'
+        rows = layer_drop_sweep(
+            str(paths.trained_model), tokenizer,
+            splits["train"].remove_columns(["text"]), DataCollatorWithPadding(tokenizer=tokenizer),
+            splits["selection"]["text"], splits["selection"]["label"], str(candidates_dir),
+            num_train_epochs=args.layer_drop_epochs, learning_rate=args.learning_rate,
+            batch_size=args.batch_size, trainer_class=WeightedLossTrainer,
+            # Early exit needs a layer before the last one to exit from
+            min_layers=2 if args.early_exit else 1
+        )
+        accuracy_floor = args.accuracy_floor if args.accuracy_floor is not None else rows[0]['accuracy'] - 0.01
+        chosen = choose_configuration(rows, accuracy_floor)
+        shutil.copytree(chosen['path'], paths.fine_tuned_model)
+        shutil.rmtree(candidates_dir, ignore_errors=True)
+
+        layer_drop_report = format_layer_sweep(rows, chosen, accuracy_floor)
+        print(layer_drop_report)
+
+        os.makedirs(paths.reports, exist_ok=True)
+        with open(paths.layer_drop_report, 'w') as f:
+            f.write(layer_drop_report)
+        print(f"✅ Continuing with '{chosen['name']}' ({len(chosen['layers'])} layers)")
+
+    except Exception as e:
+        print(f"❌ Layer dropping failed: {e}")
+        raise
+
+
+# ---------------------------------------------------------------- calibrate
+
+def stage_calibrate(args, paths, splits):
+    # Temperature scaling - fit T on the held-out calibration split and fold it into the classifier
+    classifier = IntentClassifier(str(paths.fine_tuned_model), device='cpu', max_length=args.max_length)
+    temperature = 1.0
+
+    if args.calibrate:
+        print("\n🌡️  Calibrating confidence scores...")
+        try:
+            calibration_labels = splits["calibration"]["label"]
+            test_labels = splits["test"]["label"]
+            calibration_logits = classifier.predict_logits(splits["calibration"]["text"])
+            test_logits = classifier.predict_logits(splits["test"]["text"])
+            temperature = fit_temperature(calibration_logits, calibration_labels)
+
+            calibration_report = format_calibration_report(temperature, {
+                'calibration': (
+                    calibration_metrics(calibration_logits, calibration_labels),
+                    calibration_metrics(calibration_logits, calibration_labels, temperature)
+                ),
+                'test': (
+                    calibration_metrics(test_logits, test_labels),
+                    calibration_metrics(test_logits, test_labels, temperature)
+                ),
+            })
+            print(calibration_report)
+
+            os.makedirs(paths.reports, exist_ok=True)
+            with open(paths.calibration_report, 'w') as f:
+                f.write(calibration_report)
+
+            fold_temperature(classifier.model, temperature)
+            print(f"✅ Temperature {temperature:.4f} folded into the classifier layer")
+
+        except Exception as e:
+            print(f"❌ Calibration failed: {e}")
+            raise
+
+    # Save model with proper configuration
+    print("\n💾 Saving calibrated model...")
+    shutil.rmtree(paths.model, ignore_errors=True)
+    classifier.model.save_pretrained(str(paths.model))
+    classifier.tokenizer.save_pretrained(str(paths.model))
+
+    model_config = dict(classifier.model_config)
+    model_config.update(temperature=temperature, temperature_folded=True, model_format='safetensors')
+    with open(paths.model / 'model_config.json', 'w') as f:
         json.dump(model_config, f, indent=2)
-    
-    print("✅ Model saved successfully to both Google Drive and local directory")
-    
-except Exception as e:
-    print(f"❌ Error saving model: {e}")
-    raise
 
-# Enhanced testing with examples
-test_examples = [
-    "Show me all restaurants",
-    "I want to order pizza",
-    "What's in my cart?",
-    "Add burger to cart",
-    "Update order status",
-    "Find Italian food",
-    "Show my past orders",
-    "Where is my order?",
-    "Go to home page",
-    "Delete restaurant Pizza Palace"
-]
 
-print("\n🧪 Testing with sample phrases:")
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"   Using device: {device}")
-
-# Load the saved model for testing
-try:
-    test_model = AutoModelForSequenceClassification.from_pretrained(local_model_path)
-    test_tokenizer = AutoTokenizer.from_pretrained(local_model_path)
-    test_model.to(device)
-    test_model.eval()
-    print("✅ Test model loaded successfully")
-    
-except Exception as e:
-    print(f"❌ Error loading test model: {e}")
-    test_model = model
-    test_tokenizer = tokenizer
-    test_model.to(device)
-    test_model.eval()
-
-print("\n📝 Prediction Results:")
-print("-" * 60)
-
-test_results = []
-for phrase in test_examples:
+# ---------------------------------------------------------------- prune_vocab
+
+def stage_prune_vocab(args, paths):
+    # Keep the tokens the training corpus produces plus the reserve; outputs must match exactly
+    print("\n✂️  Pruning vocabulary...")
     try:
-        inputs = test_tokenizer(
-            phrase, 
-            return_tensors="pt", 
-            padding=True, 
-            truncation=True, 
-            max_length=128
+        reserve = list(DEFAULT_RESERVE)
+        if args.reserve_file:
+            with open(args.reserve_file) as f:
+                reserve += [line.strip() for line in f if line.strip()]
+
+        shutil.rmtree(paths.pruned_model, ignore_errors=True)
+        report = prune_and_verify(
+            str(paths.model), str(paths.pruned_model), pd.read_csv(paths.dataset)['text'].tolist(), reserve
         )
-        inputs = {key: value.to(device) for key, value in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = test_model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            
-        predicted_class_id = predictions.argmax().item()
-        predicted_intent = id_to_intent[predicted_class_id]
-        confidence = predictions.max().item()
-        
-        result = f"Text: '{phrase}' -> Intent: {predicted_intent} (Confidence: {confidence:.4f})"
-        print(result)
-        test_results.append(result)
-        
+        pruning_report = format_pruning_report(report)
+        print(pruning_report)
+
+        os.makedirs(paths.reports, exist_ok=True)
+        with open(paths.vocab_pruning_report, 'w') as f:
+            f.write(pruning_report)
+        print("✅ Vocabulary pruned and verified")
+
+    except Exception as e:
+        print(f"❌ Vocabulary pruning failed: {e}")
+        raise
+
+
+# ---------------------------------------------------------------- export
+
+def stage_export(args, paths, splits):
+    # Export ONNX (fp32 + dynamic INT8) for @xenova/transformers and verify it against PyTorch
+    print("\n📤 Exporting ONNX models...")
+    try:
+        shutil.rmtree(paths.onnx, ignore_errors=True)
+        export_and_verify(str(paths.serving_model), splits["test"]["text"], onnx_dir=str(paths.onnx))
+        print("✅ ONNX models exported and verified")
+
     except Exception as e:
-        error_msg = f"Error predicting for '{phrase}': {e}"
-        print(error_msg)
+        print(f"❌ Error exporting ONNX models: {e}")
+        raise
+
+
+def stage_early_exit(args, paths, splits):
+    # Early exit - per-layer heads on the frozen fine-tuned model, calibrated on the calibration split
+    print("\n🚪 Training early-exit heads...")
+    try:
+        early_exit_classifier = EarlyExitClassifier(str(paths.serving_model), device='cpu', max_length=args.max_length)
+        early_exit_classifier.train_heads(splits["train"]["text"], splits["train"]["label"])
+        early_exit_classifier.calibrate(splits["calibration"]["text"], splits["calibration"]["label"])
+
+        # The threshold is picked on the selection split; the test split only reports the result
+        selection_rows = early_exit_sweep(early_exit_classifier, splits["selection"]["text"], splits["selection"]["label"])
+        threshold = choose_threshold(selection_rows)
+        test_rows = early_exit_sweep(early_exit_classifier, splits["test"]["text"], splits["test"]["label"])
+        shutil.rmtree(paths.early_exit, ignore_errors=True)
+        os.makedirs(paths.early_exit)
+        early_exit_config = early_exit_classifier.save(threshold, output_dir=str(paths.early_exit))
+        with open(paths.early_exit / 'early_exit.json', 'w') as f:
+            json.dump(early_exit_config, f, indent=2)
+
+        test_row = next(row for row in test_rows if row['threshold'] == threshold)
+        early_exit_report = format_sweep(selection_rows, early_exit_classifier.num_layers, 'selection', threshold)
+        early_exit_report += f"\nSelected threshold: {threshold}\n\n"
+        early_exit_report += format_sweep(test_rows, early_exit_classifier.num_layers, 'test', threshold)
+        early_exit_report += (
+            f"\nTest split at threshold {threshold}: accuracy {test_row['accuracy']:.2%} "
+            f"(full depth {test_rows[0]['accuracy']:.2%}), {test_row['avg_layers']:.2f} layers on average\n"
+        )
+        print(early_exit_report)
+
+        os.makedirs(paths.reports, exist_ok=True)
+        with open(paths.early_exit_report, 'w') as f:
+            f.write(early_exit_report)
+        print("✅ Early-exit heads saved")
+
+    except Exception as e:
+        print(f"❌ Early-exit training failed: {e}")
+        raise
+
+
+def stage_distill(args, paths, tokenizer, splits):
+    # Distill the teacher into a tiny CPU student and compare the two
+    print("\n🧪 Distilling student model...")
+    try:
+        teacher = AutoModelForSequenceClassification.from_pretrained(str(paths.model))
+        shutil.rmtree(paths.student, ignore_errors=True)
+        distill_student(
+            teacher, tokenizer,
+            splits["train"].remove_columns(["text"]), splits["test"].remove_columns(["text"]),
+            DataCollatorWithPadding(tokenizer=tokenizer),
+            str(paths.model), str(paths.student), str(paths.distill), compute_metrics=compute_metrics
+        )
+        temperature = 1.0
+        if args.calibrate:
+            # The student gets its own temperature, fitted on the calibration split like the teacher's
+            student_classifier = IntentClassifier(str(paths.student), device='cpu', max_length=args.max_length)
+            temperature = fit_temperature(
+                student_classifier.predict_logits(splits["calibration"]["text"]), splits["calibration"]["label"]
+            )
+            fold_temperature(student_classifier.model, temperature)
+            student_classifier.model.save_pretrained(str(paths.student))
+            print(f"🌡️  Student temperature {temperature:.4f} folded into the classifier layer")
+        with open(paths.student / 'model_config.json') as f:
+            student_config = json.load(f)
+        student_config.update(temperature=temperature, temperature_folded=True)
+        with open(paths.student / 'model_config.json', 'w') as f:
+            json.dump(student_config, f, indent=2)
+        if args.export_onnx:
+            export_and_verify(str(paths.student), splits["test"]["text"])
+
+        distillation_report = format_comparison(compare_models(
+            {'teacher': str(paths.model), 'student': str(paths.student)},
+            splits["test"]["text"], splits["test"]["label"]
+        ))
+        print(distillation_report)
+
+        os.makedirs(paths.reports, exist_ok=True)
+        with open(paths.distillation_report, 'w') as f:
+            f.write(distillation_report)
+        print("✅ Student model distilled and compared")
+
+    except Exception as e:
+        print(f"❌ Distillation failed: {e}")
+        raise
+
+
+# ---------------------------------------------------------------- joint
+
+def stage_joint(args, paths, splits, intents):
+    # Intent + slot heads on one encoder, started from the calibrated intent model
+    print("\n🏷️  Training joint intent + slot model...")
+    try:
+        # Calibration and test phrases (and any case/punctuation variant of them) stay out of training
+        held_out = {normalize_text(text) for name in ('calibration', 'test') for text in splits[name]["text"]}
+        train_rows = plain_rows(splits["train"]["text"], [intents[label] for label in splits["train"]["label"]])
+        train_rows += slot_rows(args.joint_rows, args.split_seed, intents, exclude=held_out)
+        shutil.rmtree(paths.joint, ignore_errors=True)
+        train_joint_model(
+            str(paths.model), str(paths.joint), train_rows,
+            num_train_epochs=args.joint_epochs, learning_rate=args.learning_rate,
+            batch_size=args.batch_size, max_length=args.max_length
+        )
+
+        joint_classifier = JointClassifier(str(paths.joint), device='cpu', max_length=args.max_length)
+        temperature = 1.0
+        if args.calibrate:
+            # Fine-tuning undid the intent model's folded temperature: refit it on the calibration split
+            temperature = fit_temperature(
+                joint_classifier.predict_logits(splits["calibration"]["text"]), splits["calibration"]["label"]
+            )
+            fold_temperature(joint_classifier.model, temperature)
+            joint_classifier.model.save_pretrained(str(paths.joint))
+            print(f"🌡️  Joint model temperature {temperature:.4f} folded into the intent head")
+        joint_classifier.model_config.update(temperature=temperature, temperature_folded=True)
+        with open(paths.joint / 'model_config.json', 'w') as f:
+            json.dump(joint_classifier.model_config, f, indent=2)
+
+        # Held-out templated rows come from a different seed than the training ones, minus any row trained on
+        trained = {normalize_text(row['text']) for row in train_rows}
+        test_texts = splits["test"]["text"]
+        metrics = {
+            'test split': evaluate_joint(
+                joint_classifier, plain_rows(test_texts, [intents[label] for label in splits["test"]["label"]])
+            ),
+            'templated': evaluate_joint(
+                joint_classifier, slot_rows(max(args.joint_rows // 5, 100), args.split_seed + 1, intents, exclude=trained)
+            ),
+        }
+        joint_report = format_joint_report(metrics, joint_classifier.predict_batch(JOINT_EXAMPLES))
+        print(joint_report)
+
+        os.makedirs(paths.reports, exist_ok=True)
+        with open(paths.joint_report, 'w') as f:
+            f.write(joint_report)
+        print("✅ Joint intent + slot model trained")
+
+    except Exception as e:
+        print(f"❌ Joint model training failed: {e}")
+        raise
+
+
+# ---------------------------------------------------------------- package
+
+def stage_package(args, paths):
+    print("\n📦 Packaging model...")
+    output = paths.output
+    os.makedirs(output, exist_ok=True)
+    for stale in ('onnx', HEADS_FILENAME):
+        stale_path = output / stale
+        if stale_path.is_dir():
+            shutil.rmtree(stale_path)
+        elif stale_path.exists():
+            stale_path.unlink()
+
+    # Assemble weights, tokenizer, ONNX and exit heads; model_config.json collects every stage's metadata
+    shutil.copytree(paths.serving_model, output, dirs_exist_ok=True)
+    with open(paths.serving_model / 'model_config.json') as f:
+        model_config = json.load(f)
+
+    if args.export_onnx and paths.onnx.exists():
+        shutil.copytree(paths.onnx, output / 'onnx')
+        with open(paths.onnx / 'export_report.json') as f:
+            model_config['onnx_export'] = json.load(f)
+    if args.early_exit and paths.early_exit.exists():
+        shutil.copy(paths.early_exit / HEADS_FILENAME, output / HEADS_FILENAME)
+        with open(paths.early_exit / 'early_exit.json') as f:
+            model_config['early_exit'] = json.load(f)
+
+    with open(output / 'model_config.json', 'w') as f:
+        json.dump(model_config, f, indent=2)
+
+    # Sizes and hashes of every packaged file, plus intents and test-split metrics, for load-time checks
+    metrics = {}
+    if paths.eval_metrics.exists():
+        with open(paths.eval_metrics) as f:
+            metrics['test'] = json.load(f)
+    if 'temperature' in model_config:
+        metrics['temperature'] = model_config['temperature']
+    manifest = write_manifest(output, metrics)
+    print(f"✅ Manifest written: {len(manifest['files'])} files, {manifest['total_bytes'] / 1e6:.1f} MB")
+
+    if args.distill and paths.student.exists():
+        shutil.rmtree(paths.student_output, ignore_errors=True)
+        shutil.copytree(paths.student, paths.student_output)
+    if args.joint and paths.joint.exists():
+        shutil.rmtree(paths.joint_output, ignore_errors=True)
+        shutil.copytree(paths.joint, paths.joint_output)
+
+    print("\n🧪 Testing with sample phrases:")
+
+    # Load the packaged model once, the way serving does, and classify all phrases in a single batch
+    test_results = []
+    try:
+        test_classifier = load_classifier(str(output), max_length=args.max_length)
+        print(f"✅ Test model loaded successfully (device: {test_classifier.device})")
+
+        print("\n📝 Prediction Results:")
+        print("-" * 60)
+
+        for prediction in test_classifier.predict_batch(TEST_EXAMPLES):
+            result = (
+                f"Text: '{prediction['text']}' -> Intent: {prediction['intent']} "
+                f"(Confidence: {prediction['confidence']:.4f})"
+            )
+            print(result)
+            test_results.append(result)
+
+    except Exception as e:
+        error_msg = f"Error predicting test phrases: {e}"
+        print(f"❌ {error_msg}")
         test_results.append(error_msg)
 
-# Save test results
-with open('test_results.txt', 'w') as f:
-    f.write("Model Test Results:\n")
-    f.write("=" * 50 + "\n")
-    for result in test_results:
-        f.write(result + "\n")
+    # Save test results
+    with open(paths.test_results, 'w') as f:
+        f.write("Model Test Results:\n")
+        f.write("=" * 50 + "\n")
+        for result in test_results:
+            f.write(result + "\n")
 
-print("✅ Test results saved")
+    print("✅ Test results saved")
 
-# Create comprehensive zip file
-print("\n📦 Creating comprehensive zip file...")
-zip_filename = 'chatbot_model_complete.zip'
+    # Create comprehensive zip file
+    print("\n📦 Creating comprehensive zip file...")
+    try:
+        with profiling.span('zip'), zipfile.ZipFile(paths.zip, 'w') as zipf:
+            # Add evaluation files
+            for report in sorted(paths.reports.iterdir()) + [paths.test_results]:
+                zipf.write(report, report.name)
 
-files_to_include = [
-    'classification_report.txt',
-    'confusion_matrix.png', 
-    'test_results.txt'
-]
+            # Add model files from the packaged model directory
+            for root, dirs, files in os.walk(output):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, os.path.join(output.name, os.path.relpath(file_path, output)))
+
+        print(f"✅ Zip file created: {paths.zip}")
 
-try:
-    with zipfile.ZipFile(zip_filename, 'w') as zipf:
-        # Add evaluation files
-        for file in files_to_include:
-            if os.path.exists(file):
-                zipf.write(file)
-        
-        # Add model files from local model directory
-        for root, dirs, files in os.walk(local_model_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, '.'))
-    
-    print(f"✅ Zip file created: {zip_filename}")
-    
-    # Copy to Google Drive
-    drive_zip_path = f'/content/drive/MyDrive/{zip_filename}'
-    if os.path.exists(drive_zip_path):
-        os.remove(drive_zip_path)
-    
-    shutil.copy(zip_filename, drive_zip_path)
-    print(f"✅ Zip file copied to Google Drive: {drive_zip_path}")
-    
-except Exception as e:
-    print(f"❌ Error creating zip file: {e}")
-
-# Display file structure
-print("\n📁 Model file structure:")
-model_files = []
-try:
-    for root, dirs, files in os.walk(local_model_path):
-        for file in files:
-            relative_path = os.path.relpath(os.path.join(root, file), local_model_path)
-            model_files.append(relative_path)
-    
-    for file in sorted(model_files):
+        if args.copy_to:
+            os.makedirs(args.copy_to, exist_ok=True)
+            shutil.copytree(output, os.path.join(args.copy_to, output.name), dirs_exist_ok=True)
+            shutil.copy(paths.zip, args.copy_to)
+            verify_manifest(os.path.join(args.copy_to, output.name))
+            print(f"✅ Model and zip copied to {args.copy_to} (manifest verified)")
+
+    except Exception as e:
+        print(f"❌ Error creating zip file: {e}")
+        raise
+
+    # Display file structure
+    print("\n📁 Model file structure:")
+    model_files = sorted(
+        os.path.relpath(os.path.join(root, file), output)
+        for root, dirs, files in os.walk(output)
+        for file in files
+    )
+    for file in model_files:
         print(f"   📄 {file}")
-        
     print(f"\n   Total model files: {len(model_files)}")
-    
-except Exception as e:
-    print(f"   Could not list model files: {e}")
-
-# Final summary
-print("\n" + "="*60)
-print("🎉 CHATBOT MODEL TRAINING COMPLETE! 🎉")
-print("="*60)
-print(f"📁 Model saved to:")
-print(f"   Google Drive: {drive_model_path}")
-print(f"   Local: {local_model_path}")
-print(f"   Zip Backup: /content/drive/MyDrive/{zip_filename}")
-
-print("\n📋 Model Artifacts:")
-print("✅ chatbot_model/ - Complete model directory")
-print("✅ model_config.json - Model configuration")
-print("✅ pytorch_model.bin - Model weights")
-print("✅ tokenizer files - Tokenizer configuration")
-print("✅ classification_report.txt - Detailed metrics")
-print("✅ confusion_matrix.png - Confusion matrix visualization")
-print("✅ test_results.txt - Test examples with predictions")
-print(f"✅ {zip_filename} - Complete package")
-
-print("\n✨ Training script finished successfully!")
\ No newline at end of file
+
+
+# ---------------------------------------------------------------- pipeline
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = pipeline_paths(args)
+    if not args.profile:
+        run_pipeline(args, paths)
+        return
+
+    profiler = profiling.enable()
+    os.makedirs(paths.profile, exist_ok=True)
+    try:
+        with profiler.span('pipeline', 'pipeline'):
+            run_pipeline(args, paths)
+    finally:
+        # Written on failure too: a crashed run is often the one worth profiling
+        profiler.write_trace(paths.profile / 'trace.json')
+        profile_summary = profiler.summary()
+        with open(paths.profile / 'summary.txt', 'w') as f:
+            f.write(profile_summary)
+        print("\n" + profile_summary)
+        print(f"📊 Chrome trace: {paths.profile / 'trace.json'} (open in chrome://tracing or ui.perfetto.dev)")
+
+
+def run_pipeline(args, paths):
+    os.makedirs(paths.reports, exist_ok=True)
+    runner = StageRunner(args.work_dir, force=args.force)
+
+    print("🚀 Starting Chatbot Intent Classification Model Training")
+    base_model = base_model_input(args.base_model)
+
+    if 'load' in args.stages:
+        runner.run('load', lambda: stage_load(args, paths),
+                   inputs={'data': data_input(args.data)},
+                   outputs=[paths.dataset])
+
+    if 'split' in args.stages:
+        runner.run('split', lambda: stage_split(args, paths),
+                   inputs={'dataset': paths.dataset, 'split_seed': args.split_seed, 'selection_rows': args.selection_rows},
+                   outputs=[paths.split])
+
+    # Tokenized splits are needed by most later stages; the dataset cache makes this a millisecond load
+    tokenizer = splits = tokens_key = intents = None
+    if set(args.stages) & {'tokenize', 'train', 'evaluate', 'layer_drop', 'calibrate', 'export', 'early_exit', 'distill', 'joint'}:
+        print(f"🔧 Loading tokenizer: {args.base_model}")
+        with profiling.span('tokenize', 'stage'):
+            tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+            splits, tokens_key = tokenize_splits(args, paths, tokenizer)
+        with open(paths.intents) as f:
+            intents = json.load(f)
+
+    training_params = {
+        key: getattr(args, key)
+        for key in ('epochs', 'batch_size', 'learning_rate', 'warmup_steps', 'warmup_ratio', 'weight_decay',
+                    'group_by_length', 'padding_report', 'max_length', 'augment', 'augment_keep')
+    }
+
+    if 'train' in args.stages:
+        runner.run('train', lambda: stage_train(args, paths, tokenizer, splits, intents),
+                   inputs={'tokens': tokens_key, 'base_model': base_model, 'params': training_params},
+                   outputs=[paths.trained_model])
+
+    if 'layer_drop' in args.stages and args.layer_drop:
+        layer_drop_params = {
+            key: getattr(args, key)
+            for key in ('accuracy_floor', 'layer_drop_epochs', 'learning_rate', 'batch_size', 'early_exit')
+        }
+        runner.run('layer_drop', lambda: stage_layer_drop(args, paths, tokenizer, splits),
+                   inputs={'model': paths.trained_model, 'tokens': tokens_key, 'params': layer_drop_params},
+                   outputs=[paths.fine_tuned_model, paths.layer_drop_report])
+
+    if 'calibrate' in args.stages:
+        runner.run('calibrate', lambda: stage_calibrate(args, paths, splits),
+                   inputs={'model': paths.fine_tuned_model, 'tokens': tokens_key, 'calibrate': args.calibrate},
+                   outputs=[paths.model])
+
+    if 'prune_vocab' in args.stages and args.prune_vocab:
+        runner.run('prune_vocab', lambda: stage_prune_vocab(args, paths),
+                   inputs={
+                       'model': paths.model,
+                       'dataset': paths.dataset,
+                       'reserve_file': Path(args.reserve_file) if args.reserve_file else None,
+                   },
+                   outputs=[paths.pruned_model, paths.vocab_pruning_report])
+
+    if 'evaluate' in args.stages:
+        eval_params = {'data': data_input(args.eval_data) if args.eval_data else None,
+                       'label_column': args.eval_label_column}
+        runner.run('evaluate', lambda: stage_evaluate(args, paths, splits, intents),
+                   inputs={'model': paths.serving_model, 'tokens': tokens_key, 'eval': eval_params},
+                   outputs=[paths.classification_report, paths.confusion_matrix, paths.eval_metrics,
+                            paths.robustness_report])
+
+    if 'export' in args.stages and args.export_onnx:
+        runner.run('export', lambda: stage_export(args, paths, splits),
+                   inputs={'model': paths.serving_model, 'tokens': tokens_key},
+                   outputs=[paths.onnx])
+
+    if 'early_exit' in args.stages and args.early_exit:
+        runner.run('early_exit', lambda: stage_early_exit(args, paths, splits),
+                   inputs={'model': paths.serving_model, 'tokens': tokens_key},
+                   outputs=[paths.early_exit, paths.early_exit_report])
+
+    if 'distill' in args.stages and args.distill:
+        runner.run('distill', lambda: stage_distill(args, paths, tokenizer, splits),
+                   inputs={'model': paths.model, 'tokens': tokens_key, 'export_onnx': args.export_onnx,
+                           'calibrate': args.calibrate},
+                   outputs=[paths.student, paths.distillation_report])
+
+    if 'joint' in args.stages and args.joint:
+        joint_params = {
+            key: getattr(args, key)
+            for key in ('joint_rows', 'joint_epochs', 'learning_rate', 'batch_size', 'max_length', 'split_seed', 'calibrate')
+        }
+        runner.run('joint', lambda: stage_joint(args, paths, splits, intents),
+                   inputs={'model': paths.model, 'tokens': tokens_key, 'params': joint_params},
+                   outputs=[paths.joint, paths.joint_report])
+
+    if 'package' in args.stages:
+        runner.run('package', lambda: stage_package(args, paths),
+                   inputs={
+                       'model': paths.serving_model,
+                       'onnx': paths.onnx if args.export_onnx else None,
+                       'early_exit': paths.early_exit if args.early_exit else None,
+                       'student': paths.student if args.distill else None,
+                       'joint': paths.joint if args.joint else None,
+                       'reports': paths.reports,
+                       'copy_to': args.copy_to,
+                   },
+                   outputs=[paths.output, paths.zip])
+
+    # Final summary
+    print("\n" + "="*60)
+    print("🎉 CHATBOT MODEL TRAINING COMPLETE! 🎉")
+    print("="*60)
+    print(f"📁 Model saved to: {paths.output}")
+    print(f"📦 Zip package: {paths.zip}")
+    print(f"📊 Reports: {paths.reports}")
+    print("\n✨ Training script finished successfully!")
+
+
+if __name__ == '__main__':
+    main()
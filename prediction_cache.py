@@ -0,0 +1,133 @@
+# LRU cache of intent predictions in front of IntentClassifier. Chat traffic repeats a
+# small phrase space, so utterances are normalized ("Show cart?" == "show cart") and
+# answered from memory; keys include a hash of the model artifacts, so a retrained model
+# never serves predictions cached for the old one.
+import argparse
+import copy
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from chatbot_data_generation import normalize_text
+from stage_cache import hash_file
+
+# Files whose content changes the predictions
+MODEL_FILES = ('model.safetensors', 'pytorch_model.bin', 'config.json', 'model_config.json', 'tokenizer.json', 'vocab.txt')
+
+
+def model_fingerprint(model_path):
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            digest.update(name.encode())
+            digest.update(hash_file(path).encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, classifier, max_entries=10000, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.set_model(classifier)
+
+    def set_model(self, classifier):
+        # Entries of the previous model stay unreachable and age out of the LRU
+        self.classifier = classifier
+        self.model_hash = model_fingerprint(classifier.model_path)
+
+    def _key(self, text, user_type, top_k):
+        return (self.model_hash, normalize_text(text), user_type, top_k)
+
+    def get(self, text, user_type=None, top_k=1):
+        key = self._key(text, user_type, top_k)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, result = entry
+            if self.ttl_seconds is None or time.monotonic() - stored_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Callers get their own copy: nested top_k / entities must not alias the cached entry
+                return {**copy.deepcopy(result), 'text': text}
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def put(self, text, result, user_type=None, top_k=1):
+        key = self._key(text, user_type, top_k)
+        self._entries[key] = (time.monotonic(), copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def predict_batch(self, texts, user_type=None, top_k=1):
+        texts = list(texts)
+        results = [self.get(text, user_type, top_k) for text in texts]
+
+        # One forward pass for all misses; duplicates within the batch are classified once
+        missing = {}
+        for index, result in enumerate(results):
+            if result is None:
+                missing.setdefault(normalize_text(texts[index]), []).append(index)
+        if missing:
+            first_texts = [texts[indices[0]] for indices in missing.values()]
+            predictions = self.classifier.predict_batch(first_texts, user_type=user_type, top_k=top_k)
+            for indices, prediction in zip(missing.values(), predictions):
+                self.put(texts[indices[0]], prediction, user_type, top_k)
+                for index in indices:
+                    results[index] = {**copy.deepcopy(prediction), 'text': texts[index]}
+        return results
+
+    def predict(self, text, user_type=None, top_k=1):
+        return self.predict_batch([text], user_type=user_type, top_k=top_k)[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+if __name__ == '__main__':
+    from intent_classifier import IntentClassifier, read_texts
+
+    parser = argparse.ArgumentParser(description="Replay chat traffic through the prediction cache")
+    parser.add_argument('input', help="Text file (one utterance per line) or JSONL export")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--max-entries', type=int, default=10000)
+    parser.add_argument('--ttl', type=float, default=None, help="Seconds before an entry expires")
+    parser.add_argument('--text-field', default='message')
+    args = parser.parse_args()
+
+    cache = PredictionCache(IntentClassifier(args.model_path), args.max_entries, args.ttl)
+    texts = list(read_texts(args.input, args.text_field))
+    print(f"🔤 Replaying {len(texts)} utterances one at a time...")
+
+    hit_ms, miss_ms = [], []
+    for text in texts:
+        hits_before = cache.hits
+        start_time = time.perf_counter()
+        cache.predict(text)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        (hit_ms if cache.hits > hits_before else miss_ms).append(elapsed_ms)
+
+    stats = cache.stats()
+    print(f"\n📊 Cache: {stats['hit_rate']:.1%} hit rate, {stats['entries']} entries, {stats['evictions']} evictions")
+    if hit_ms:
+        print(f"   hit  {sum(hit_ms) / len(hit_ms) * 1000:>10.1f} µs avg")
+    if miss_ms:
+        print(f"   miss {sum(miss_ms) / len(miss_ms) * 1000:>10.1f} µs avg")
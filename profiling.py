@@ -0,0 +1,264 @@
+# Opt-in instrumentation for the training pipeline: wall time, CPU time and peak RSS per
+# stage (and per named section inside a stage), plus per-window training-step breakdowns
+# from a TrainerCallback, optionally with a torch.profiler capture over a few steps.
+# Results are a Chrome-trace JSON (chrome://tracing or https://ui.perfetto.dev) and a
+# summary table. Until enable() is called, span() returns a shared no-op context and the
+# callback is never installed, so a normal run pays nothing.
+import contextlib
+import json
+import os
+import threading
+import time
+
+from transformers import TrainerCallback
+
+_NULL_SPAN = contextlib.nullcontext()
+_active = None
+
+
+def _status_kb(field):
+    # VmRSS / VmHWM from /proc; None where procfs is unavailable
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux >= 4.0)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.events = []
+        self.spans = []
+        self.step_callbacks = []
+        self._stack = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._tid = threading.get_ident()
+        # Without a resettable VmHWM, peaks are process-lifetime peaks at span end
+        self.per_span_peaks = _reset_peak_rss()
+
+    def _timestamp_us(self, seconds=None):
+        return ((seconds if seconds is not None else time.perf_counter()) - self._origin) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, category='section', **args):
+        # Parents keep the peak reached so far before the child resets the high-water mark
+        current_peak = _status_kb('VmHWM') or 0
+        for parent in self._stack:
+            parent['peak_kb'] = max(parent['peak_kb'], current_peak)
+        if self.per_span_peaks:
+            _reset_peak_rss()
+
+        frame = {'peak_kb': 0}
+        self._stack.append(frame)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        start_rss = _status_kb('VmRSS') or 0
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            self._stack.pop()
+            peak_kb = max(frame['peak_kb'], _status_kb('VmHWM') or 0)
+            for parent in self._stack:
+                parent['peak_kb'] = max(parent['peak_kb'], peak_kb)
+
+            record = {
+                'start': start_wall,
+                'name': name,
+                'category': category,
+                'depth': len(self._stack),
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'peak_rss_mb': peak_kb / 1024,
+                'rss_delta_mb': ((_status_kb('VmRSS') or 0) - start_rss) / 1024,
+                **args,
+            }
+            self.spans.append(record)
+            self.complete_event(name, category, start_wall, wall, {
+                key: value for key, value in record.items() if key not in ('start', 'name', 'category')
+            })
+
+    def complete_event(self, name, category, start, duration, args=None):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': self._timestamp_us(start), 'dur': duration * 1e6,
+            'pid': self._pid, 'tid': self._tid, 'args': args or {},
+        })
+
+    def counter(self, name, values):
+        self.events.append({
+            'name': name, 'ph': 'C', 'ts': self._timestamp_us(), 'pid': self._pid, 'args': values,
+        })
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def summary(self):
+        report = "Profile Summary\n" + "=" * 86 + "\n"
+        report += f"{'section':<44}{'wall s':>9}{'CPU s':>9}{'CPU/wall':>10}{'peak RSS MB':>14}\n"
+        # Spans close innermost first; list them in start order with indentation by depth
+        for span in sorted(self.spans, key=lambda span: span['start']):
+            label = ("  " * span['depth'] + span['name'])[:43]
+            utilisation = span['cpu_s'] / span['wall_s'] if span['wall_s'] else 0.0
+            report += (
+                f"{label:<44}{span['wall_s']:>9.2f}{span['cpu_s']:>9.2f}{utilisation:>10.2f}"
+                f"{span['peak_rss_mb']:>14.0f}\n"
+            )
+        if not self.per_span_peaks:
+            report += "\n(peak RSS is the process peak so far: /proc/self/clear_refs is not writable)\n"
+        for callback in self.step_callbacks:
+            report += "\n" + callback.summary()
+        return report
+
+
+def enable():
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def active():
+    return _active
+
+
+def span(name, category='section', **args):
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, category, **args)
+
+
+class StepProfilerCallback(TrainerCallback):
+    # Per window of every_n_steps optimizer steps: forward, backward and optimizer time, the rest
+    # (batch loading, collation, logging) between steps, CPU time and RSS. Forward is timed with model
+    # hooks; backward is the gap from the end of forward to the optimizer step, so it includes clipping.
+    # torch_steps=(start, end) additionally records torch.profiler over those steps.
+    def __init__(self, profiler, every_n_steps=50, torch_steps=None, torch_trace_path=None):
+        self.profiler = profiler
+        profiler.step_callbacks.append(self)
+        self.every_n_steps = every_n_steps
+        self.torch_steps = torch_steps
+        self.torch_trace_path = torch_trace_path
+        self.torch_table = None
+        self.windows = []
+        self._hooks = []
+        self._torch_profiler = None
+        self._in_step = False
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window = {'steps': 0, 'data_s': 0.0, 'forward_s': 0.0, 'backward_s': 0.0, 'optimizer_s': 0.0}
+        self._window_start = None
+        self._window_cpu = None
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        def before_forward(module, inputs):
+            if self._in_step:
+                self._forward_start = time.perf_counter()
+
+        def after_forward(module, inputs, output):
+            if self._in_step:
+                self._forward_end = time.perf_counter()
+                self._window['forward_s'] += self._forward_end - self._forward_start
+
+        self._hooks = [model.register_forward_pre_hook(before_forward), model.register_forward_hook(after_forward)]
+        self._last_step_end = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        if self._window_start is None:
+            self._window_start, self._window_cpu = now, time.process_time()
+        self._window['data_s'] += now - self._last_step_end
+        self._forward_end = now
+        self._in_step = True
+
+        if self.torch_steps and state.global_step == self.torch_steps[0] and self._torch_profiler is None:
+            import torch.profiler
+            self._torch_profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True, profile_memory=True
+            )
+            self._torch_profiler.__enter__()
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        self._optimizer_start = time.perf_counter()
+        self._window['backward_s'] += self._optimizer_start - self._forward_end
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        self._window['optimizer_s'] += time.perf_counter() - self._optimizer_start
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self._in_step = False
+        self._last_step_end = time.perf_counter()
+        self._window['steps'] += 1
+
+        if self._torch_profiler is not None and state.global_step >= self.torch_steps[1]:
+            self._stop_torch_profiler()
+        if self._window['steps'] >= self.every_n_steps:
+            self._close_window(state.global_step)
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self._window['steps']:
+            self._close_window(state.global_step)
+        if self._torch_profiler is not None:
+            self._stop_torch_profiler()
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+
+    def _close_window(self, global_step):
+        wall = time.perf_counter() - self._window_start
+        window = {
+            **self._window,
+            'last_step': global_step,
+            'wall_s': wall,
+            'cpu_s': time.process_time() - self._window_cpu,
+            'rss_mb': (_status_kb('VmRSS') or 0) / 1024,
+            'steps_per_s': self._window['steps'] / wall if wall else 0.0,
+        }
+        self.windows.append(window)
+        first_step = global_step - window['steps'] + 1
+        self.profiler.complete_event(
+            f"steps {first_step}-{global_step}", 'train_steps', self._window_start, wall, window
+        )
+        self.profiler.counter('rss_mb', {'rss': window['rss_mb']})
+        self._reset_window()
+
+    def _stop_torch_profiler(self):
+        self._torch_profiler.__exit__(None, None, None)
+        if self.torch_trace_path:
+            self._torch_profiler.export_chrome_trace(self.torch_trace_path)
+        self.torch_table = self._torch_profiler.key_averages().table(sort_by='cpu_time_total', row_limit=15)
+        self._torch_profiler = None
+
+    def summary(self):
+        report = "Training Steps\n" + "=" * 86 + "\n"
+        report += (
+            f"{'steps':<14}{'wall s':>8}{'steps/s':>9}{'data+other %':>14}{'fwd %':>8}{'bwd %':>8}{'optim %':>9}"
+            f"{'CPU/wall':>10}{'RSS MB':>10}\n"
+        )
+        for window in self.windows:
+            share = lambda key: window[key] / window['wall_s'] if window['wall_s'] else 0.0
+            steps = f"{window['last_step'] - window['steps'] + 1}-{window['last_step']}"
+            report += (
+                f"{steps:<14}{window['wall_s']:>8.2f}{window['steps_per_s']:>9.2f}{share('data_s'):>14.1%}"
+                f"{share('forward_s'):>8.1%}{share('backward_s'):>8.1%}{share('optimizer_s'):>9.1%}"
+                f"{share('cpu_s'):>10.2f}{window['rss_mb']:>10.0f}\n"
+            )
+        if self.torch_table:
+            report += f"\ntorch.profiler, steps {self.torch_steps[0]}-{self.torch_steps[1]} (top 15 ops by CPU time):\n"
+            report += self.torch_table + "\n"
+        return report
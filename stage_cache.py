@@ -0,0 +1,118 @@
+# Content-hashed stage skipping for the training pipeline. Every stage records a hash of
+# its inputs (parameters plus the files/directories it reads) and of the outputs it wrote
+# under <work_dir>/.stages; a rerun skips the stage when both still match.
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import profiling
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageRunner:
+    def __init__(self, work_dir, force=False):
+        self.state_dir = os.path.join(work_dir, '.stages')
+        self.force = force
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        # File hashes memoized on (size, mtime) so unchanged multi-hundred-MB weights aren't re-read.
+        # One entry per path, replaced when the file changes; entries for deleted files (and the old
+        # "path:size:mtime" string entries) are dropped on load.
+        self._hash_index_path = os.path.join(self.state_dir, 'file_hashes.json')
+        self._hash_index = {}
+        if os.path.exists(self._hash_index_path):
+            with open(self._hash_index_path) as f:
+                self._hash_index = {
+                    path: entry for path, entry in json.load(f).items()
+                    if isinstance(entry, dict) and os.path.exists(path)
+                }
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        entry = self._hash_index.get(os.path.abspath(path))
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_file(path)}
+            self._hash_index[os.path.abspath(path)] = entry
+        return entry['sha256']
+
+    def hash_path(self, path):
+        path = str(path)
+        if os.path.isfile(path):
+            return self._file_hash(path)
+        if not os.path.isdir(path):
+            return None
+
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(self._file_hash(file_path).encode())
+        return digest.hexdigest()
+
+    def fingerprint(self, value):
+        # Path values are hashed by content; everything else by its JSON form
+        if isinstance(value, Path):
+            return self.hash_path(value)
+        if isinstance(value, dict):
+            return {key: self.fingerprint(item) for key, item in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [self.fingerprint(item) for item in value]
+        return value
+
+    def _record_path(self, name):
+        return os.path.join(self.state_dir, f'{name}.json')
+
+    def _save_index(self):
+        with open(self._hash_index_path, 'w') as f:
+            json.dump(self._hash_index, f)
+
+    def run(self, name, fn, inputs, outputs):
+        inputs_hash = hashlib.sha256(
+            json.dumps(self.fingerprint(inputs), sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        record = None
+        if os.path.exists(self._record_path(name)):
+            with open(self._record_path(name)) as f:
+                record = json.load(f)
+
+        if (
+            not self.force
+            and record
+            and record['inputs'] == inputs_hash
+            and all(self.hash_path(path) == record['outputs'].get(str(path)) for path in outputs)
+        ):
+            print(f"⏭️  Stage '{name}' unchanged, skipping")
+            self._save_index()
+            return False
+
+        print(f"\n▶️  Stage '{name}'")
+        start_time = time.perf_counter()
+        with profiling.span(name, 'stage'):
+            fn()
+        elapsed = time.perf_counter() - start_time
+
+        missing = [str(path) for path in outputs if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"Stage '{name}' did not produce: {', '.join(missing)}")
+
+        with open(self._record_path(name), 'w') as f:
+            json.dump({
+                'inputs': inputs_hash,
+                'outputs': {str(path): self.hash_path(path) for path in outputs},
+                'seconds': elapsed,
+            }, f, indent=2)
+        self._save_index()
+        print(f"✅ Stage '{name}' finished in {elapsed:.1f}s")
+        return True
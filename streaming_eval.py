@@ -0,0 +1,245 @@
+# Memory-bounded evaluation over labelled corpora of any size. JSONL/Parquet shards stream
+# through batched inference one chunk at a time, and every metric is accumulated from
+# fixed-size state: a K x K confusion matrix, per-bin calibration sums and running NLL.
+# Nothing grows with the number of rows, so a multi-million-row chat-log export or
+# synthetic corpus is scored with the same memory as the 283-row test split.
+# The reports match model.py's evaluate stage: classification_report.txt, eval_metrics.json,
+# confusion_matrix.png, plus a calibration summary and rows/sec.
+#
+#   python streaming_eval.py --model-path ./chatbot_model --data models/synthetic_corpus --output-dir ./stream_eval
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support, classification_report
+
+from calibration import SERVING_THRESHOLD
+from chatbot_data_generation import iter_shard_frames
+
+
+class StreamingMetrics:
+    def __init__(self, intents, n_bins=15, temperature=1.0, serving_threshold=SERVING_THRESHOLD):
+        self.intents = list(intents)
+        self.n_bins = n_bins
+        self.temperature = temperature
+        self.serving_threshold = serving_threshold
+        num_classes = len(self.intents)
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.bin_counts = np.zeros(n_bins, dtype=np.int64)
+        self.bin_correct = np.zeros(n_bins, dtype=np.int64)
+        self.bin_confidence = np.zeros(n_bins, dtype=np.float64)
+        self.nll_sum = 0.0
+        self.served = 0
+        self.served_correct = 0
+        self.rows = 0
+
+    def update(self, logits, labels):
+        logits = torch.as_tensor(logits, dtype=torch.float32) / self.temperature
+        labels = np.array(labels, dtype=np.int64)
+        num_classes = len(self.intents)
+
+        probabilities = torch.softmax(logits, dim=-1)
+        confidences, predictions = probabilities.max(dim=-1)
+        confidences, predictions = confidences.numpy(), predictions.numpy()
+        correct = predictions == labels
+
+        # One bincount per batch instead of a Python loop over rows
+        self.confusion += np.bincount(
+            labels * num_classes + predictions, minlength=num_classes * num_classes
+        ).reshape(num_classes, num_classes)
+        bin_ids = np.minimum((confidences * self.n_bins).astype(int), self.n_bins - 1)
+        self.bin_counts += np.bincount(bin_ids, minlength=self.n_bins)
+        self.bin_correct += np.bincount(bin_ids, weights=correct, minlength=self.n_bins).astype(np.int64)
+        self.bin_confidence += np.bincount(bin_ids, weights=confidences, minlength=self.n_bins)
+
+        self.nll_sum += float(F.cross_entropy(logits, torch.as_tensor(labels), reduction='sum'))
+        served = confidences > self.serving_threshold
+        self.served += int(served.sum())
+        self.served_correct += int((served & correct).sum())
+        self.rows += len(labels)
+
+    def _cells(self):
+        # The confusion matrix as K*K weighted (true, predicted) pairs: sklearn then computes
+        # exactly what it would on the full prediction arrays
+        num_classes = len(self.intents)
+        y_true, y_pred = np.divmod(np.arange(num_classes * num_classes), num_classes)
+        return y_true, y_pred, self.confusion.ravel()
+
+    def classification_report(self, digits=2):
+        # sklearn's text layout; with sample weights it would print supports as floats
+        y_true, y_pred, counts = self._cells()
+        rows = classification_report(
+            y_true, y_pred, labels=list(range(len(self.intents))), target_names=self.intents,
+            sample_weight=counts, zero_division=0, output_dict=True
+        )
+        headers = ['precision', 'recall', 'f1-score', 'support']
+        width = max(max(len(intent) for intent in self.intents), len('weighted avg'), digits)
+        row_format = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+
+        report = ("{:>{width}s} " + " {:>9}" * 4).format('', *headers, width=width) + "\n\n"
+        for name in self.intents + ['', 'accuracy', 'macro avg', 'weighted avg']:
+            if name == '':
+                report += "\n"
+            elif name == 'accuracy':
+                report += ("{:>{width}s} " + " {:>9}" * 2 + " {:>9.{digits}f} {:>9}\n").format(
+                    name, '', '', rows['accuracy'], int(counts.sum()), width=width, digits=digits
+                )
+            else:
+                row = rows[name]
+                report += row_format.format(
+                    name, row['precision'], row['recall'], row['f1-score'], int(round(row['support'])),
+                    width=width, digits=digits
+                )
+        return report
+
+    def metrics(self):
+        # Same keys as model.compute_metrics
+        y_true, y_pred, counts = self._cells()
+        precision, recall, f1, _ = precision_recall_fscore_support(
+            y_true, y_pred, average='weighted', sample_weight=counts, zero_division=0
+        )
+        return {
+            'accuracy': accuracy_score(y_true, y_pred, sample_weight=counts),
+            'f1': f1,
+            'precision': precision,
+            'recall': recall,
+        }
+
+    def calibration(self):
+        # Same keys as calibration.calibration_metrics, from the binned sums
+        rows = max(self.rows, 1)
+        occupied = self.bin_counts > 0
+        gaps = np.abs(self.bin_correct[occupied] - self.bin_confidence[occupied]) / self.bin_counts[occupied]
+        return {
+            'nll': self.nll_sum / rows,
+            'ece': float((self.bin_counts[occupied] / rows * gaps).sum()),
+            'mean_confidence': float(self.bin_confidence.sum() / rows),
+            'accuracy': float(np.trace(self.confusion) / rows),
+            'served_by_model': self.served / rows,
+            'served_accuracy': self.served_correct / self.served if self.served else 0.0,
+        }
+
+    def format_calibration(self):
+        report = f"{'confidence':<14}{'rows':>10}{'accuracy':>10}{'mean conf':>11}\n"
+        for bin_id in range(self.n_bins):
+            count = self.bin_counts[bin_id]
+            if count:
+                low, high = bin_id / self.n_bins, (bin_id + 1) / self.n_bins
+                report += (
+                    f"{f'{low:.2f}-{high:.2f}':<14}{count:>10}{self.bin_correct[bin_id] / count:>10.2%}"
+                    f"{self.bin_confidence[bin_id] / count:>11.4f}\n"
+                )
+        return report
+
+
+def save_confusion_matrix(confusion, intents, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 10))
+    sns.heatmap(confusion, annot=True, fmt='d', cmap='Blues', xticklabels=intents, yticklabels=intents)
+    plt.title('Confusion Matrix')
+    plt.xlabel('Predicted')
+    plt.ylabel('Actual')
+    plt.xticks(rotation=45)
+    plt.yticks(rotation=0)
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def stream_evaluate(classifier, path, text_column='text', label_column='intent', chunksize=10_000,
+                    max_rows=None, progress_every=100_000):
+    # Peak memory is one chunk of texts and logits, whatever the corpus size
+    intent_to_id = {intent: idx for idx, intent in enumerate(classifier.intents)}
+    metrics = StreamingMetrics(classifier.intents, temperature=classifier.temperature)
+    skipped = {}
+    start_time = time.perf_counter()
+    next_progress = progress_every
+
+    for frame in iter_shard_frames(path, chunksize):
+        if max_rows is not None:
+            frame = frame.iloc[:max_rows - metrics.rows]
+        frame = frame.dropna(subset=[text_column, label_column])
+        labels = frame[label_column].map(intent_to_id)
+        # Labels the model was not trained on cannot be scored; count them instead
+        for intent, count in frame.loc[labels.isna(), label_column].value_counts().items():
+            skipped[intent] = skipped.get(intent, 0) + int(count)
+        known = labels.notna().to_numpy()
+        if known.any():
+            logits = classifier.predict_logits(frame[text_column].astype(str).to_numpy()[known].tolist())
+            metrics.update(logits, labels[known].astype(np.int64).to_numpy())
+
+        if metrics.rows >= next_progress:
+            elapsed = time.perf_counter() - start_time
+            print(f"   📈 {metrics.rows:,} rows, {metrics.rows / elapsed:,.0f} rows/s")
+            next_progress += progress_every
+        if max_rows is not None and metrics.rows >= max_rows:
+            break
+
+    elapsed = time.perf_counter() - start_time
+    return metrics, {
+        'rows': metrics.rows,
+        'seconds': elapsed,
+        'rows_per_sec': metrics.rows / elapsed if elapsed else 0.0,
+        'skipped_labels': skipped,
+    }
+
+
+def write_reports(metrics, run_info, output_dir, prefix=''):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f'{prefix}classification_report.txt'), 'w') as f:
+        f.write(metrics.classification_report())
+    with open(os.path.join(output_dir, f'{prefix}eval_metrics.json'), 'w') as f:
+        json.dump({**metrics.metrics(), **run_info}, f, indent=2)
+    save_confusion_matrix(metrics.confusion, metrics.intents, os.path.join(output_dir, f'{prefix}confusion_matrix.png'))
+
+    calibration = metrics.calibration()
+    report = f"Streaming Evaluation ({run_info['rows']:,} rows, {run_info['rows_per_sec']:,.0f} rows/s)\n" + "=" * 60 + "\n"
+    report += (
+        f"NLL {calibration['nll']:.4f}, ECE {calibration['ece']:.4f}, mean confidence {calibration['mean_confidence']:.4f}, "
+        f"accuracy {calibration['accuracy']:.2%}\n"
+        f"Served by the model (> {metrics.serving_threshold}): {calibration['served_by_model']:.1%}, "
+        f"accuracy {calibration['served_accuracy']:.2%}\n\n"
+    )
+    report += metrics.format_calibration()
+    if run_info['skipped_labels']:
+        report += f"\nSkipped rows with labels the model does not know: {run_info['skipped_labels']}\n"
+    with open(os.path.join(output_dir, f'{prefix}calibration_summary.txt'), 'w') as f:
+        f.write(report)
+    return report
+
+
+if __name__ == '__main__':
+    from benchmark_inference import peak_rss_mb
+    from intent_classifier import IntentClassifier
+
+    parser = argparse.ArgumentParser(description="Stream labelled JSONL/Parquet shards through the classifier")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--data', required=True, help="Shard directory, glob or single JSONL/Parquet file")
+    parser.add_argument('--output-dir', default='./stream_eval')
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--label-column', default='intent', help="e.g. corrected_intent for reviewed chat logs")
+    parser.add_argument('--chunk-size', type=int, default=10_000, help="Rows held in memory at once")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--max-rows', type=int, default=None)
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(args.model_path, max_length=args.max_length, batch_size=args.batch_size)
+    print(f"🔍 Streaming {args.data} through {args.model_path} in chunks of {args.chunk_size:,} rows...")
+    stream_metrics, stream_info = stream_evaluate(
+        classifier, args.data, args.text_column, args.label_column, args.chunk_size, args.max_rows
+    )
+    stream_info['peak_rss_mb'] = peak_rss_mb()
+    summary = write_reports(stream_metrics, stream_info, args.output_dir)
+    print("\n" + stream_metrics.classification_report())
+    print(summary)
+    print(f"Peak RSS: {stream_info['peak_rss_mb']:.0f} MB")
+    print(f"✅ Reports saved to {args.output_dir}")
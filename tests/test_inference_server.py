@@ -0,0 +1,63 @@
+# Regression tests for MicroBatcher / route request handling, with a stub classifier (no model files)
+import asyncio
+import json
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_server import MicroBatcher, route
+from intent_classifier import IntentClassifier
+
+
+class StubClassifier:
+    intents = ['customer_view_cart', 'customer_track_order', 'admin_list_orders']
+    temperature = 1.0
+
+    def __init__(self):
+        self._masks = {}
+
+    def predict_logits(self, texts):
+        return torch.tensor([[2.0, 1.0, 0.0]] * len(texts))
+
+    _mask_for = IntentClassifier._mask_for
+    results_from_logits = IntentClassifier.results_from_logits
+
+
+async def predict_after(batcher, request):
+    # The failing request must not stop the batcher from serving the next one
+    try:
+        await asyncio.wait_for(batcher.predict('show cart', **request), 5)
+    except (IndexError, RuntimeError):
+        pass
+    return await asyncio.wait_for(batcher.predict('show cart'), 5)
+
+
+def run(coroutine_factory):
+    async def main():
+        batcher = MicroBatcher(StubClassifier(), max_wait_ms=1)
+        batcher.start()
+        try:
+            return await coroutine_factory(batcher)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def test_batcher_survives_invalid_top_k():
+    for top_k in (0, -1):
+        result = run(lambda batcher: predict_after(batcher, {'top_k': top_k}))
+        assert result['intent'] == 'customer_view_cart'
+
+
+def test_route_rejects_out_of_range_top_k():
+    async def requests(batcher):
+        statuses = []
+        for top_k in (0, -1, 4, 3):
+            body = json.dumps({'text': 'show cart', 'top_k': top_k}).encode()
+            statuses.append((await route(batcher, 'POST', '/predict', body))[0])
+        return statuses
+
+    assert run(requests) == [400, 400, 400, 200]
@@ -0,0 +1,34 @@
+# Regression tests for the keyword fast path, built from the generator's phrase lists
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_data_generation import intent_sources, normalize_text
+from keyword_cascade import KeywordCascade
+
+
+def test_unknown_user_type_falls_through_to_model():
+    intent, user_type, _, samples, _ = intent_sources()[0]
+    cascade = KeywordCascade()
+    assert cascade.match(samples[0], user_type) == intent
+    assert cascade.match(samples[0], 'guest') is None
+
+
+def test_excluded_phrases_stay_out_of_the_table():
+    sources = intent_sources()
+    held_out = {normalize_text(samples[0]) for _, _, _, samples, _ in sources}
+    cascade = KeywordCascade(exclude=held_out)
+    for user_type in ('admin', 'customer', None):
+        assert not held_out & set(cascade.phrases[user_type])
+
+
+def test_fast_path_only_serves_the_models_intents():
+    sources = intent_sources()
+    model_intents = [intent for intent, *_ in sources[1:]]
+    dropped, user_type, _, samples, _ = sources[0]
+    cascade = KeywordCascade(intents=model_intents)
+    assert cascade.skipped_intents == [dropped]
+    assert cascade.match(samples[0], user_type) in model_intents + [None]
+    for user_type in ('admin', 'customer', None):
+        assert set(cascade.phrases[user_type].values()) <= set(model_intents) | {None}
@@ -0,0 +1,38 @@
+# Regression tests for PredictionCache, with a stub classifier (no model files)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction_cache import PredictionCache
+
+
+class StubClassifier:
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.calls = 0
+
+    def predict_batch(self, texts, user_type=None, top_k=1):
+        self.calls += 1
+        return [
+            {'text': text, 'intent': 'customer_view_cart', 'confidence': 0.9,
+             'top_k': [{'intent': 'customer_view_cart', 'confidence': 0.9}, {'intent': 'customer_track_order', 'confidence': 0.1}]}
+            for text in texts
+        ]
+
+
+def test_cached_results_do_not_share_nested_lists(tmp_path):
+    classifier = StubClassifier(str(tmp_path))
+    cache = PredictionCache(classifier)
+
+    # A caller editing its result (e.g. trimming top_k) must not change what later callers get
+    first, duplicate = cache.predict_batch(['Show cart', 'show cart?'], top_k=2)
+    first['top_k'].pop()
+    duplicate['top_k'][0]['confidence'] = 0.0
+    hit = cache.predict('SHOW CART', top_k=2)
+    hit['top_k'].clear()
+
+    again = cache.predict('Show cart', top_k=2)
+    assert classifier.calls == 1
+    assert again['text'] == 'Show cart'
+    assert [entry['confidence'] for entry in again['top_k']] == [0.9, 0.1]
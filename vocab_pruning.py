@@ -0,0 +1,221 @@
+# Post-training vocabulary pruning. The food-ordering domain uses a small slice of the
+# 30,522-token DistilBERT vocabulary; this keeps only the tokens the corpus produces plus
+# a reserve (special tokens, every single-character piece, configurable extra words),
+# slices the embedding matrix to match and rewrites vocab.txt, tokenizer.json,
+# tokenizer_config.json and config.json with the new ids.
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from chatbot_data_generation import RESTAURANTS, DISHES, DISH_STYLES, CATEGORIES, STATUSES, iter_shard_frames
+from export_onnx import weights_size
+
+# Slot values the synthetic corpus fills into templates; kept so templated variants tokenize unchanged
+DEFAULT_RESERVE = RESTAURANTS + DISHES + DISH_STYLES + CATEGORIES + STATUSES
+
+
+def read_corpus(path, text_field='text'):
+    if path.endswith('.csv'):
+        return pd.read_csv(path)[text_field].dropna().tolist()
+    return [text for frame in iter_shard_frames(path) for text in frame[text_field].dropna().tolist()]
+
+
+def needed_token_ids(tokenizer, texts, reserve=(), keep_single_chars=True):
+    keep = set(tokenizer.all_special_ids)
+    for start in range(0, len(texts), 10000):
+        for ids in tokenizer(list(texts[start:start + 10000]), add_special_tokens=False)['input_ids']:
+            keep.update(ids)
+    for ids in tokenizer(list(reserve), add_special_tokens=False)['input_ids'] if reserve else []:
+        keep.update(ids)
+
+    if keep_single_chars:
+        # Unseen words still split into known pieces instead of [UNK]
+        for token, token_id in tokenizer.get_vocab().items():
+            if len(token) == 1 or (token.startswith('##') and len(token) == 3):
+                keep.add(token_id)
+    return sorted(keep)
+
+
+def remap_tokenizer_files(model_path, output_dir, kept_ids, id_map):
+    with open(os.path.join(model_path, 'vocab.txt'), encoding='utf-8') as f:
+        vocab = [line.rstrip('\n') for line in f]
+    with open(os.path.join(output_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(vocab[old_id] for old_id in kept_ids) + '\n')
+
+    # tokenizer.json: WordPiece vocab, added tokens, [CLS]/[SEP] ids in the post-processor, pad id
+    with open(os.path.join(model_path, 'tokenizer.json'), encoding='utf-8') as f:
+        tokenizer_json = json.load(f)
+    tokenizer_json['model']['vocab'] = {vocab[old_id]: new_id for new_id, old_id in enumerate(kept_ids)}
+    for added in tokenizer_json.get('added_tokens', []):
+        added['id'] = id_map[added['id']]
+    post_processor = tokenizer_json.get('post_processor') or {}
+    for special in post_processor.get('special_tokens', {}).values():
+        special['ids'] = [id_map[token_id] for token_id in special['ids']]
+    for key in ('cls', 'sep'):
+        if key in post_processor:
+            post_processor[key][1] = id_map[post_processor[key][1]]
+    if tokenizer_json.get('padding'):
+        tokenizer_json['padding']['pad_id'] = id_map[tokenizer_json['padding']['pad_id']]
+    with open(os.path.join(output_dir, 'tokenizer.json'), 'w', encoding='utf-8') as f:
+        json.dump(tokenizer_json, f, ensure_ascii=False)
+
+    tokenizer_config_path = os.path.join(model_path, 'tokenizer_config.json')
+    if os.path.exists(tokenizer_config_path):
+        with open(tokenizer_config_path) as f:
+            tokenizer_config = json.load(f)
+        if 'added_tokens_decoder' in tokenizer_config:
+            tokenizer_config['added_tokens_decoder'] = {
+                str(id_map[int(token_id)]): token
+                for token_id, token in tokenizer_config['added_tokens_decoder'].items()
+            }
+        with open(os.path.join(output_dir, 'tokenizer_config.json'), 'w') as f:
+            json.dump(tokenizer_config, f, indent=2)
+
+    for name in ('special_tokens_map.json', 'model_config.json'):
+        if os.path.exists(os.path.join(model_path, name)):
+            shutil.copy(os.path.join(model_path, name), os.path.join(output_dir, name))
+
+
+def prune_vocabulary(model_path, output_dir, texts, reserve=DEFAULT_RESERVE, keep_single_chars=True):
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    old_vocab_size = model.config.vocab_size
+
+    kept_ids = needed_token_ids(tokenizer, texts, reserve, keep_single_chars)
+    id_map = {old_id: new_id for new_id, old_id in enumerate(kept_ids)}
+    print(f"✂️  Keeping {len(kept_ids)} of {old_vocab_size} tokens")
+
+    # Embedding rows in the new id order; no other weight depends on the vocabulary
+    old_embeddings = model.get_input_embeddings()
+    pad_token_id = id_map[model.config.pad_token_id] if model.config.pad_token_id is not None else None
+    new_embeddings = nn.Embedding(len(kept_ids), old_embeddings.embedding_dim, padding_idx=pad_token_id)
+    with torch.no_grad():
+        new_embeddings.weight.copy_(old_embeddings.weight[torch.tensor(kept_ids)])
+    model.set_input_embeddings(new_embeddings)
+    model.config.vocab_size = len(kept_ids)
+    model.config.pad_token_id = pad_token_id
+
+    os.makedirs(output_dir, exist_ok=True)
+    model.save_pretrained(output_dir)
+    remap_tokenizer_files(model_path, output_dir, kept_ids, id_map)
+
+    report = {
+        'vocab_size_before': old_vocab_size,
+        'vocab_size_after': len(kept_ids),
+        'embedding_params_before': old_vocab_size * old_embeddings.embedding_dim,
+        'embedding_params_after': len(kept_ids) * old_embeddings.embedding_dim,
+        'weights_bytes_before': weights_size(model_path),
+        'weights_bytes_after': weights_size(output_dir),
+        'tokenizer_bytes_before': sum(os.path.getsize(os.path.join(model_path, name)) for name in ('vocab.txt', 'tokenizer.json')),
+        'tokenizer_bytes_after': sum(os.path.getsize(os.path.join(output_dir, name)) for name in ('vocab.txt', 'tokenizer.json')),
+        'corpus_texts': len(texts),
+        'reserve_entries': len(reserve),
+        'keep_single_chars': keep_single_chars,
+    }
+    return report, id_map
+
+
+def load_seconds(model_path, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        AutoTokenizer.from_pretrained(model_path)
+        AutoModelForSequenceClassification.from_pretrained(model_path)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def verify_pruned(model_path, pruned_path, texts, id_map, batch_size=64, max_length=128):
+    # Token ids must map one-to-one and logits must be identical on in-domain text
+    original_tokenizer = AutoTokenizer.from_pretrained(model_path)
+    pruned_tokenizer = AutoTokenizer.from_pretrained(pruned_path)
+    original_model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    pruned_model = AutoModelForSequenceClassification.from_pretrained(pruned_path).eval()
+
+    max_abs_diff = 0.0
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            batch = list(texts[start:start + batch_size])
+            original = original_tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+            pruned = pruned_tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+
+            expected_ids = original['input_ids'].clone().apply_(lambda token_id: id_map.get(token_id, -1))
+            if not torch.equal(expected_ids, pruned['input_ids']) or not torch.equal(original['attention_mask'], pruned['attention_mask']):
+                raise ValueError(f"Pruned tokenizer disagrees with the original within texts {start}-{start + len(batch)}")
+
+            diff = (original_model(**original).logits - pruned_model(**pruned).logits).abs().max().item()
+            max_abs_diff = max(max_abs_diff, diff)
+
+    if max_abs_diff > 0:
+        raise ValueError(f"Pruned model logits differ from the original by {max_abs_diff:.2e}")
+    return max_abs_diff
+
+
+def format_pruning_report(report):
+    lines = ["Vocabulary Pruning Report", "=" * 60]
+    lines.append(f"{'':<22}{'before':>14}{'after':>14}{'ratio':>10}")
+    for label, key in (
+        ('vocab size', 'vocab_size'),
+        ('embedding params', 'embedding_params'),
+        ('weights bytes', 'weights_bytes'),
+        ('tokenizer bytes', 'tokenizer_bytes'),
+        ('load seconds', 'load_seconds'),
+    ):
+        before, after = report.get(f'{key}_before'), report.get(f'{key}_after')
+        if before is None or after is None:
+            continue
+        if isinstance(before, float):
+            lines.append(f"{label:<22}{before:>14.3f}{after:>14.3f}{after / before:>10.1%}")
+        else:
+            lines.append(f"{label:<22}{before:>14,}{after:>14,}{after / before:>10.1%}")
+    if 'verified_texts' in report:
+        lines.append(f"\nVerified identical token ids and logits on {report['verified_texts']} texts")
+    return "\n".join(lines) + "\n"
+
+
+def prune_and_verify(model_path, output_dir, texts, reserve=DEFAULT_RESERVE, keep_single_chars=True):
+    report, id_map = prune_vocabulary(model_path, output_dir, texts, reserve, keep_single_chars)
+    verify_pruned(model_path, output_dir, texts, id_map)
+    report['verified_texts'] = len(texts)
+    report['load_seconds_before'] = load_seconds(model_path)
+    report['load_seconds_after'] = load_seconds(output_dir)
+
+    model_config_path = os.path.join(output_dir, 'model_config.json')
+    if os.path.exists(model_config_path):
+        with open(model_config_path) as f:
+            model_config = json.load(f)
+        model_config['vocab_pruning'] = report
+        with open(model_config_path, 'w') as f:
+            json.dump(model_config, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prune the tokenizer vocabulary and embedding matrix to the domain")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--output-dir', default='./chatbot_model_pruned')
+    parser.add_argument('--data', default='models/enhanced_chatbot_dataset.csv',
+                        help="Corpus CSV, or a directory / glob of JSONL or Parquet shards")
+    parser.add_argument('--reserve-file', default=None, help="Extra words or phrases to keep, one per line")
+    parser.add_argument('--no-single-chars', dest='keep_single_chars', action='store_false',
+                        help="Drop single-character pieces that the corpus does not use")
+    args = parser.parse_args()
+
+    reserve_words = list(DEFAULT_RESERVE)
+    if args.reserve_file:
+        with open(args.reserve_file) as f:
+            reserve_words += [line.strip() for line in f if line.strip()]
+
+    pruning_report = prune_and_verify(
+        args.model_path, args.output_dir, read_corpus(args.data), reserve_words, args.keep_single_chars
+    )
+    print(format_pruning_report(pruning_report))
+    print(f"✅ Pruned model saved to {args.output_dir}")
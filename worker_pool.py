@@ -0,0 +1,142 @@
+# Multi-process intent classification sharing one copy of the model weights. The parent
+# loads chatbot_model/ once and moves the parameters into shared memory; workers are
+# forked afterwards and read the same pages, each pinned to its own torch thread count.
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import torch
+
+from intent_classifier import IntentClassifier
+
+# Set in the parent before forking; inherited (not copied) by every worker
+_classifier = None
+
+
+def _init_worker(model_path, threads, max_length):
+    global _classifier
+    torch.set_num_threads(threads)
+    if _classifier is None:
+        # No fork on this platform: each worker has to load its own copy
+        _classifier = IntentClassifier(model_path, device='cpu', max_length=max_length)
+
+
+def _predict_chunk(job):
+    texts, user_type, top_k = job
+    return _classifier.predict_batch(texts, user_type=user_type, top_k=top_k)
+
+
+def _logits_chunk(texts):
+    return _classifier.predict_logits(texts)
+
+
+class ClassifierPool:
+    def __init__(self, model_path='./chatbot_model', workers=None, threads_per_worker=1, max_length=128):
+        global _classifier
+        self.workers = workers or os.cpu_count()
+        self.threads_per_worker = threads_per_worker
+
+        try:
+            context = mp.get_context('fork')
+            _classifier = IntentClassifier(model_path, device='cpu', max_length=max_length)
+            # MAP_SHARED storage: workers never trigger a copy-on-write of the weight pages
+            _classifier.model.share_memory()
+        except ValueError:
+            print("⚠️  fork is unavailable, every worker loads its own copy of the weights")
+            context = mp.get_context('spawn')
+
+        self.classifier = _classifier
+        self._pool = context.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(model_path, threads_per_worker, max_length)
+        )
+
+    def predict_batch(self, texts, user_type=None, top_k=1, chunk_size=1):
+        texts = list(texts)
+        jobs = [(texts[start:start + chunk_size], user_type, top_k) for start in range(0, len(texts), chunk_size)]
+        return [result for chunk in self._pool.imap(_predict_chunk, jobs) for result in chunk]
+
+    def predict_logits(self, texts, chunk_size=1):
+        texts = list(texts)
+        chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        return torch.cat(self._pool.map(_logits_chunk, chunks))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def worker_layouts(cores):
+    # Every (workers, threads per worker) split that uses all cores
+    return [(workers, cores // workers) for workers in range(1, cores + 1) if cores % workers == 0]
+
+
+def scaling_benchmark(model_path, texts, cores=None, chunk_size=1, repeats=3):
+    cores = cores or os.cpu_count()
+    rows = []
+    for workers, threads in worker_layouts(cores):
+        print(f"⏱️  {workers} worker(s) x {threads} thread(s)...")
+        with ClassifierPool(model_path, workers=workers, threads_per_worker=threads) as pool:
+            pool.predict_batch(texts[:workers * chunk_size], chunk_size=chunk_size)
+            timings = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                pool.predict_batch(texts, chunk_size=chunk_size)
+                timings.append(time.perf_counter() - start_time)
+        rows.append({
+            'workers': workers,
+            'threads_per_worker': threads,
+            'throughput': len(texts) / float(np.median(timings)),
+        })
+    return rows
+
+
+def format_scaling(rows, chunk_size):
+    report = f"Worker Pool Scaling (CPU, {chunk_size} utterance(s) per request)\n"
+    report += "=" * 60 + "\n"
+    report += f"{'workers':>8}{'threads':>9}{'utt/sec':>12}{'vs 1 worker':>14}\n"
+    baseline = rows[0]['throughput']
+    for row in rows:
+        report += (
+            f"{row['workers']:>8}{row['threads_per_worker']:>9}{row['throughput']:>12.0f}"
+            f"{row['throughput'] / baseline:>13.2f}x\n"
+        )
+    best = max(rows, key=lambda row: row['throughput'])
+    report += f"\nBest: {best['workers']} worker(s) x {best['threads_per_worker']} thread(s)\n"
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark throughput against the worker / thread split")
+    parser.add_argument('--model-path', default='./chatbot_model')
+    parser.add_argument('--data', default=None, help="CSV with a 'text' column to classify")
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--cores', type=int, default=None, help="Cores to spread across workers (default: all)")
+    parser.add_argument('--chunk-size', type=int, default=1, help="Utterances per request")
+    parser.add_argument('--output', default='worker_scaling_report.txt')
+    args = parser.parse_args()
+
+    if args.data:
+        import pandas as pd
+        sample = pd.read_csv(args.data)['text'].dropna().tolist()
+    else:
+        from export_onnx import SAMPLE_TEXTS as sample
+    benchmark_texts = [sample[i % len(sample)] for i in range(args.samples)]
+
+    report = format_scaling(
+        scaling_benchmark(args.model_path, benchmark_texts, args.cores, args.chunk_size),
+        args.chunk_size
+    )
+    print(report)
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(f"✅ Report saved to {args.output}")